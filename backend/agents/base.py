@@ -11,13 +11,13 @@ class Agent(ABC):
     def get_system_prompt(self) -> str:
         pass
 
-    async def generate_response(self, context: str) -> str:
+    async def generate_response(self, context: str, session_id: str = None) -> str:
         system_prompt = self.get_system_prompt()
         prompt = f"Context:\n{context}\n\nResponse:"
-        return await self.llm_service.generate_response(prompt, system_prompt)
+        return await self.llm_service.generate_response(prompt, system_prompt, session_id=session_id, priority="stream")
 
-    async def generate_stream(self, context: str):
+    async def generate_stream(self, context: str, session_id: str = None):
         system_prompt = self.get_system_prompt()
         prompt = f"Context:\n{context}\n\nResponse:"
-        async for chunk in self.llm_service.generate_stream(prompt, system_prompt):
+        async for chunk in self.llm_service.generate_stream(prompt, system_prompt, session_id=session_id, agent=self.name):
             yield chunk
@@ -0,0 +1,78 @@
+"""
+Event-loop stall while a large session is clustered.
+
+Clusters synthetic embeddings (see benchmarks/clustering.py) while a ticker
+task measures how late the event loop wakes it up: the stall every SSE
+stream on the worker sees. The old path ran the fit inside the handler; the
+service now runs it in ComputePool worker processes with the matrix passed
+through shared memory. Also reports the size of the pickle the matrix would
+have cost to send to a worker.
+
+    python benchmarks/cluster_loop_stall.py --sizes 1000,5000
+"""
+import argparse
+import asyncio
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.clustering import make_embeddings  # noqa: E402
+from services.cluster_engine import cluster_embeddings  # noqa: E402
+from services.compute_pool import ComputePool  # noqa: E402
+
+TICK = 0.005
+
+
+async def with_ticker(work):
+    max_stall = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal max_stall
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            max_stall = max(max_stall, time.perf_counter() - start - TICK)
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK * 2)
+    start = time.perf_counter()
+    labels = await work()
+    elapsed = time.perf_counter() - start
+    running = False
+    await tick
+    return labels, elapsed, max_stall
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,5000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    pool = ComputePool(max(1, args.workers))
+    await pool.start()
+    print(f"{'n':>7}{'path':>10}{'wall s':>9}{'max stall ms':>14}{'pickle MB':>11}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        X, _ = make_embeddings(n, args.dim, 25, seed=0)
+
+        async def inline():
+            return cluster_embeddings(X)
+
+        inline_labels, elapsed, stall = await with_ticker(inline)
+        print(f"{n:>7}{'inline':>10}{elapsed:>9.2f}{stall * 1000:>14.1f}{'':>11}")
+
+        pooled_labels, elapsed, stall = await with_ticker(lambda: pool.run_on_matrix(cluster_embeddings, X))
+        assert np.array_equal(inline_labels, pooled_labels)
+        pickled = len(pickle.dumps(X, protocol=pickle.HIGHEST_PROTOCOL)) / 2**20
+        print(f"{n:>7}{'pool':>10}{elapsed:>9.2f}{stall * 1000:>14.1f}{pickled:>11.1f}")
+    pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
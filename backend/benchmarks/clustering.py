@@ -0,0 +1,71 @@
+"""
+Clustering engine benchmark across session sizes.
+
+Generates synthetic embedding-like data (Gaussian topics in 768 dimensions),
+clusters it with services.cluster_engine and reports wall time, peak traced
+memory and agreement with the ground-truth topics (adjusted Rand index). The
+old full agglomerative path is timed as a baseline up to --baseline-max rows.
+
+    python benchmarks/clustering.py --sizes 100,1000,10000,50000
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+from sklearn.cluster import AgglomerativeClustering
+from sklearn.metrics import adjusted_rand_score
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.cluster_engine import cluster_embeddings, DISTANCE_THRESHOLD  # noqa: E402
+
+
+def make_embeddings(n: int, dim: int, n_topics: int, seed: int):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(scale=0.12, size=(n_topics, dim)).astype(np.float32)
+    topics = rng.integers(0, n_topics, size=n)
+    points = centers[topics] + rng.normal(scale=0.01, size=(n, dim)).astype(np.float32)
+    return points, topics
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    labels = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return labels, elapsed, peak / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--topics", type=int, default=25)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline-max", type=int, default=5000, help="Largest n to run the old O(n^2) path on")
+    args = parser.parse_args()
+
+    print(f"{'n':>7} {'engine s':>9} {'peak MB':>8} {'clusters':>8} {'ARI':>5} | {'baseline s':>10} {'peak MB':>8}")
+    for n in [int(s) for s in args.sizes.split(",")]:
+        X, topics = make_embeddings(n, args.dim, args.topics, args.seed)
+        labels, elapsed, peak = measure(lambda: cluster_embeddings(X, seed=args.seed))
+        again = cluster_embeddings(X, seed=args.seed)
+        assert np.array_equal(labels, again), "clustering is not deterministic for a fixed seed"
+        ari = adjusted_rand_score(topics, labels)
+        row = f"{n:>7} {elapsed:>9.2f} {peak:>8.1f} {len(np.unique(labels)):>8} {ari:>5.2f} |"
+
+        if n <= args.baseline_max:
+            model = AgglomerativeClustering(n_clusters=None, distance_threshold=DISTANCE_THRESHOLD)
+            _, base_elapsed, base_peak = measure(lambda: model.fit_predict(X))
+            row += f" {base_elapsed:>10.2f} {base_peak:>8.1f}"
+        else:
+            row += f" {'skipped':>10} {'-':>8}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
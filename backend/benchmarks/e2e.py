@@ -0,0 +1,255 @@
+"""
+End-to-end load test of the whole backend on the deterministic fakes
+(services/fakes.py): no API keys, no Ollama, no database.
+
+Starts the app under uvicorn in a subprocess with LLM_BACKEND=fake,
+EMBEDDING_BACKEND=fake and STORAGE_BACKEND=memory, then drives N concurrent
+sessions through POST /brainstorm, the SSE stream (until --turns turns have
+ended) and POST /cluster (polling the job on 202). Reports turns/sec, time
+to first token (from opening the stream, and from each agent_start), the
+server's event-loop lag, its memory per session and the clustering latency.
+Other settings (PARALLEL_ROUNDS, SSE_COALESCE_MS, ...) are passed through
+from the environment, so configurations and commits can be compared; --json
+prints one machine-readable line.
+
+    python benchmarks/e2e.py --sessions 50 --turns 6 --latency-ms 200 --tokens-per-second 50
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the server process: the app plus two routes for the benchmark, and
+# a ticker that records how late the event loop wakes it and samples RSS
+SERVER = """
+import asyncio, os, sys, time
+import uvicorn
+import main
+
+TICK = 0.01
+PAGE = os.sysconf("SC_PAGE_SIZE")
+state = {"ticker": None, "lags": [], "baseline": 0, "peak": 0}
+
+
+def rss():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * PAGE
+
+
+async def ticker():
+    ticks = 0
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        state["lags"].append(time.perf_counter() - start - TICK)
+        ticks += 1
+        if ticks % 10 == 0:
+            state["peak"] = max(state["peak"], rss())
+
+
+@main.app.post("/_bench/reset")
+async def reset(request: main.Request):
+    if state["ticker"] is None:
+        # Imports and worker start-up happen here, not inside the measurement
+        await request.app.state.services.warm_up()
+        state["ticker"] = asyncio.create_task(ticker())
+    state["lags"] = []
+    state["baseline"] = state["peak"] = rss()
+    return {}
+
+
+@main.app.get("/_bench/stats")
+async def stats():
+    state["peak"] = max(state["peak"], rss())
+    return {"lags": state["lags"], "baseline": state["baseline"], "peak": state["peak"]}
+
+
+uvicorn.run(main.app, host="127.0.0.1", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def start_server(args, port: int, log):
+    scratch = tempfile.mkdtemp(prefix="e2e_")
+    env = dict(
+        os.environ,
+        LLM_BACKEND="fake", EMBEDDING_BACKEND="fake", STORAGE_BACKEND="memory",
+        FAKE_LLM_LATENCY_MS=str(args.latency_ms), FAKE_LLM_TOKENS_PER_SECOND=str(args.tokens_per_second),
+        FAKE_LLM_RESPONSE_TOKENS=str(args.response_tokens), FAKE_LLM_ERROR_RATE=str(args.error_rate),
+        FAKE_DB_LATENCY_MS=str(args.db_latency_ms), FAKE_SEED=str(args.seed),
+        SESSION_MAX_TURNS=str(args.turns), MAX_CONCURRENT_SESSIONS=str(max(500, args.sessions)),
+        DB_FLUSH_INTERVAL="0.1", STARTUP_WARMUP="0",
+        EXTRACTION_CACHE_DIR=os.path.join(scratch, "extraction_cache"),
+    )
+    # The app prints per-request debug lines; keep only stderr for failures
+    return subprocess.Popen([sys.executable, "-c", SERVER, str(port)], cwd=BACKEND, env=env,
+                            stdout=subprocess.DEVNULL, stderr=log)
+
+
+async def wait_ready(client: httpx.AsyncClient, server, timeout: float = 60.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("server exited during startup")
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start in time")
+
+
+async def run_session(client: httpx.AsyncClient, index: int, turns: int, labels: str) -> dict:
+    stats = {"turns": 0, "error_turns": 0, "ttft": None, "turn_ttfts": [], "cluster": None, "failed": None}
+    topic = f"Benchmark topic #{index}"
+    try:
+        res = await client.post("/brainstorm", data={"topic": topic})
+        res.raise_for_status()
+        session_id = res.json()["session_id"]
+
+        opened = time.perf_counter()
+        turn_started = None
+        async with client.stream("GET", f"/brainstorm/{session_id}/stream", params={"topic": topic}) as res:
+            event = None
+            async for line in res.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    if event == "agent_start":
+                        turn_started = time.perf_counter()
+                    elif event == "agent_end":
+                        stats["turns"] += 1
+                        if stats["turns"] >= turns:
+                            break
+                elif line.startswith("data: ") and event == "token" and turn_started is not None:
+                    now = time.perf_counter()
+                    if stats["ttft"] is None:
+                        stats["ttft"] = now - opened
+                    stats["turn_ttfts"].append(now - turn_started)
+                    if json.loads(line[len("data: "):]).get("text", "").lstrip().startswith("Error"):
+                        stats["error_turns"] += 1
+                    turn_started = None
+
+        start = time.perf_counter()
+        res = await client.post(f"/brainstorm/{session_id}/cluster", params={"labels": labels})
+        if res.status_code == 202:
+            job_url = f"/brainstorm/{session_id}/cluster/{res.json()['job_id']}"
+            while res.json()["status"] == "running":
+                await asyncio.sleep(0.2)
+                res = await client.get(job_url)
+            if res.json()["status"] == "failed":
+                raise ValueError(f"clustering failed: {res.json().get('error')}")
+        res.raise_for_status()
+        stats["cluster"] = time.perf_counter() - start
+    except (httpx.HTTPError, KeyError, ValueError) as e:
+        stats["failed"] = f"{type(e).__name__}: {e}"
+    return stats
+
+
+async def run(args, base_url: str) -> dict:
+    limits = httpx.Limits(max_connections=args.sessions + 10, max_keepalive_connections=args.sessions + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=httpx.Timeout(None, connect=10.0)) as client:
+        await (await client.post("/_bench/reset")).aread()
+        start = time.perf_counter()
+        results = await asyncio.gather(*(run_session(client, i, args.turns, args.labels) for i in range(args.sessions)))
+        elapsed = time.perf_counter() - start
+        server = (await client.get("/_bench/stats")).json()
+
+    turns = sum(r["turns"] for r in results)
+    turn_ttfts = [t for r in results for t in r["turn_ttfts"]]
+    ttfts = [r["ttft"] for r in results if r["ttft"] is not None]
+    clusters = [r["cluster"] for r in results if r["cluster"] is not None]
+    failures = [r["failed"] for r in results if r["failed"]]
+    ms = lambda v: None if v is None else round(v * 1000, 1)  # noqa: E731
+    return {
+        "sessions": args.sessions,
+        "turns": turns,
+        "error_turns": sum(r["error_turns"] for r in results),
+        "failed_sessions": len(failures),
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_sec": round(turns / elapsed, 2),
+        "ttft_ms": {f"p{q}": ms(percentile(ttfts, q)) for q in (50, 95, 99)},
+        "turn_ttft_ms": {f"p{q}": ms(percentile(turn_ttfts, q)) for q in (50, 95, 99)},
+        "loop_lag_ms": {"p50": ms(percentile(server["lags"], 50)), "p99": ms(percentile(server["lags"], 99)),
+                        "max": ms(max(server["lags"], default=None))},
+        "memory_per_session_kb": round((server["peak"] - server["baseline"]) / 1024 / args.sessions, 1),
+        "cluster_ms": {f"p{q}": ms(percentile(clusters, q)) for q in (50, 95)},
+        "first_failure": failures[0] if failures else None,
+    }
+
+
+def print_report(r: dict):
+    fmt = lambda d: "  ".join(f"{k} {'-' if v is None else v}" for k, v in d.items())  # noqa: E731
+    print(f"sessions          {r['sessions']} ({r['failed_sessions']} failed)")
+    print(f"turns             {r['turns']} in {r['elapsed_s']:.2f}s ({r['error_turns']} errors)")
+    print(f"turns/sec         {r['turns_per_sec']:.2f}")
+    print(f"ttft ms (stream)  {fmt(r['ttft_ms'])}")
+    print(f"ttft ms (turn)    {fmt(r['turn_ttft_ms'])}")
+    print(f"loop lag ms       {fmt(r['loop_lag_ms'])}")
+    print(f"memory/session    {r['memory_per_session_kb']:.1f} KiB (peak RSS growth)")
+    print(f"cluster ms        {fmt(r['cluster_ms'])}")
+    if r["first_failure"]:
+        print(f"first failure     {r['first_failure']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=6, help="turns streamed per session")
+    parser.add_argument("--latency-ms", type=float, default=200, help="fake LLM time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="fake LLM output rate")
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of fake LLM calls that fail")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="delay per storage call")
+    parser.add_argument("--labels", default="llm", choices=["llm", "keywords"], help="cluster naming mode")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the results as one JSON line")
+    args = parser.parse_args()
+
+    port = free_port()
+    with tempfile.TemporaryFile(mode="w+") as log:
+        server = start_server(args, port, log)
+        try:
+            async def go():
+                async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+                    await wait_ready(client, server)
+                return await run(args, f"http://127.0.0.1:{port}")
+
+            try:
+                report = asyncio.run(go())
+            except RuntimeError as e:
+                log.seek(0)
+                sys.exit(f"{e}\n{log.read()[-4000:]}")
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+
+    if args.json:
+        print(json.dumps(report))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Embedding throughput (texts/sec) of the Ollama path, old vs new.
+
+Runs against the local stand-in server from fake_ollama.py, so results only
+depend on the client side: the sequential one-request-per-text loop the
+clustering service used to run versus the batched, concurrent OllamaEmbedder.
+
+    python benchmarks/embedding_throughput.py --texts 500 --duplicates 0.2
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+import ollama
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fake_ollama import start_fake_ollama  # noqa: E402
+from services.embeddings import OllamaEmbedder  # noqa: E402
+
+
+def make_texts(n: int, duplicate_ratio: float, seed: int = 0):
+    rng = random.Random(seed)
+    texts = []
+    for i in range(n):
+        if texts and rng.random() < duplicate_ratio:
+            texts.append(rng.choice(texts))
+        else:
+            texts.append(f"Idea {i}: " + " ".join(rng.choice(["scale", "users", "cost", "risk", "growth", "privacy"]) for _ in range(30)))
+    return texts
+
+
+def run_sequential(url: str, model: str, texts):
+    client = ollama.Client(host=url)
+    start = time.perf_counter()
+    for text in texts:
+        client.embeddings(model=model, prompt=text)
+    return time.perf_counter() - start
+
+
+async def run_batched(url: str, texts, concurrency: int):
+    embedder = OllamaEmbedder(host=url, concurrency=concurrency)
+    start = time.perf_counter()
+    vectors = await embedder.embed(texts)
+    elapsed = time.perf_counter() - start
+    assert len(vectors) == len(texts)
+    return elapsed, embedder.batch_size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--duplicates", type=float, default=0.2, help="Fraction of repeated texts")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--request-latency", type=float, default=0.02)
+    parser.add_argument("--text-latency", type=float, default=0.002)
+    parser.add_argument("--skip-sequential", action="store_true")
+    args = parser.parse_args()
+
+    server, url = start_fake_ollama(request_latency=args.request_latency, text_latency=args.text_latency)
+    texts = make_texts(args.texts, args.duplicates)
+    print(f"{len(texts)} texts ({len(set(texts))} unique) against {url}")
+
+    if not args.skip_sequential:
+        requests_before = server.requests
+        elapsed = run_sequential(url, "nomic-embed-text", texts)
+        print(f"sequential : {len(texts) / elapsed:8.1f} texts/s  ({server.requests - requests_before} requests, {elapsed:.2f}s)")
+
+    requests_before = server.requests
+    elapsed, final_batch = asyncio.run(run_batched(url, texts, args.concurrency))
+    print(f"batched    : {len(texts) / elapsed:8.1f} texts/s  ({server.requests - requests_before} requests, {elapsed:.2f}s, final batch size {final_batch})")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
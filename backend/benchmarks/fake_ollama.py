@@ -0,0 +1,152 @@
+"""
+Local stand-in for the parts of the Ollama HTTP API the backend uses.
+
+It answers /api/tags, /api/embed (batched), /api/embeddings (legacy single
+prompt) with deterministic vectors and simulated latency, and /api/chat with
+words trickling out at a fixed per-token latency (NDJSON when streaming), so
+embedding throughput and chat streaming can be measured without a GPU or a
+real model:
+
+    python benchmarks/fake_ollama.py --port 11435
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL_NAME = "nomic-embed-text:latest"
+CHAT_WORDS = ["scale", "users", "cost", "risk", "growth", "privacy", "latency", "margin"]
+
+
+def fake_vector(text: str, dim: int):
+    digest = hashlib.sha256(text.encode("utf-8")).digest()
+    return [((digest[i % len(digest)] + i) % 256) / 128.0 - 1.0 for i in range(dim)]
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _simulate(self, n_texts: int):
+        server = self.server
+        # The model only runs `parallel` requests at once, like OLLAMA_NUM_PARALLEL
+        with server.slots:
+            time.sleep(server.request_latency + server.text_latency * n_texts)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": MODEL_NAME, "model": MODEL_NAME}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        payload = self._read_json()
+        if self.path == "/api/embed":
+            inputs = payload.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            self._simulate(len(inputs))
+            self.server.requests += 1
+            self._send_json({
+                "model": payload.get("model"),
+                "embeddings": [fake_vector(t, self.server.dim) for t in inputs],
+            })
+        elif self.path == "/api/chat":
+            self._chat(payload)
+        elif self.path == "/api/show":
+            self._send_json({"modelfile": "", "parameters": "", "template": "", "details": {}})
+        elif self.path == "/api/embeddings":
+            self._simulate(1)
+            self.server.requests += 1
+            self._send_json({"embedding": fake_vector(payload.get("prompt", ""), self.server.dim)})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+
+    def _chat(self, payload):
+        server = self.server
+        model = payload.get("model")
+        words = [CHAT_WORDS[i % len(CHAT_WORDS)] for i in range(server.chat_tokens)]
+        if not payload.get("stream", True):
+            time.sleep(server.token_latency * len(words))
+            server.requests += 1
+            self._send_json({"model": model, "message": {"role": "assistant", "content": " ".join(words)}, "done": True})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_line(obj):
+            line = json.dumps(obj).encode("utf-8") + b"\n"
+            self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+            self.wfile.flush()
+
+        server.requests += 1
+        try:
+            for word in words:
+                time.sleep(server.token_latency)
+                write_line({"model": model, "message": {"role": "assistant", "content": word + " "}, "done": False})
+            write_line({"model": model, "message": {"role": "assistant", "content": ""}, "done": True})
+            self.wfile.write(b"0\r\n\r\n")
+            server.chats_completed += 1
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream: a real server stops generating here
+            server.chats_cancelled += 1
+            self.close_connection = True
+
+
+def start_fake_ollama(port: int = 0, request_latency: float = 0.02, text_latency: float = 0.002,
+                      dim: int = 768, parallel: int = 4, token_latency: float = 0.01, chat_tokens: int = 50):
+    """
+    Starts the stand-in server on a background thread and returns (server, base_url).
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOllamaHandler)
+    server.daemon_threads = True
+    server.request_latency = request_latency
+    server.text_latency = text_latency
+    server.dim = dim
+    server.slots = threading.BoundedSemaphore(parallel)
+    server.requests = 0
+    server.token_latency = token_latency
+    server.chat_tokens = chat_tokens
+    server.chats_completed = 0
+    server.chats_cancelled = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--request-latency", type=float, default=0.02, help="Fixed seconds per request")
+    parser.add_argument("--text-latency", type=float, default=0.002, help="Additional seconds per input text")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds per streamed chat token")
+    parser.add_argument("--chat-tokens", type=int, default=50, help="Tokens per chat response")
+    args = parser.parse_args()
+    server, url = start_fake_ollama(args.port, args.request_latency, args.text_latency, args.dim, args.parallel,
+                                    args.token_latency, args.chat_tokens)
+    print(f"Fake Ollama listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
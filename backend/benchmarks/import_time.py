@@ -0,0 +1,86 @@
+"""
+Cold-start cost of the backend: `import main` under `python -X importtime`,
+and the time until `GET /` answers (import + lifespan startup), each in a
+fresh interpreter.
+
+Prints the total import time, the modules with the largest cumulative
+import time, and the time to first response. With --budget the script
+exits non-zero when the import takes longer, so it can guard against
+startup regressions (e.g. a heavy SDK imported at module level again).
+
+    python benchmarks/import_time.py --top 15 --repeat 3 --budget 1.5
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_RESPONSE = """
+import time
+start = time.perf_counter()
+import main
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    assert client.get("/").status_code == 200
+    print(time.perf_counter() - start)
+"""
+
+
+def run(args, env):
+    return subprocess.run([sys.executable, *args], cwd=BACKEND, env=env, capture_output=True, text=True)
+
+
+def import_profile(env):
+    """{module: (self us, cumulative us)} from one `-X importtime` run."""
+    result = run(["-X", "importtime", "-c", "import main"], env)
+    if result.returncode != 0:
+        sys.exit(f"import main failed:\n{result.stderr}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement; the fastest is reported")
+    parser.add_argument("--budget", type=float, help="fail if `import main` takes longer (seconds)")
+    args = parser.parse_args()
+
+    # Throwaway local storage and no background warm-up, so only startup itself is measured
+    scratch = tempfile.mkdtemp(prefix="import_time_")
+    env = dict(os.environ, STORAGE_BACKEND=os.getenv("STORAGE_BACKEND", "sqlite"),
+               SQLITE_PATH=os.path.join(scratch, "bench.db"),
+               EXTRACTION_CACHE_DIR=os.path.join(scratch, "extraction_cache"), STARTUP_WARMUP="0")
+
+    profiles = [import_profile(env) for _ in range(args.repeat)]
+    profile = min(profiles, key=lambda p: p["main"][1])
+    total = profile["main"][1] / 1e6
+
+    print(f"import main: {total:.3f}s ({len(profile)} modules)")
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    heaviest = sorted(profile.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in heaviest[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+    timings = []
+    for _ in range(args.repeat):
+        result = run(["-c", FIRST_RESPONSE], env)
+        if result.returncode != 0:
+            sys.exit(f"startup failed:\n{result.stderr}")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    print(f"first response (import + startup + GET /): {min(timings):.3f}s")
+
+    if args.budget is not None and total > args.budget:
+        sys.exit(f"import main took {total:.3f}s, over the {args.budget:.3f}s budget")
+
+
+if __name__ == "__main__":
+    main()
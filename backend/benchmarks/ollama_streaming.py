@@ -0,0 +1,110 @@
+"""
+Concurrent Ollama chat streams, old sync client vs the async backend.
+
+Runs N streams at once against the stand-in server from fake_ollama.py and
+reports wall time, how often consecutive chunks came from different streams
+(interleaving), and the worst event-loop stall. The old path iterated the
+synchronous `ollama.chat(stream=True)` generator inside the coroutine, so one
+stream holds the loop until it finishes; the async backend interleaves them.
+Finally one stream is cancelled mid-way to check the server sees the client
+go away.
+
+    python benchmarks/ollama_streaming.py --streams 8 --tokens 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import ollama
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.fake_ollama import start_fake_ollama  # noqa: E402
+from services.llm_backends import OllamaBackend  # noqa: E402
+
+MODEL = "fake-chat"
+
+
+async def sync_stream(url: str):
+    # What LLMService._stream_ollama used to do
+    client = ollama.Client(host=url)
+    for chunk in client.chat(model=MODEL, messages=[{"role": "user", "content": "hi"}], stream=True):
+        if chunk["message"]["content"]:
+            yield chunk["message"]["content"]
+
+
+async def measure(make_stream, n_streams: int):
+    arrivals = []
+    max_lag = 0.0
+    running = True
+
+    async def ticker():
+        nonlocal max_lag
+        while running:
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            max_lag = max(max_lag, time.perf_counter() - start - 0.005)
+
+    async def consume(index: int):
+        async for _ in make_stream():
+            arrivals.append(index)
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(consume(i) for i in range(n_streams)))
+    elapsed = time.perf_counter() - start
+    running = False
+    await tick
+
+    switches = sum(1 for a, b in zip(arrivals, arrivals[1:]) if a != b)
+    return elapsed, switches / max(len(arrivals) - 1, 1), max_lag
+
+
+async def cancel_midway(backend: OllamaBackend, server):
+    async def consume():
+        async for _ in backend.stream("hi"):
+            pass
+
+    task = asyncio.create_task(consume())
+    await asyncio.sleep(server.token_latency * 5)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    # Give the server thread a moment to hit the closed socket
+    for _ in range(50):
+        if server.chats_cancelled:
+            break
+        await asyncio.sleep(server.token_latency)
+    return server.chats_cancelled
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=8)
+    parser.add_argument("--tokens", type=int, default=50)
+    parser.add_argument("--token-latency", type=float, default=0.01)
+    args = parser.parse_args()
+
+    server, url = start_fake_ollama(token_latency=args.token_latency, chat_tokens=args.tokens)
+    backend = OllamaBackend(MODEL, host=url)
+
+    print(f"{args.streams} concurrent streams x {args.tokens} tokens @ {args.token_latency * 1000:.0f} ms/token")
+    print(f"{'path':<8}{'wall s':>10}{'interleave':>12}{'max loop stall ms':>20}")
+    for label, make_stream in (
+        ("sync", lambda: sync_stream(url)),
+        ("async", lambda: backend.stream("hi")),
+    ):
+        elapsed, interleave, lag = await measure(make_stream, args.streams)
+        print(f"{label:<8}{elapsed:>10.2f}{interleave:>12.2f}{lag * 1000:>20.1f}")
+
+    cancelled = await cancel_midway(backend, server)
+    print(f"Cancelled mid-stream: server saw {cancelled} closed stream(s)")
+    await backend.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,97 @@
+"""
+Local PDF text extraction, the fast path in front of Gemini OCR.
+
+Generates a born-digital PDF (every --scanned-every'th page has no text
+layer, standing in for a scan) and runs FileExtractor on it with OCR stubbed
+out: the text layer read in-process and across the compute pool, and which
+pages would still be sent to OCR. Previously every PDF was uploaded whole
+and OCR'd, which takes tens of seconds.
+
+    python benchmarks/pdf_extraction.py --pages 200 --scanned-every 25
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.compute_pool import ComputePool  # noqa: E402
+from services.extraction import ExtractionCache, FileExtractor, pdf_page_count  # noqa: E402
+
+LINE = "Shared ideas need review: scale, cost, risk and privacy all matter here."
+
+
+def make_pdf(path: str, pages: int, scanned_every: int, lines: int = 40):
+    """A minimal PDF with one Helvetica text stream per page (none on 'scanned' pages)."""
+    objects = {1: b"<< /Type /Catalog /Pages 2 0 R >>", 3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"}
+    kids = []
+    for i in range(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page_id} 0 R")
+        if scanned_every and (i + 1) % scanned_every == 0:
+            stream = b""
+        else:
+            text = "".join(f"({LINE} {i}.{n}) Tj T* " for n in range(lines))
+            stream = f"BT /F1 10 Tf 12 TL 40 800 Td {text}ET".encode()
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_id} 0 R >>").encode()
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {pages} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, objects[number])
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for number in sorted(objects):
+        out += b"%010d 00000 n \n" % offsets[number]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+class OCRStub(FileExtractor):
+    async def _ocr(self, path: str, mime_type: str, session_id: str = None) -> str:
+        # Only the pages that would be uploaded are in this file
+        self.ocr_pages = pdf_page_count(path)
+        return "[ocr]"
+
+
+async def run(path: str, workers: int, parallel_pages: int):
+    pool = ComputePool(max_workers=workers)
+    await pool.start()
+    extractor = OCRStub(None, ExtractionCache(max_bytes=0), compute_pool=pool)
+    extractor.parallel_pages = parallel_pages
+    extractor.ocr_pages = 0
+    start = time.perf_counter()
+    text = await extractor._analyze(path, "application/pdf")
+    elapsed = time.perf_counter() - start
+    pool.close()
+    return elapsed, len(text), extractor.ocr_pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--scanned-every", type=int, default=25)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.pdf")
+    make_pdf(path, args.pages, args.scanned_every)
+    print(f"{args.pages} pages ({os.path.getsize(path) / 1024:.0f} KiB), {os.cpu_count()} CPUs")
+    print(f"{'path':<24}{'seconds':>10}{'chars':>10}{'pages to OCR':>14}")
+    runs = [("in-process", 0, args.pages + 1)]
+    if args.workers > 1:
+        runs.append((f"compute pool x{args.workers}", args.workers, 1))
+    for label, workers, parallel_pages in runs:
+        elapsed, chars, ocr_pages = asyncio.run(run(path, workers, parallel_pages))
+        print(f"{label:<24}{elapsed:>10.3f}{chars:>10}{ocr_pages:>14}")
+
+
+if __name__ == "__main__":
+    main()
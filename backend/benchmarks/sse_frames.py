@@ -0,0 +1,93 @@
+"""
+Per-token cost of the streaming path: frames/sec and CPU per streamed token.
+
+Feeds a synthetic token stream (a few characters per chunk, like a local
+model) through the old path, one json.dumps f-string frame per chunk plus
+`response += chunk`, and through the current one: coalescing, pre-encoded
+frames (orjson when installed) and list accumulation, published once to a
+session hub with several subscribers. The source yields without sleeping,
+so coalescing is driven by the byte threshold.
+
+    python benchmarks/sse_frames.py --tokens 200000 --subscribers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services import sse  # noqa: E402
+from services.sse import TokenCoalescer  # noqa: E402
+from services.broadcast import SessionHub  # noqa: E402
+
+WORDS = ["scale", " users", " cost", " risk", " growth", " privacy", ",", " the", " a", " latency"]
+
+
+async def token_source(n: int):
+    for i in range(n):
+        yield WORDS[i % len(WORDS)]
+
+
+async def old_path(n: int, subscribers: int):
+    frames = 0
+    response_content = ""
+    async for chunk in token_source(n):
+        response_content += chunk
+        # Each viewer had its own generator doing the same work
+        for _ in range(subscribers):
+            frame = f"event: token\ndata: {json.dumps({'text': chunk})}\n\n"
+            frame.encode("utf-8")  # what the response does with str frames
+            frames += 1
+    return frames, len(response_content)
+
+
+async def new_path(n: int, subscribers: int, max_bytes: int, max_delay: float):
+    hub = SessionHub("bench", queue_size=10 ** 9)
+    subs = [hub.subscribe() for _ in range(subscribers)]
+    parts = []
+    frames = 0
+    coalescer = TokenCoalescer(lambda text: hub.publish("token", {"text": text}), max_bytes, max_delay)
+    async for chunk in token_source(n):
+        parts.append(chunk)
+        coalescer.add(chunk)
+        # Drain like the response writers would
+        for sub in subs:
+            while sub.events:
+                sub.events.popleft().frame
+                frames += 1
+    coalescer.flush()
+    for sub in subs:
+        frames += len(sub.events)
+    return frames, len("".join(parts))
+
+
+def measure(label: str, coro, n: int):
+    wall, cpu = time.perf_counter(), time.process_time()
+    frames, chars = asyncio.run(coro)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    print(f"{label:<28}{frames:>10}{frames / wall:>14,.0f}{cpu / n * 1e6:>16.2f}")
+    return chars
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=200_000)
+    parser.add_argument("--subscribers", type=int, default=4)
+    parser.add_argument("--coalesce-bytes", type=int, default=256)
+    parser.add_argument("--coalesce-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    print(f"{args.tokens} tokens, {args.subscribers} subscribers, serializer: {'orjson' if sse.orjson else 'json'}")
+    print(f"{'path':<28}{'frames':>10}{'frames/s':>14}{'CPU us/token':>16}")
+    expected = measure("per-chunk json f-strings", old_path(args.tokens, args.subscribers), args.tokens)
+    got = measure("hub, no coalescing", new_path(args.tokens, args.subscribers, 0, 0), args.tokens)
+    assert got == expected
+    got = measure(f"hub, coalesce {args.coalesce_bytes}B/{args.coalesce_ms:g}ms",
+                  new_path(args.tokens, args.subscribers, args.coalesce_bytes, args.coalesce_ms / 1000), args.tokens)
+    assert got == expected
+
+
+if __name__ == "__main__":
+    main()
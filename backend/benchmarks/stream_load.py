@@ -0,0 +1,86 @@
+"""
+Load test for concurrent /brainstorm/{id}/stream clients.
+
+Starts N sessions against a running backend, keeps all N streams open for a
+fixed duration and reports aggregate turns/sec and tokens/sec. Running it with
+increasing client counts shows whether throughput scales with concurrency:
+
+    python benchmarks/stream_load.py --base-url http://localhost:8000 --clients 1,10,50,200
+"""
+import argparse
+import asyncio
+import time
+import httpx
+
+
+async def create_session(client: httpx.AsyncClient, topic: str) -> str:
+    res = await client.post("/brainstorm", data={"topic": topic})
+    res.raise_for_status()
+    return res.json()["session_id"]
+
+
+async def consume_stream(client: httpx.AsyncClient, session_id: str, topic: str, deadline: float, stats: dict):
+    params = {"topic": topic}
+    try:
+        async with client.stream("GET", f"/brainstorm/{session_id}/stream", params=params) as res:
+            event = None
+            async for line in res.aiter_lines():
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                    if event == "agent_end":
+                        stats["turns"] += 1
+                    elif event == "token":
+                        stats["tokens"] += 1
+                    if stats["first_token"] is None and event == "token":
+                        stats["first_token"] = time.perf_counter()
+                if time.perf_counter() >= deadline:
+                    break
+    except httpx.HTTPError as e:
+        stats["errors"] += 1
+        print(f"Stream {session_id} failed: {e}")
+
+
+async def run_level(base_url: str, n_clients: int, duration: float, topic: str) -> dict:
+    limits = httpx.Limits(max_connections=n_clients + 10, max_keepalive_connections=n_clients + 10)
+    timeout = httpx.Timeout(None, connect=10.0)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=timeout) as client:
+        session_ids = await asyncio.gather(*(create_session(client, f"{topic} #{i}") for i in range(n_clients)))
+
+        per_stream = [{"turns": 0, "tokens": 0, "errors": 0, "first_token": None} for _ in session_ids]
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(
+            consume_stream(client, sid, f"{topic} #{i}", deadline, per_stream[i])
+            for i, sid in enumerate(session_ids)
+        ))
+        elapsed = time.perf_counter() - start
+
+    turns = sum(s["turns"] for s in per_stream)
+    tokens = sum(s["tokens"] for s in per_stream)
+    ttfts = sorted(s["first_token"] - start for s in per_stream if s["first_token"] is not None)
+    return {
+        "clients": n_clients,
+        "turns_per_sec": turns / elapsed,
+        "tokens_per_sec": tokens / elapsed,
+        "median_ttft": ttfts[len(ttfts) // 2] if ttfts else None,
+        "errors": sum(s["errors"] for s in per_stream),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--clients", default="1,10,50,100", help="Comma separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to keep each level streaming")
+    parser.add_argument("--topic", default="Load test topic")
+    args = parser.parse_args()
+
+    print(f"{'clients':>8} {'turns/s':>10} {'tokens/s':>10} {'ttft p50':>10} {'errors':>7}")
+    for level in [int(c) for c in args.clients.split(",")]:
+        r = await run_level(args.base_url, level, args.duration, args.topic)
+        ttft = f"{r['median_ttft']:.2f}s" if r["median_ttft"] is not None else "-"
+        print(f"{r['clients']:>8} {r['turns_per_sec']:>10.2f} {r['tokens_per_sec']:>10.1f} {ttft:>10} {r['errors']:>7}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,31 +1,100 @@
 from __future__ import annotations
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Body
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Body, Header, Request, Depends
 from dotenv import load_dotenv
 import os
-from io import BytesIO
-import pypdf
-import google.generativeai as genai
-import tempfile
+import asyncio
+import logging
+import importlib
 import pathlib
 
 # Point to .env in parent directory
 env_path = pathlib.Path(__file__).parent.parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
-print(f"DEBUG: Loaded .env from {env_path}")
-print(f"DEBUG: SUPABASE_URL present: {bool(os.getenv('SUPABASE_URL'))}")
-print(f"DEBUG: SUPABASE_KEY present: {bool(os.getenv('SUPABASE_KEY'))}")
+# LOG_LEVEL=DEBUG brings back the per-request debug lines
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+)
+logger = logging.getLogger(__name__)
+
+logger.debug("Loaded .env from %s", env_path)
+logger.debug("SUPABASE_URL present: %s", bool(os.getenv('SUPABASE_URL')))
+logger.debug("SUPABASE_KEY present: %s", bool(os.getenv('SUPABASE_KEY')))
 
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import BaseModel
 from services.llm import LLMService
-from services.database import DatabaseService
+from services.storage import create_storage
+from services.repository import AsyncRepository
 from services.orchestrator import Orchestrator
 from services.clustering import ClusteringService
+from services.compute_pool import ComputePool
+from services.extraction import FileExtractor
+from services.metrics import REGISTRY, ACTIVE_SESSIONS, VIEWERS
 import uuid
 
-app = FastAPI(title="Multi-Agent Brainstorming System")
+class Services:
+    """
+    The shared services, built once per process at startup (see lifespan)
+    and handed to endpoints through `Depends(get_services)`.
+    """
+
+    # Heavy dependencies the services import on first use (several seconds in
+    # total), loaded in the background after startup by warm_up()
+    WARMUP_MODULES = [
+        "google.generativeai",
+        "ollama",
+        "services.cluster_engine",
+        "services.online_clustering",
+        "services.labeling",
+        "pypdf",
+    ]
+
+    def __init__(self):
+        self.storage = create_storage()
+        self.repository = AsyncRepository(self.storage)
+        self.llm_service = LLMService()
+        self.compute_pool = ComputePool()
+        self.clustering_service = ClusteringService(self.repository, self.llm_service, self.compute_pool)
+        self.orchestrator = Orchestrator(self.llm_service, self.repository, self.clustering_service)
+        self.file_extractor = FileExtractor(self.llm_service, compute_pool=self.compute_pool)
+
+    async def warm_up(self):
+        for name in self.WARMUP_MODULES:
+            try:
+                await asyncio.to_thread(importlib.import_module, name)
+            except ImportError as e:
+                logger.warning("Warm-up: could not import %s: %s", name, e)
+        await self.compute_pool.start()
+
+    async def close(self):
+        # Persist any responses still queued in the write-behind buffer
+        await self.repository.close()
+        await self.llm_service.close()
+        self.compute_pool.close()
+
+
+def get_services(request: Request) -> Services:
+    return request.app.state.services
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    services = Services()
+    app.state.services = services
+    warm_up = None
+    if os.getenv("STARTUP_WARMUP", "1") == "1":
+        # Requests are served meanwhile; the first one needing a module waits for it
+        warm_up = asyncio.create_task(services.warm_up())
+    yield
+    if warm_up:
+        warm_up.cancel()
+    await services.close()
+
+app = FastAPI(title="Multi-Agent Brainstorming System", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -35,70 +104,35 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize services
-# In a real app, use dependency injection
-db_service = DatabaseService()
-llm_service = LLMService()
-orchestrator = Orchestrator(llm_service, db_service)
-clustering_service = ClusteringService(db_service, llm_service)
-
-
 
 @app.post("/brainstorm")
 async def start_brainstorm(
     topic: str = Form(...),
     file: UploadFile | None = File(None),
-    agent_ids: str | None = Form(None) # Comma separated IDs
+    agent_ids: str | None = Form(None), # Comma separated IDs
+    services: Services = Depends(get_services),
 ):
     session_id = str(uuid.uuid4())
     
     context_text = ""
     if file:
         try:
-            # Save uploaded file to temp file
-            suffix = pathlib.Path(file.filename).suffix
-            with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-                content = await file.read()
-                tmp.write(content)
-                tmp_path = tmp.name
-
-            try:
-                # Upload to Gemini
-                print(f"DEBUG: Uploading {file.filename} to Gemini...")
-                uploaded_file = genai.upload_file(tmp_path, mime_type=file.content_type)
-                
-                # Generate content (OCR/Description)
-                # Using 2.0 Flash Exp as requested (user said 2.5, likely meant 2.0-exp)
-                model = genai.GenerativeModel('gemini-2.5-flash')
-                
-                prompt = "Extract all text from this document. If it is an image or scanned PDF, perform OCR. Also describe any diagrams or visual elements found."
-                print("DEBUG: Generating content description...")
-                response = await model.generate_content_async([prompt, uploaded_file])
-                
-                context_text = f"\n\n[Attached File Analysis]:\n{response.text}"
-                print(f"DEBUG: Successfully processed file. extracted {len(context_text)} chars.")
-                
-            except Exception as e:
-                print(f"Error processing file with Gemini: {e}")
-                context_text = f"\n\n[Attached File Error]: Could not process file. Error: {str(e)}"
-            finally:
-                # Cleanup temp file
-                if os.path.exists(tmp_path):
-                    os.remove(tmp_path)
-                    
+            # Streamed to disk and hashed; a document seen before skips the upload and OCR
+            analysis = await services.file_extractor.extract(file, session_id=session_id)
+            context_text = f"\n\n[Attached File Analysis]:\n{analysis}"
+            logger.debug("Successfully processed file. extracted %d chars.", len(context_text))
         except Exception as e:
-            print(f"Error handling file upload: {e}")
+            logger.error("Error processing file with Gemini: %s", e)
+            context_text = f"\n\n[Attached File Error]: Could not process file. Error: {str(e)}"
 
     full_topic = f"{topic}{context_text}"
-    print(f"DEBUG: Session {session_id} - Full Topic Length: {len(full_topic)}")
+    logger.debug("Session %s - Full Topic Length: %d", session_id, len(full_topic))
 
     # Create session in DB
-    if db_service.get_client():
-        db_service.get_client().table("sessions").insert({
-            "id": session_id,
-            "topic": full_topic # Store the combined topic + file context
-        }).execute()
-        print(f"DEBUG: Session {session_id} - Saved to DB")
+    if services.repository.available:
+        # Store the combined topic + file context
+        await services.repository.create_session(session_id, full_topic)
+        logger.debug("Session %s - Saved to DB", session_id)
     return {"session_id": session_id}
 
 class CreateAgentRequest(BaseModel):
@@ -120,36 +154,31 @@ AGENT_PRESETS = [
 ]
 
 @app.post("/agents")
-async def create_agent(agent: CreateAgentRequest):
-    if db_service.get_client():
+async def create_agent(agent: CreateAgentRequest, services: Services = Depends(get_services)):
+    if services.repository.available:
         try:
-            res = db_service.get_client().table("custom_agents").insert({
-                "name": agent.name,
-                "role": agent.role,
-                "prompt": agent.prompt
-            }).execute()
-            return {"message": "Agent created", "data": res.data}
+            data = await services.repository.create_custom_agent(agent.name, agent.role, agent.prompt)
+            return {"message": "Agent created", "data": data}
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     raise HTTPException(status_code=503, detail="Database not available")
 
 @app.get("/agents")
-async def get_agents():
-    if db_service.get_client():
+async def get_agents(services: Services = Depends(get_services)):
+    if services.repository.available:
         try:
-            res = db_service.get_client().table("custom_agents").select("*").execute()
-            return {"agents": res.data}
+            return {"agents": await services.repository.fetch_custom_agents()}
         except Exception as e:
              raise HTTPException(status_code=500, detail=str(e))
     # Fallback to local defaults if DB is down (though we raise 503 now)
     return {"agents": []}
 
 @app.delete("/agents/{agent_id}")
-async def delete_agent(agent_id: str):
-    if db_service.get_client():
+async def delete_agent(agent_id: str, services: Services = Depends(get_services)):
+    if services.repository.available:
         try:
-            res = db_service.get_client().table("custom_agents").delete().eq("id", agent_id).execute()
-            return {"message": "Agent deleted", "data": res.data}
+            data = await services.repository.delete_custom_agent(agent_id)
+            return {"message": "Agent deleted", "data": data}
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
     raise HTTPException(status_code=503, detail="Database not available")
@@ -159,37 +188,81 @@ async def get_agent_presets():
     return {"presets": AGENT_PRESETS}
 
 @app.get("/brainstorm/{session_id}/stream")
-async def stream_brainstorm(session_id: str, topic: str = "Unknown Topic", agent_ids: str = None):
+async def stream_brainstorm(
+    request: Request,
+    session_id: str,
+    topic: str = "Unknown Topic",
+    agent_ids: str = None,
+    cursor: str = None, # Same as Last-Event-ID, for clients that can't set headers
+    last_event_id: str | None = Header(None, alias="Last-Event-ID"),
+    services: Services = Depends(get_services),
+):
     # Retrieve topic from DB if not provided or if we want to double check
     # But prioritizing query param for robustness if DB is down
     db_topic = None
-    if db_service.get_client():
+    if services.repository.available:
         try:
-            res = db_service.get_client().table("sessions").select("topic").eq("id", session_id).execute()
-            if res.data:
-                db_topic = res.data[0]['topic']
-                print(f"DEBUG: Stream {session_id} - Fetched DB Topic Length: {len(db_topic)}")
+            db_topic = await services.repository.get_session_topic(session_id)
+            if db_topic:
+                logger.debug("Stream %s - Fetched DB Topic Length: %d", session_id, len(db_topic))
         except Exception as e:
-            print(f"DB Error fetching topic: {e}")
+            logger.error("DB Error fetching topic: %s", e)
     
     # Use DB topic if available, otherwise use query param
     final_topic = db_topic if db_topic else topic
-    print(f"DEBUG: Stream {session_id} - Using Topic Length: {len(final_topic)}")
+    logger.debug("Stream %s - Using Topic Length: %d", session_id, len(final_topic))
     
     return StreamingResponse(
-        orchestrator.run_brainstorming_session(final_topic, session_id, agent_ids.split(",") if agent_ids else None),
+        services.orchestrator.run_brainstorming_session(
+            final_topic, session_id, agent_ids.split(",") if agent_ids else None, last_event_id or cursor,
+            is_disconnected=request.is_disconnected,
+        ),
         media_type="text/event-stream"
     )
     
     return StreamingResponse(
-        orchestrator.run_brainstorming_session(topic, session_id),
+        services.orchestrator.run_brainstorming_session(topic, session_id),
         media_type="text/event-stream"
     )
 
 @app.post("/brainstorm/{session_id}/cluster")
-async def cluster_ideas(session_id: str):
-    clusters = await clustering_service.cluster_responses(session_id)
-    return {"clusters": clusters}
+async def cluster_ideas(session_id: str, labels: str = "llm", refine: bool = False, services: Services = Depends(get_services)):
+    # labels=keywords names clusters locally (no LLM); refine=true adds LLM names in the background
+    if labels not in ("llm", "keywords"):
+        raise HTTPException(status_code=400, detail="labels must be 'llm' or 'keywords'")
+    job = services.clustering_service.submit(session_id, labeling=labels, refine=refine)
+    # Small sessions finish within the wait and are answered directly; large ones get a job id to poll
+    done, _ = await asyncio.wait({job.task}, timeout=services.clustering_service.inline_seconds)
+    if not done:
+        return JSONResponse(status_code=202, content=job.to_dict())
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    return {"clusters": job.clusters}
+
+@app.get("/brainstorm/{session_id}/cluster/{job_id}")
+async def cluster_job_status(session_id: str, job_id: str, services: Services = Depends(get_services)):
+    job = services.clustering_service.get_job(job_id)
+    if job is None or job.session_id != session_id:
+        raise HTTPException(status_code=404, detail="Unknown clustering job")
+    return job.to_dict()
+
+@app.get("/llm/stats")
+async def llm_stats(services: Services = Depends(get_services)):
+    # Queue depth, in-flight calls and wait times per priority class
+    return services.llm_service.stats()
+
+@app.get("/sessions/stats")
+async def session_stats(services: Services = Depends(get_services)):
+    # Live sessions and viewers, early stops by reason, LLM tokens those stops saved
+    return services.orchestrator.stats()
+
+@app.get("/metrics")
+async def metrics(services: Services = Depends(get_services)):
+    # Prometheus text format; gauges are sampled at scrape time
+    stats = services.orchestrator.stats()
+    ACTIVE_SESSIONS.set(stats["active_sessions"])
+    VIEWERS.set(stats["viewers"])
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
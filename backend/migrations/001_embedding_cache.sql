@@ -0,0 +1,37 @@
+-- Upgrades an `embeddings` table created by the original schema.sql
+-- (response_id not null, embedding vector(384)) to the content-hash cache
+-- layout the backend reads and writes now. Safe to run more than once; new
+-- databases created from the current schema.sql don't need it.
+--
+-- The old rows have no content hash or model and can't be looked up by the
+-- cache, so they are deleted; responses are re-embedded on their next /cluster.
+
+begin;
+
+alter table embeddings add column if not exists content_hash text;
+alter table embeddings add column if not exists model text;
+alter table embeddings add column if not exists dim integer;
+alter table embeddings add column if not exists scale real;
+alter table embeddings add column if not exists vector bytea;
+alter table embeddings add column if not exists created_at timestamp with time zone default timezone('utc'::text, now());
+
+delete from embeddings where content_hash is null or model is null or vector is null;
+
+alter table embeddings drop column if exists embedding;
+
+-- Cached vectors outlive the response they were first computed for
+alter table embeddings alter column response_id drop not null;
+alter table embeddings drop constraint if exists embeddings_response_id_fkey;
+alter table embeddings add constraint embeddings_response_id_fkey
+  foreign key (response_id) references responses(id) on delete set null;
+
+alter table embeddings alter column content_hash set not null;
+alter table embeddings alter column model set not null;
+alter table embeddings alter column dim set not null;
+alter table embeddings alter column scale set not null;
+alter table embeddings alter column vector set not null;
+alter table embeddings alter column created_at set not null;
+
+create unique index if not exists embeddings_model_hash_idx on embeddings (model, content_hash);
+
+commit;
@@ -0,0 +1,4 @@
+-- Persist each session's rolling context summary, so a resumed session
+-- restores it instead of re-summarizing its whole history.
+alter table sessions add column if not exists summary text;
+alter table sessions add column if not exists summary_turns integer not null default 0;
@@ -1,3 +1,6 @@
+-- Schema for new databases. Existing databases are upgraded with the files in
+-- migrations/, applied in order.
+
 -- Enable the pgvector extension to work with embedding vectors
 create extension if not exists vector;
 
@@ -5,6 +8,9 @@ create extension if not exists vector;
 create table sessions (
   id uuid default gen_random_uuid() primary key,
   topic text not null,
+  -- Rolling context summary, covering the session's first summary_turns responses
+  summary text,
+  summary_turns integer not null default 0,
   created_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
 
@@ -16,16 +22,24 @@ create table responses (
   content text not null,
   created_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
+-- History replay and clustering read a session's responses in creation order
+create index responses_session_created_idx on responses (session_id, created_at);
 
--- Create embeddings table (storing embeddings for responses)
--- We can store the embedding directly in the responses table or a separate table.
--- Let's add it to a separate table to keep things clean, or just add a column to responses.
--- Adding a column is easier for simple setups. Let's do a separate table for clarity as requested.
+-- Create embeddings table
+-- Cache of response embeddings keyed by content hash and model, so a response
+-- is embedded once no matter how often its session is re-clustered. Vectors
+-- are stored int8-quantized with a per-vector scale (value = int8 * scale).
 create table embeddings (
   id uuid default gen_random_uuid() primary key,
-  response_id uuid references responses(id) on delete cascade not null,
-  embedding vector(384) -- Assuming 384 dimensions for all-MiniLM-L6-v2
+  response_id uuid references responses(id) on delete set null,
+  content_hash text not null,
+  model text not null,
+  dim integer not null,
+  scale real not null,
+  vector bytea not null,
+  created_at timestamp with time zone default timezone('utc'::text, now()) not null
 );
+create unique index embeddings_model_hash_idx on embeddings (model, content_hash);
 
 -- Create clusters table
 create table clusters (
@@ -0,0 +1,248 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+from services.sse import format_event, event_id
+
+logger = logging.getLogger(__name__)
+
+
+class Event:
+    """One SSE event, serialized once no matter how many subscribers receive it."""
+
+    __slots__ = ("name", "data", "id", "seq", "frame")
+
+    def __init__(self, name: str, data: Dict[str, Any], id: str = None, seq: int = 0):
+        self.name = name
+        self.data = data
+        self.id = id
+        self.seq = seq  # position within the turn in progress
+        self.frame = format_event(name, data, id)
+
+
+def token_data(text: str, agent: Optional[str]) -> Dict[str, Any]:
+    return {"text": text} if agent is None else {"text": text, "agent": agent}
+
+
+def mergeable(a: Event, b: Event) -> bool:
+    """Consecutive token events of the same agent (parallel rounds interleave agents)."""
+    return a.name == "token" and b.name == "token" and a.data.get("agent") == b.data.get("agent")
+
+
+def coalesce(events) -> List[Event]:
+    """Merges runs of consecutive token events into one, preserving the text."""
+    merged: List[Event] = []
+    run: List[Event] = []
+
+    def flush_run():
+        if len(run) == 1:
+            merged.append(run[0])
+        elif run:
+            last = run[-1]
+            text = "".join(e.data["text"] for e in run)
+            merged.append(Event("token", token_data(text, last.data.get("agent")), last.id, last.seq))
+        run.clear()
+
+    for event in events:
+        if event.name == "token":
+            if run and not mergeable(run[-1], event):
+                flush_run()
+            run.append(event)
+        else:
+            flush_run()
+            merged.append(event)
+    flush_run()
+    return merged
+
+
+class Subscriber:
+    """
+    A bounded per-viewer queue. The producer only appends; it never waits on
+    a viewer, so a slow connection cannot stall generation for the others.
+    """
+
+    def __init__(self, max_queue: int, policy: str):
+        self.max_queue = max_queue
+        self.policy = policy
+        self.events: deque = deque()
+        self.closed = False
+        self.coalesced = 0
+        # Hub cursor when live events started reaching this queue; catch-up covers up to here
+        self.start_cursor = 0
+        self._wakeup = asyncio.Event()
+
+    def push(self, event: Event) -> bool:
+        """Queues an event; returns False if the subscriber fell too far behind and was cut off."""
+        if self.closed:
+            return False
+        if (self.policy == "coalesce" and len(self.events) >= self.max_queue
+                and self.events and mergeable(self.events[-1], event)):
+            # Already lagging: extend the queued token instead of growing the queue
+            tail = self.events.pop()
+            text = tail.data["text"] + event.data["text"]
+            self.events.append(Event("token", token_data(text, event.data.get("agent")), event.id, event.seq))
+            self._wakeup.set()
+            return True
+        self.events.append(event)
+        if len(self.events) > self.max_queue:
+            if self.policy == "coalesce":
+                # Token runs collapse to one event each; only cut off if that is not enough
+                self.events = deque(coalesce(self.events))
+                self.coalesced += 1
+            if len(self.events) > self.max_queue:
+                self.close()
+                return False
+        self._wakeup.set()
+        return True
+
+    def close(self):
+        self.closed = True
+        self._wakeup.set()
+
+    async def __aiter__(self):
+        while True:
+            while self.events:
+                yield self.events.popleft().frame
+            if self.closed:
+                return
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+
+class SessionHub:
+    """
+    Fans one session's event stream out to every viewer.
+
+    A single producer task publishes events; each subscriber reads from its own
+    bounded queue. The hub tracks the cursor of the last finished turn and
+    keeps only the events of the turn in progress: finished turns are stored,
+    so catching a viewer up on them is a keyset query, not a memory replay.
+    Every event carries an SSE id "<cursor>-<n>". When the last subscriber
+    leaves the producer is cancelled.
+    """
+
+    def __init__(self, session_id: str, queue_size: int = None, policy: str = None,
+                 on_close: Optional[Callable[["SessionHub"], None]] = None):
+        self.session_id = session_id
+        self.queue_size = queue_size or int(os.getenv("SSE_SUBSCRIBER_QUEUE", "512"))
+        self.policy = policy or os.getenv("SSE_SLOW_CONSUMER_POLICY", "coalesce")
+        self.on_close = on_close
+        self.subscribers: List[Subscriber] = []
+        self.cursor = 0                 # created_at (micros) of the last finished turn
+        self.partial: List[Event] = []  # events of the turn in progress
+        self.ready = asyncio.Event()    # set once the producer has loaded the session
+        self.last_joined = time.monotonic()
+        self._viewer_joined = asyncio.Event()
+        self.closed = False
+        self.dropped_subscribers = 0
+        self._producer: Optional[asyncio.Task] = None
+
+    def start(self, produce: Callable[["SessionHub"], Awaitable[None]]):
+        self._producer = asyncio.create_task(self._run(produce))
+
+    async def _run(self, produce: Callable[["SessionHub"], Awaitable[None]]):
+        try:
+            await produce(self)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error("Session %s producer failed: %s", self.session_id, e)
+        finally:
+            self.close()
+
+    def set_ready(self, cursor: int):
+        """Called by the producer once history is loaded, before its first event."""
+        self.cursor = cursor
+        for subscriber in self.subscribers:
+            subscriber.start_cursor = cursor
+        self.ready.set()
+
+    def subscribe(self, resume: Optional[tuple] = None) -> Subscriber:
+        """
+        Attaches a viewer. It gets the events of the turn in progress it has
+        not seen (per `resume`, a parsed event id), compacted, then live ones;
+        finished turns up to `start_cursor` are for the caller to load.
+        """
+        subscriber = Subscriber(self.queue_size, self.policy)
+        subscriber.start_cursor = self.cursor
+        seen = resume[1] if resume and resume[0] == self.cursor else 0
+        backlog = coalesce(e for e in self.partial if e.seq > seen)
+        subscriber.events.extend(backlog)
+        # The backlog is the baseline, not lag
+        subscriber.max_queue = self.queue_size + len(backlog)
+        if self.closed:
+            subscriber.close()
+        else:
+            self.subscribers.append(subscriber)
+            self.last_joined = time.monotonic()
+            self._viewer_joined.set()
+        return subscriber
+
+    async def wait_for_viewer(self):
+        """Returns once a viewer subscribes after this call."""
+        self._viewer_joined.clear()
+        await self._viewer_joined.wait()
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscriber.close()
+        if subscriber in self.subscribers:
+            self.subscribers.remove(subscriber)
+        if not self.subscribers and self._producer and not self._producer.done():
+            self._producer.cancel()
+
+    def publish(self, name: str, data: Dict[str, Any], end_of_turn: Optional[int] = None):
+        """
+        Sends an event to every subscriber. Passing `end_of_turn` (the cursor of
+        the turn just stored) marks this as the turn's last event.
+        """
+        if end_of_turn is not None:
+            self.cursor = end_of_turn
+            self.partial = []
+            event = Event(name, data, event_id(end_of_turn, 0))
+        else:
+            seq = len(self.partial) + 1
+            event = Event(name, data, event_id(self.cursor, seq), seq)
+            self.partial.append(event)
+        for subscriber in list(self.subscribers):
+            if not subscriber.push(event):
+                logger.warning("Session %s: dropping subscriber that fell %s events behind", self.session_id, subscriber.max_queue)
+                self.dropped_subscribers += 1
+                self.subscribers.remove(subscriber)
+        if not self.subscribers and self._producer and not self._producer.done():
+            self._producer.cancel()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.ready.set()
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.subscribers = []
+        if self.on_close:
+            self.on_close(self)
+
+
+class HubRegistry:
+    """Live hubs by session id; a hub removes itself once its producer stops."""
+
+    def __init__(self):
+        self.hubs: Dict[str, SessionHub] = {}
+
+    def __len__(self) -> int:
+        return len(self.hubs)
+
+    def get(self, session_id: str) -> Optional[SessionHub]:
+        return self.hubs.get(session_id)
+
+    def create(self, session_id: str, produce: Callable[[SessionHub], Awaitable[None]]) -> SessionHub:
+        hub = SessionHub(session_id, on_close=self._remove)
+        self.hubs[session_id] = hub
+        hub.start(produce)
+        return hub
+
+    def _remove(self, hub: SessionHub):
+        if self.hubs.get(hub.session_id) is hub:
+            del self.hubs[hub.session_id]
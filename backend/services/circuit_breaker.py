@@ -0,0 +1,56 @@
+import time
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of one LLM backend.
+
+    Closed: calls go through. After `failure_threshold` consecutive failures
+    the breaker opens and calls skip the backend. Once `reset_timeout` has
+    passed it reports half-open, and the LLM service runs a cheap health probe
+    (not a user request): success closes it, failure re-opens it for another
+    timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self) -> bool:
+        return self.state == self.CLOSED
+
+    def begin_probe(self) -> bool:
+        """Claims the single probe slot of a half-open breaker."""
+        if self.state != self.HALF_OPEN or self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        self.probing = False
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                self.trips += 1
+            self.opened_at = time.monotonic()
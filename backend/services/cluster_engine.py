@@ -0,0 +1,79 @@
+import os
+import numpy as np
+from scipy import sparse
+from sklearn.cluster import AgglomerativeClustering, MiniBatchKMeans
+from sklearn.decomposition import PCA
+
+# Same cut as the original single-pass agglomerative clustering
+DISTANCE_THRESHOLD = 1.5
+# Dimensions k-means works in for large inputs; centroids are rebuilt in full space
+REDUCED_DIM = 64
+
+
+def cluster_embeddings(embeddings: np.ndarray, distance_threshold: float = DISTANCE_THRESHOLD, seed: int = 0) -> np.ndarray:
+    """
+    Assigns a cluster label to every row of `embeddings`, picking the strategy by size.
+
+    Up to CLUSTER_EXACT_MAX rows run exact Ward agglomerative clustering, which
+    needs O(n^2) memory. Larger inputs are first compressed into micro-clusters
+    with mini-batch k-means and only the micro-cluster centroids are merged
+    agglomeratively with the same threshold, keeping memory linear in n.
+    Labels are contiguous, ordered by first appearance, and deterministic for
+    a fixed seed.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    n = len(embeddings)
+    if n < 2:
+        return np.zeros(n, dtype=int)
+
+    exact_max = int(os.getenv("CLUSTER_EXACT_MAX", "2000"))
+    if n <= exact_max:
+        labels = _agglomerative(embeddings, distance_threshold)
+    else:
+        labels = _micro_cluster_merge(embeddings, distance_threshold, seed)
+    return _relabel_by_first_appearance(labels)
+
+
+def _agglomerative(embeddings: np.ndarray, distance_threshold: float) -> np.ndarray:
+    model = AgglomerativeClustering(n_clusters=None, distance_threshold=distance_threshold)
+    return model.fit_predict(embeddings)
+
+
+def _micro_cluster_merge(embeddings: np.ndarray, distance_threshold: float, seed: int) -> np.ndarray:
+    n, dim = embeddings.shape
+    # ~4 * sqrt(n) micro-clusters: 400 for 10k rows, ~900 for 50k
+    n_micro = int(min(n, max(64, 4 * np.sqrt(n))))
+
+    reduced = embeddings
+    if dim > REDUCED_DIM:
+        reduced = PCA(n_components=REDUCED_DIM, svd_solver="randomized", random_state=seed).fit_transform(embeddings)
+    kmeans = MiniBatchKMeans(
+        n_clusters=n_micro,
+        random_state=seed,
+        batch_size=1024,
+        n_init=1,
+        max_iter=100,
+    )
+    micro_labels = kmeans.fit_predict(reduced)
+
+    # Mean of each micro-cluster in the original space, via a sparse indicator product
+    indicator = sparse.csr_matrix(
+        (np.ones(n, dtype=np.float32), (micro_labels, np.arange(n))),
+        shape=(n_micro, n),
+    )
+    counts = np.bincount(micro_labels, minlength=n_micro)
+    used = np.flatnonzero(counts)
+    centroids = np.asarray(indicator[used] @ embeddings) / counts[used, None]
+    if len(centroids) < 2:
+        return np.zeros(n, dtype=int)
+    centroid_labels = _agglomerative(centroids, distance_threshold)
+
+    lookup = np.zeros(n_micro, dtype=int)
+    lookup[used] = centroid_labels
+    return lookup[micro_labels]
+
+
+def _relabel_by_first_appearance(labels: np.ndarray) -> np.ndarray:
+    _, first_index, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.argsort(np.argsort(first_index))
+    return order[inverse.reshape(-1)]
@@ -1,170 +1,494 @@
-from typing import List, Dict, Any
-import google.generativeai as genai
-from sklearn.cluster import AgglomerativeClustering
-import numpy as np
+from typing import List, Dict, Any, Tuple, Optional, TYPE_CHECKING
+from collections import OrderedDict
+import os
 import json
-import ollama
-from services.database import DatabaseService
+import uuid
+import time
+import random
+import asyncio
+import hashlib
+import logging
+import numpy as np
+from services.repository import AsyncRepository
 from services.llm import LLMService
+from services.embeddings import EmbeddingService
+from services.compute_pool import ComputePool
+from services.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+if TYPE_CHECKING:
+    from services.online_clustering import OnlineClusterState
+
+# The clustering modules pull in scikit-learn/scipy (~2s to import), so they
+# are imported on first use rather than at startup. Fits and labeling run in
+# the compute pool's worker processes.
+
+NAME_CACHE_SIZE = 4096
+# Finished jobs kept for polling
+MAX_FINISHED_JOBS = 100
+
+
+class ClusterJob:
+    """One clustering run, polled by id when it outlives its request."""
+
+    def __init__(self, session_id: str, labeling: str):
+        self.id = str(uuid.uuid4())
+        self.session_id = session_id
+        self.labeling = labeling
+        self.status = "running"  # running, done or failed
+        self.clusters: Optional[List[Dict[str, Any]]] = None
+        self.error: Optional[str] = None
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            "job_id": self.id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "elapsed": round((self.finished_at or time.time()) - self.started_at, 3),
+        }
+        if self.status == "done":
+            result["clusters"] = self.clusters
+        elif self.status == "failed":
+            result["error"] = self.error
+        return result
+
 
 class ClusteringService:
-    def __init__(self, db_service: DatabaseService, llm_service: LLMService):
-        self.db_service = db_service
+    def __init__(self, repository: AsyncRepository, llm_service: LLMService, compute_pool: ComputePool = None):
+        self.repository = repository
         self.llm_service = llm_service
-        # Model loading removed (using API)
+        self.embedding_service = EmbeddingService(repository)
+        self.compute_pool = compute_pool or ComputePool()
+        # /cluster answers inline when a run finishes within this, otherwise with a job to poll
+        self.inline_seconds = float(os.getenv("CLUSTER_INLINE_SECONDS", "2"))
+        self.jobs: "OrderedDict[str, ClusterJob]" = OrderedDict()
+        # Online mode assigns responses to clusters as they are generated
+        self.online_enabled = os.getenv("ONLINE_CLUSTERING", "0") == "1"
+        # Dropped when the session's generation loop stops; the LRU bound is a backstop
+        self.max_online_sessions = max(1, int(os.getenv("ONLINE_CLUSTER_MAX_SESSIONS", "100")))
+        self.online_states: "OrderedDict[str, OnlineClusterState]" = OrderedDict()
+        # session_id -> (state version, clusters returned for it)
+        self._online_results: Dict[str, tuple] = {}
+        # session_id -> what was last written: {"assignments": {response_id: cluster_id}, "rows": {cluster_id: (name, description)}}
+        self._online_saved: Dict[str, Dict[str, Dict]] = {}
+        self._compacting = set()  # sessions with a compaction running in the compute pool
+        # session_id -> {cluster key: (members when named, (name, description))}; a cluster
+        # keeps its LLM name until its membership drifts further than this (Jaccard distance)
+        self._online_names: Dict[str, Dict[str, tuple]] = {}
+        self.rename_drift = float(os.getenv("ONLINE_CLUSTER_RENAME_DRIFT", "0.5"))
+        # "batch" names all new clusters in one prompt, "concurrent" uses one prompt each
+        self.naming_mode = os.getenv("CLUSTER_NAMING_MODE", "batch")
+        self.naming_concurrency = int(os.getenv("CLUSTER_NAMING_CONCURRENCY", "4"))
+        # membership fingerprint -> (name, description)
+        self._name_cache: OrderedDict = OrderedDict()
+        self._background = set()
 
-    async def cluster_responses(self, session_id: str) -> List[Dict[str, Any]]:
+    def submit(self, session_id: str, labeling: str = "llm", refine: bool = False) -> ClusterJob:
+        """
+        Starts cluster_responses in the background. A run still in progress
+        for the same session and labeling is shared instead of repeated.
+        """
+        for job in self.jobs.values():
+            if job.status == "running" and job.session_id == session_id and job.labeling == labeling:
+                return job
+        job = ClusterJob(session_id, labeling)
+        job.task = asyncio.create_task(self._run_job(job, refine))
+        self.jobs[job.id] = job
+
+        finished = [j.id for j in self.jobs.values() if j.status != "running"]
+        for job_id in finished[:len(finished) - MAX_FINISHED_JOBS]:
+            del self.jobs[job_id]
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ClusterJob]:
+        return self.jobs.get(job_id)
+
+    async def _run_job(self, job: ClusterJob, refine: bool):
+        try:
+            job.clusters = await self.cluster_responses(job.session_id, labeling=job.labeling, refine=refine)
+            job.status = "done"
+        except Exception as e:
+            logger.error("Clustering job %s failed: %s", job.id, e)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def _online_state(self, session_id: str) -> "OnlineClusterState":
+        """The session's online state, created on first use (evicting the least recently used)."""
+        from services.online_clustering import OnlineClusterState
+        state = self.online_states.get(session_id)
+        if state is None:
+            state = self.online_states[session_id] = OnlineClusterState()
+            while len(self.online_states) > self.max_online_sessions:
+                self.forget_session(next(iter(self.online_states)))
+        self.online_states.move_to_end(session_id)
+        return state
+
+    def forget_session(self, session_id: str):
+        """Releases a session's online clustering state (called when its generation loop stops)."""
+        self.online_states.pop(session_id, None)
+        self._online_results.pop(session_id, None)
+        self._online_saved.pop(session_id, None)
+        self._online_names.pop(session_id, None)
+
+    def _install(self, session_id: str, previous: "OnlineClusterState", state: "OnlineClusterState"):
+        """Swaps in a state computed off the event loop, unless the session was released or replaced meanwhile."""
+        if self.online_states.get(session_id) is not previous:
+            return
+        state.succeed(previous)
+        self.online_states[session_id] = state
+
+    async def _compact(self, session_id: str, state: "OnlineClusterState"):
+        from services.online_clustering import compacted
+        self._compacting.add(session_id)
+        try:
+            with STAGE_SECONDS.time(stage="clustering"):
+                result = await self.compute_pool.run(compacted, state)
+        finally:
+            self._compacting.discard(session_id)
+        self._install(session_id, state, result)
+
+    async def observe_responses(self, session_id: str, responses: List[Dict[str, Any]], history: bool = False):
+        """
+        Online mode: embeds the given responses and assigns each to its nearest
+        cluster. Called from the orchestrator for every finished turn (and once
+        with the replayed history), off the streaming path. Assigning is a
+        nearest-centroid lookup; the periodic compaction runs in the compute
+        pool on a copy of the state, which replaces it when done.
+
+        With history=True `responses` is the session's whole history, and
+        only once it is assigned does /cluster answer from the state: turns
+        observed before that cover just part of the session.
+        """
+        if not self.online_enabled:
+            return
+        state = self._online_state(session_id)
+        new = [r for r in responses if r['id'] not in state]
+        if not new:
+            state.complete = state.complete or history
+            return
+        with STAGE_SECONDS.time(stage="embedding"):
+            embeddings = await self.embedding_service.embed([r['content'] for r in new])
+        # The state may have been compacted (replaced) or released meanwhile
+        state = self.online_states.get(session_id)
+        if embeddings is None or state is None:
+            return
+        for record, vector in zip(new, embeddings):
+            state.assign(record['id'], record['content'], vector)
+        state.complete = state.complete or history
+        if state.needs_compaction and session_id not in self._compacting:
+            await self._compact(session_id, state)
+
+    async def cluster_responses(self, session_id: str, labeling: str = "llm", refine: bool = False) -> List[Dict[str, Any]]:
         """
         Fetches responses for a session, generates embeddings, clusters them,
         and generates semantic names using the LLM.
+
+        With labeling="keywords" clusters are named locally from c-TF-IDF
+        keywords instead; refine=True then runs LLM naming in the background
+        and updates the saved clusters when it finishes.
         """
-        if not self.db_service.get_client():
-            print("No DB connection")
+        if not self.repository.available:
+            logger.warning("No DB connection")
             return []
 
+        state = self.online_states.get(session_id)
+        if state is not None and state.complete and len(state):
+            return await self._online_clusters(session_id, state, labeling, refine)
+
         # 1. Fetch responses
-        response = self.db_service.get_client().table("responses").select("*").eq("session_id", session_id).execute()
-        responses = response.data
-        
+        responses = await self.repository.fetch_responses(session_id)
+
         if not responses:
             return []
 
         texts = [r['content'] for r in responses]
         ids = [r['id'] for r in responses]
 
-        # 2. Generate embeddings
-        # Use Gemini API for embeddings
-        try:
-            result = genai.embed_content(
-                model="models/embedding-001",
-                content=texts,
-                task_type="clustering",
-            )
-            embeddings = [e['embedding'] for e in result['embedding']] if 'embedding' in result else []
-            # Check if result structure is correct, sometimes it returns a list directly if not batched? 
-            # Actually for list input, it returns dict with 'embedding' as a list of embeddings.
-            
-            if not embeddings:
-                 print("No embeddings returned")
-                 return []
-                 
-            embeddings = np.array(embeddings)
-            
-        except Exception as e:
-            print(f"Error generating embeddings with Gemini: {e}")
-            
-            # Fallback to Ollama
-            try:
-                print("Falling back to Ollama for embeddings...")
-                embeddings = []
-                # Attempt to find a suitable embedding model
-                model_to_use = "gemma3:27b" # Default known model
-                try:
-                    list_res = ollama.list()
-                    # list_res['models'] is a list of dict objects
-                    available_names = [m['model'] for m in list_res['models']]
-                    
-                    # Preference order for embeddings
-                    if any("nomic-embed-text" in name for name in available_names):
-                        model_to_use = "nomic-embed-text"
-                    elif any("all-minilm" in name for name in available_names):
-                        model_to_use = "all-minilm"
-                except Exception as list_e:
-                    print(f"Failed to list Ollama models, defaulting to {model_to_use}: {list_e}")
-
-                print(f"Using local model: {model_to_use}")
-                for text in texts:
-                    res = ollama.embeddings(model=model_to_use, prompt=text)
-                    if 'embedding' in res:
-                        embeddings.append(res['embedding'])
-                
-                embeddings = np.array(embeddings)
-
-            except Exception as ollama_e:
-                print(f"Ollama Embedding Error: {ollama_e}")
-                print("Falling back to Mock Clustering...")
-                embeddings = []
-
+        # 2. Generate embeddings (cached per content hash, only new responses hit the API)
+        with STAGE_SECONDS.time(stage="embedding"):
+            embeddings = await self.embedding_service.embed(texts)
 
         # 3. Cluster
-        if not len(embeddings):
+        if embeddings is None:
+            logger.warning("Falling back to Mock Clustering...")
             # Mock Clustering: Assign random clusters if no embeddings
-            if len(texts) > 0:
-                import random
-                # Create 3-5 random clusters depending on text count
-                n_mock_clusters = min(len(texts), random.randint(3, 5))
-                cluster_assignment = [random.randint(0, n_mock_clusters - 1) for _ in texts]
-            else:
-                 cluster_assignment = []
-        elif len(embeddings) < 2:
-            cluster_assignment = np.zeros(len(embeddings), dtype=int)
+            # Create 3-5 random clusters depending on text count
+            n_mock_clusters = min(len(texts), random.randint(3, 5))
+            cluster_assignment = [random.randint(0, n_mock_clusters - 1) for _ in texts]
+        elif self.online_enabled:
+            # The same worker call also seeds the online state, so later calls are served
+            # incrementally; it replaces any partial state, keeping turns observed meanwhile
+            from services.online_clustering import cluster_and_seed
+            with STAGE_SECONDS.time(stage="clustering"):
+                _, seeded = await self.compute_pool.run_on_matrix(cluster_and_seed, embeddings, ids, texts)
+            self._install(session_id, self._online_state(session_id), seeded)
+            return await self._online_clusters(session_id, self.online_states[session_id], labeling, refine)
         else:
-            clustering_model = AgglomerativeClustering(n_clusters=None, distance_threshold=1.5) 
-            cluster_assignment = clustering_model.fit_predict(embeddings)
+            from services.cluster_engine import cluster_embeddings
+            with STAGE_SECONDS.time(stage="clustering"):
+                cluster_assignment = await self.compute_pool.run_on_matrix(cluster_embeddings, embeddings)
 
         # Group by cluster ID
-        clusters_map: Dict[int, List[str]] = {}
-        cluster_texts: Dict[int, List[str]] = {}
-        
+        clusters_map: Dict[int, List[int]] = {}
+
         for idx, cluster_id in enumerate(cluster_assignment):
-            if cluster_id not in clusters_map:
-                clusters_map[cluster_id] = []
-                cluster_texts[cluster_id] = []
-            clusters_map[cluster_id].append(ids[idx])
-            cluster_texts[cluster_id].append(texts[idx])
+            clusters_map.setdefault(cluster_id, []).append(idx)
 
-        final_clusters = []
+        groups = [
+            {
+                "response_ids": [ids[i] for i in members],
+                "texts": [texts[i] for i in members],
+                "vectors": embeddings[members] if embeddings is not None else None,
+            }
+            for members in clusters_map.values()
+        ]
+        return await self._name_and_save(session_id, groups, labeling, refine)
+
+    async def _online_clusters(self, session_id: str, state: "OnlineClusterState", labeling: str, refine: bool) -> List[Dict[str, Any]]:
+        """
+        Serves /cluster from the online state. Nothing is recomputed: if no
+        response arrived since the last call the previous result is returned.
+        Otherwise LLM names are reused, so only clusters that are new or whose
+        membership drifted past `rename_drift` since they were named go to
+        the LLM.
+        """
+        cached = self._online_results.get(session_id)
+        if cached and cached[0] == (state.version, labeling):
+            return cached[1]
+        version = state.version
+        groups = state.snapshot()
+        named = self._online_names.setdefault(session_id, {})
+        known = {}
+        if labeling == "llm":
+            for index, group in enumerate(groups):
+                entry = named.get(group["key"])
+                if entry and self._drift(entry[0], group["response_ids"]) <= self.rename_drift:
+                    known[index] = entry[1]
+        # Assignments reference responses that may still sit in the write-behind queue
+        await self.repository.flush()
+        clusters = await self._name_and_save(session_id, groups, labeling, refine, known)
+        if labeling == "llm":
+            for index, (group, cluster) in enumerate(zip(groups, clusters)):
+                # Only names the LLM produced (those land in the name cache), not fallbacks
+                if index not in known and self._fingerprint(group["response_ids"]) in self._name_cache:
+                    named[group["key"]] = (set(group["response_ids"]), (cluster["name"], cluster["description"]))
+            for key in set(named) - {group["key"] for group in groups}:
+                del named[key]
+        self._online_results[session_id] = ((version, labeling), clusters)
+        return clusters
+
+    @staticmethod
+    def _drift(named_members: set, response_ids: List[str]) -> float:
+        current = set(response_ids)
+        return 1 - len(named_members & current) / len(named_members | current)
+
+    async def _name_and_save(self, session_id: str, groups: List[Dict[str, Any]], labeling: str = "llm", refine: bool = False,
+                             known: Dict[int, Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        # 4. Naming for every group (except the `known` ones, by index), then all rows written in one bulk pass
+        keywords = None
+        if labeling == "keywords":
+            with STAGE_SECONDS.time(stage="labeling"):
+                keywords = await self._keyword_labels(groups)
+            names = [self._keyword_name(g, k) for g, k in zip(groups, keywords)]
+        else:
+            known = known or {}
+            todo = [i for i in range(len(groups)) if i not in known]
+            with STAGE_SECONDS.time(stage="naming"):
+                fresh = iter(await self._name_clusters([groups[i] for i in todo], session_id))
+            names = [known[i] if i in known else next(fresh) for i in range(len(groups))]
 
-        # 4. Save clusters and assignments with AI Naming
-        for cluster_id, response_ids in clusters_map.items():
-            content_sample = "\n---\n".join(cluster_texts[cluster_id][:5]) # Limit sample size
-            
-            # Generate Name & Description
-            prompt = f"""
-            Analyze these brainstorming ideas and provide a JSON output with two fields:
-            1. "name": A short, punchy title (max 5 words) for this group of ideas.
-            2. "description": A brief summary (max 1 sentence) of the common theme.
-            
-            Ideas:
-            {content_sample}
-            
-            Output JSON only.
-            """
-            
-            name = f"Group {cluster_id + 1}"
-            description = "AI generated cluster"
-            
-            try:
-                ai_response = await self.llm_service.generate_response(prompt)
-                # Clean markdown code blocks if present
-                clean_response = ai_response.replace("```json", "").replace("```", "").strip()
-                data = json.loads(clean_response)
-                name = data.get("name", name)
-                description = data.get("description", description)
-            except Exception as e:
-                print(f"Error generating cluster name: {e}")
-                # Fallback names
-                name = f"Cluster {cluster_id + 1}"
-                description = f"Group of {len(response_ids)} related ideas."
-
-            # Create cluster record
-            cluster_res = self.db_service.get_client().table("clusters").insert({
+        final_clusters = []
+        cluster_rows = []
+        assignments = []
+        for index, (group, (name, description)) in enumerate(zip(groups, names)):
+            # Online clusters keep their key across calls, so their rows are updated in place
+            cluster_db_id = group.get("key") or str(uuid.uuid4())
+            cluster_rows.append({
+                "id": cluster_db_id,
                 "session_id": session_id,
                 "name": name,
                 "description": description
-            }).execute()
-            
-            cluster_db_id = cluster_res.data[0]['id']
-
-            # Create assignments
-            assignments = [{"response_id": rid, "cluster_id": cluster_db_id} for rid in response_ids]
-            self.db_service.get_client().table("cluster_assignments").insert(assignments).execute()
-            
-            final_clusters.append({
+            })
+            assignments.extend({"response_id": rid, "cluster_id": cluster_db_id} for rid in group["response_ids"])
+            cluster = {
                 "id": cluster_db_id,
                 "name": name,
                 "description": description,
-                "response_ids": response_ids
-            })
-            
+                "response_ids": group["response_ids"]
+            }
+            if keywords is not None:
+                cluster["keywords"] = keywords[index]["keywords"]
+                cluster["representative_id"] = group["response_ids"][keywords[index]["representative_index"]]
+            final_clusters.append(cluster)
+
+        if groups and "key" in groups[0]:
+            await self._save_online(session_id, cluster_rows, assignments)
+        else:
+            await self.repository.insert_clusters(cluster_rows, assignments)
+
+        if keywords is not None and refine:
+            task = asyncio.create_task(self._refine_names(session_id, groups, cluster_rows))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
         return final_clusters
+
+    async def _save_online(self, session_id: str, cluster_rows: List[Dict[str, Any]], assignments: List[Dict[str, Any]]):
+        """
+        Writes only what changed since the session's last save: new or renamed
+        clusters, responses that are new or moved, and clusters that merged
+        or split away.
+        """
+        saved = self._online_saved.get(session_id, {"assignments": {}, "rows": {}})
+        rows = {r["id"]: (r["name"], r["description"]) for r in cluster_rows}
+        current = {a["response_id"]: a["cluster_id"] for a in assignments}
+        changed_rows = [r for r in cluster_rows if saved["rows"].get(r["id"]) != rows[r["id"]]]
+        moved = [a for a in assignments if saved["assignments"].get(a["response_id"]) != a["cluster_id"]]
+        removed = [cluster_id for cluster_id in saved["rows"] if cluster_id not in rows]
+        if changed_rows or moved or removed:
+            await self.repository.save_clusters(changed_rows, moved, removed)
+        if session_id in self.online_states:
+            self._online_saved[session_id] = {"assignments": current, "rows": rows}
+
+    async def _keyword_labels(self, groups: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        from services.labeling import keyword_labels, keyword_labels_for_matrix
+        if not groups:
+            return []
+        texts = [g["texts"] for g in groups]
+        vectors = [g.get("vectors") for g in groups]
+        if any(v is None for v in vectors):
+            return await self.compute_pool.run(keyword_labels, texts)
+        return await self.compute_pool.run_on_matrix(
+            keyword_labels_for_matrix, np.concatenate(vectors), texts, [len(v) for v in vectors]
+        )
+
+    def _keyword_name(self, group: Dict[str, Any], labels: Dict[str, Any]) -> Tuple[str, str]:
+        """Local name: a cached LLM name if this exact cluster had one, else its keywords."""
+        cached = self._name_cache.get(self._fingerprint(group["response_ids"]))
+        if cached:
+            return cached
+        words = labels["keywords"]
+        name = " · ".join(w.title() for w in words[:3]) if words else "Misc ideas"
+        representative = group["texts"][labels["representative_index"]]
+        description = representative if len(representative) <= 160 else representative[:157].rstrip() + "..."
+        return name, description
+
+    async def _refine_names(self, session_id: str, groups: List[Dict[str, Any]], cluster_rows: List[Dict[str, Any]]):
+        """Background LLM naming for clusters that were saved with keyword labels."""
+        try:
+            with STAGE_SECONDS.time(stage="naming"):
+                names = await self._name_clusters(groups, session_id)
+            for row, (name, description) in zip(cluster_rows, names):
+                row["name"] = name
+                row["description"] = description
+            await self.repository.update_clusters(cluster_rows)
+        except Exception as e:
+            logger.error("Error refining cluster names: %s", e)
+
+    @staticmethod
+    def _fingerprint(response_ids: List[str]) -> str:
+        """Identifies a cluster by its membership, independent of order."""
+        return hashlib.sha256("\n".join(sorted(response_ids)).encode("utf-8")).hexdigest()
+
+    async def _name_clusters(self, groups: List[Dict[str, Any]], session_id: str = None) -> List[Tuple[str, str]]:
+        """
+        Names every group. Groups whose membership was already named are served
+        from the cache; the rest are named with one batched prompt, and any the
+        batch did not cover are named individually with bounded concurrency.
+        """
+        fingerprints = [self._fingerprint(g["response_ids"]) for g in groups]
+        names: Dict[int, Tuple[str, str]] = {}
+        todo = []
+        for index, fp in enumerate(fingerprints):
+            if fp in self._name_cache:
+                self._name_cache.move_to_end(fp)
+                names[index] = self._name_cache[fp]
+            else:
+                todo.append(index)
+
+        if todo and self.naming_mode == "batch" and len(todo) > 1:
+            names.update(await self._name_batch(todo, groups, session_id))
+            todo = [i for i in todo if i not in names]
+
+        failed = set()
+        if todo:
+            semaphore = asyncio.Semaphore(self.naming_concurrency)
+
+            async def name_one(index: int):
+                async with semaphore:
+                    result = await self._name_cluster(groups[index]["texts"], session_id)
+                if result is None:
+                    # Fallback names, not cached so the next call retries
+                    failed.add(index)
+                    result = (f"Cluster {index + 1}", f"Group of {len(groups[index]['texts'])} related ideas.")
+                names[index] = result
+
+            await asyncio.gather(*(name_one(i) for i in todo))
+
+        for index, fp in enumerate(fingerprints):
+            if index not in failed:
+                self._name_cache[fp] = names[index]
+                self._name_cache.move_to_end(fp)
+        while len(self._name_cache) > NAME_CACHE_SIZE:
+            self._name_cache.popitem(last=False)
+        return [names[i] for i in range(len(groups))]
+
+    async def _name_batch(self, indices: List[int], groups: List[Dict[str, Any]], session_id: str = None) -> Dict[int, Tuple[str, str]]:
+        """One LLM call naming many clusters; returns only the entries it could parse."""
+        sections = []
+        for index in indices:
+            sample = "\n---\n".join(groups[index]["texts"][:5]) # Limit sample size
+            sections.append(f"Group {index}:\n{sample}")
+        joined = "\n\n".join(sections)
+
+        prompt = f"""
+        Analyze each group of brainstorming ideas below and provide a JSON array with one object per group:
+        {{"group": <group number>, "name": <short, punchy title, max 5 words>, "description": <brief summary of the common theme, max 1 sentence>}}
+
+        {joined}
+
+        Output JSON only.
+        """
+
+        names = {}
+        try:
+            ai_response = await self.llm_service.generate_response(prompt, session_id=session_id, priority="naming")
+            # Clean markdown code blocks if present
+            clean_response = ai_response.replace("```json", "").replace("```", "").strip()
+            for item in json.loads(clean_response):
+                index = int(item["group"])
+                if index in indices and item.get("name"):
+                    names[index] = (item["name"], item.get("description", "AI generated cluster"))
+        except Exception as e:
+            logger.error("Error generating batched cluster names: %s", e)
+        return names
+
+    async def _name_cluster(self, texts: List[str], session_id: str = None) -> Optional[Tuple[str, str]]:
+        content_sample = "\n---\n".join(texts[:5]) # Limit sample size
+
+        # Generate Name & Description
+        prompt = f"""
+        Analyze these brainstorming ideas and provide a JSON output with two fields:
+        1. "name": A short, punchy title (max 5 words) for this group of ideas.
+        2. "description": A brief summary (max 1 sentence) of the common theme.
+
+        Ideas:
+        {content_sample}
+
+        Output JSON only.
+        """
+
+        try:
+            ai_response = await self.llm_service.generate_response(prompt, session_id=session_id, priority="naming")
+            # Clean markdown code blocks if present
+            clean_response = ai_response.replace("```json", "").replace("```", "").strip()
+            data = json.loads(clean_response)
+            return data.get("name", "Unnamed group"), data.get("description", "AI generated cluster")
+        except Exception as e:
+            logger.error("Error generating cluster name: %s", e)
+            return None
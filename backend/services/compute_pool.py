@@ -0,0 +1,83 @@
+import os
+import asyncio
+import functools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Callable, Optional
+
+import numpy as np
+
+# Imported once by the fork server, so workers start with scikit-learn loaded
+PRELOAD_MODULES = ["services.cluster_engine", "services.labeling", "services.online_clustering"]
+
+
+def _call_on_shared(fn: Callable, name: str, shape: tuple, dtype: str, args: tuple) -> Any:
+    """Worker side of ComputePool.run_on_matrix: maps the block and calls fn on it."""
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        matrix = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        try:
+            return fn(matrix, *args)
+        finally:
+            # The view must be gone before the block can be closed
+            del matrix
+    finally:
+        block.close()
+
+
+class ComputePool:
+    """
+    Runs CPU-bound work (clustering fits, vector math) in worker processes,
+    so a long computation never stalls the event loop and the streams it
+    serves. Matrices are handed over through shared memory: the parent copies
+    the array into one block that workers map, instead of pickling it through
+    the pool's pipe. With 0 workers everything runs in a thread instead.
+    """
+
+    def __init__(self, max_workers: int = None):
+        if max_workers is None:
+            max_workers = int(os.getenv("COMPUTE_WORKERS", str(min(4, os.cpu_count() or 1))))
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # Workers come from a clean fork server, not from this process with
+            # its event loop and threads; spawn where fork servers don't exist
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            if context.get_start_method() == "forkserver":
+                context.set_forkserver_preload(PRELOAD_MODULES)
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self._executor
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """fn(*args) in a worker; fn must be a module-level function."""
+        if self.max_workers <= 0:
+            return await asyncio.to_thread(fn, *args)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool(), functools.partial(fn, *args))
+
+    async def run_on_matrix(self, fn: Callable, matrix: np.ndarray, *args) -> Any:
+        """fn(matrix, *args) in a worker, with the matrix in shared memory."""
+        matrix = np.ascontiguousarray(matrix)
+        if self.max_workers <= 0:
+            return await asyncio.to_thread(fn, matrix, *args)
+        block = shared_memory.SharedMemory(create=True, size=max(matrix.nbytes, 1))
+        try:
+            np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=block.buf)[...] = matrix
+            return await self.run(_call_on_shared, fn, block.name, matrix.shape, matrix.dtype.str, args)
+        finally:
+            block.close()
+            block.unlink()
+
+    async def start(self):
+        """Starts the fork server and a worker ahead of the first real job."""
+        if self.max_workers > 0:
+            await self.run(os.getpid)
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,177 @@
+from typing import List, Tuple, Optional, Callable, Awaitable
+from collections import deque
+import os
+import asyncio
+import logging
+from services.llm import LLMService
+from services.metrics import STAGE_SECONDS
+from services.tokens import estimate_tokens, clip_to_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain the running minutes of a brainstorming session. "
+    "Merge new contributions into the existing summary, keeping every distinct idea, "
+    "critique and open question, and attributing them to the agents who raised them."
+)
+
+
+class ContextWindow:
+    """
+    Bounded conversation context for a session.
+
+    The topic and the last `keep_turns` turns are kept verbatim. Older turns are
+    folded into a rolling summary in the background every `summary_every`
+    turns, so the summary is extended incrementally rather than regenerated.
+    A turn leaves `pending` only once a fold has covered it; each fold takes
+    at most `summary_every * 4` turns that fit in the token budget.
+    Rendering never exceeds `token_budget` tokens on top of the topic.
+
+    After every fold `on_summary(summary, folded_turns)` is awaited so the
+    summary can be persisted; a resumed session restores it with
+    `restore_summary` and only the turns after it are folded again.
+    """
+
+    def __init__(
+        self,
+        topic: str,
+        llm_service: LLMService,
+        token_budget: int = None,
+        keep_turns: int = None,
+        summary_every: int = None,
+        session_id: str = None,
+        on_summary: Callable[[str, int], Awaitable[None]] = None,
+    ):
+        self.topic = topic
+        self.llm_service = llm_service
+        self.session_id = session_id
+        self.on_summary = on_summary
+        self.token_budget = token_budget or int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+        self.keep_turns = keep_turns or int(os.getenv("CONTEXT_KEEP_TURNS", "8"))
+        self.summary_every = summary_every or int(os.getenv("CONTEXT_SUMMARY_EVERY", "4"))
+        self.fold_batch = self.summary_every * 4
+        # The summary gets at most a quarter of the budget, turns get the rest
+        self.summary_budget = self.token_budget // 4
+
+        self.summary = ""
+        self.turn_count = 0
+        self.folded_turns = 0  # turns covered by the summary, counted from the session's first
+        self.recent: deque = deque()
+        self.pending: List[Tuple[str, str]] = []  # evicted turns not yet folded into the summary
+        self._summary_task: Optional[asyncio.Task] = None
+
+    def restore_summary(self, summary: str, turns: int):
+        """Starts from a persisted summary of the first `turns` turns; call before replaying history."""
+        self.summary = clip_to_tokens(summary, self.summary_budget)
+        self.folded_turns = turns
+
+    def add_turn(self, agent_name: str, content: str):
+        self.recent.append((agent_name, content))
+        self.turn_count += 1
+        while len(self.recent) > self.keep_turns:
+            entry = self.recent.popleft()
+            # Replayed turns the restored summary already covers are not folded again
+            if self.turn_count - len(self.recent) - 1 >= self.folded_turns:
+                self.pending.append(entry)
+
+    def maybe_summarize(self, force: bool = False):
+        """
+        Starts a background fold of pending turns into the summary once
+        `summary_every` of them have accumulated, batch after batch until
+        fewer remain (with force=True, until none do: a resumed session's
+        backlog is folded while it already generates new turns). Only one
+        fold runs at a time.
+        """
+        if self._summary_task and not self._summary_task.done():
+            return
+        if not self.pending or (len(self.pending) < self.summary_every and not force):
+            return
+        self._summary_task = asyncio.create_task(self._drain(1 if force else self.summary_every))
+
+    async def _drain(self, threshold: int):
+        # Stops at the first failed fold, leaving the rest pending for the next attempt
+        while len(self.pending) >= threshold:
+            if not await self._fold():
+                return
+
+    def _next_batch(self) -> List[Tuple[str, str]]:
+        """The oldest pending turns, up to fold_batch of them within the token budget."""
+        batch, used = [], 0
+        for entry in self.pending[:self.fold_batch]:
+            used += estimate_tokens(f"{entry[0]}: {entry[1]}")
+            if batch and used > self.token_budget:
+                break
+            batch.append(entry)
+        return batch
+
+    async def _fold(self) -> bool:
+        """Folds the next batch into the summary; True if it did."""
+        batch = self._next_batch()
+        new_turns = clip_to_tokens(
+            "\n\n".join(f"{name}: {content}" for name, content in batch),
+            self.token_budget,
+        )
+        max_words = max(int(self.summary_budget * 0.75), 50)
+        prompt = (
+            f"Current summary:\n{self.summary or '(empty)'}\n\n"
+            f"New contributions:\n{new_turns}\n\n"
+            f"Rewrite the summary so it also covers the new contributions. "
+            f"Stay under {max_words} words. Output the summary only."
+        )
+        try:
+            with STAGE_SECONDS.time(stage="summarize"):
+                summary = await self.llm_service.generate_response(
+                    prompt, SUMMARY_SYSTEM_PROMPT, session_id=self.session_id, priority="summary"
+                )
+        except Exception as e:
+            logger.error("Error updating context summary: %s", e)
+            return False
+        if not summary or summary.startswith("Error"):
+            logger.warning("Context summary not updated: %s", summary[:100] if summary else "empty response")
+            return False
+        self.summary = clip_to_tokens(summary.strip(), self.summary_budget)
+        # Drop exactly the entries that were folded (by identity), whatever happened to pending meanwhile
+        folded = {id(entry) for entry in batch}
+        self.pending = [entry for entry in self.pending if id(entry) not in folded]
+        self.folded_turns += len(batch)
+        if self.on_summary:
+            try:
+                await self.on_summary(self.summary, self.folded_turns)
+            except Exception as e:
+                logger.error("Error saving context summary: %s", e)
+        return True
+
+    def render(self) -> str:
+        """
+        Builds the prompt context: topic, rolling summary, then as many of the
+        most recent turns as fit in the remaining budget.
+        """
+        remaining = self.token_budget
+        summary = ""
+        if self.summary:
+            summary = clip_to_tokens(self.summary, self.summary_budget)
+            remaining -= estimate_tokens(summary)
+
+        turns: List[str] = []
+        # Unfolded pending turns are still shown verbatim until the summary covers them
+        for name, content in reversed(self.pending + list(self.recent)):
+            entry = f"{name}: {content}"
+            cost = estimate_tokens(entry)
+            if cost > remaining:
+                if not turns:
+                    # Always include at least the latest turn, clipped if needed
+                    turns.append(clip_to_tokens(entry, remaining))
+                break
+            turns.append(entry)
+            remaining -= cost
+
+        context = f"Topic: {self.topic}"
+        if summary:
+            context += f"\n\n[Summary of earlier discussion]: {summary}"
+        for entry in reversed(turns):
+            context += f"\n\n{entry}"
+        return context
+
+    def close(self):
+        if self._summary_task and not self._summary_task.done():
+            self._summary_task.cancel()
@@ -1,7 +1,14 @@
 import os
+import logging
+from typing import List, Dict, Any, Optional
 from supabase import create_client, Client
+from services.storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+class DatabaseService(StorageBackend):
+    """Supabase (PostgreSQL) storage backend."""
 
-class DatabaseService:
     def __init__(self):
         url: str = os.environ.get("SUPABASE_URL")
         key: str = os.environ.get("SUPABASE_KEY")
@@ -10,10 +17,109 @@ class DatabaseService:
                 self.supabase: Client = create_client(url, key)
             except Exception as e:
                 self.supabase = None
-                print(f"Warning: Failed to initialize Supabase: {e}")
+                logger.warning("Failed to initialize Supabase: %s", e)
         else:
             self.supabase = None
-            print("Warning: Supabase credentials not found or invalid.")
+            logger.warning("Supabase credentials not found or invalid. Set STORAGE_BACKEND=sqlite to persist locally.")
 
     def get_client(self) -> Client:
         return self.supabase
+
+    @property
+    def available(self) -> bool:
+        return self.supabase is not None
+
+    # Blocking query helpers. They call .execute() synchronously, so async code
+    # should go through AsyncRepository rather than calling them directly.
+
+    def create_session(self, session_id: str, topic: str):
+        self.supabase.table("sessions").insert({"id": session_id, "topic": topic}).execute()
+
+    def get_session_topic(self, session_id: str) -> Optional[str]:
+        res = self.supabase.table("sessions").select("topic").eq("id", session_id).execute()
+        return res.data[0]['topic'] if res.data else None
+
+    def fetch_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        res = self.supabase.table("sessions").select("summary, summary_turns").eq("id", session_id).execute()
+        return res.data[0] if res.data and res.data[0].get("summary") is not None else None
+
+    def save_session_summary(self, session_id: str, summary: str, turns: int):
+        self.supabase.table("sessions").update({"summary": summary, "summary_turns": turns}).eq("id", session_id).execute()
+
+    def fetch_responses(self, session_id: str) -> List[Dict[str, Any]]:
+        res = self.supabase.table("responses").select("*").eq("session_id", session_id).order("created_at").execute()
+        return res.data or []
+
+    def fetch_responses_between(self, session_id: str, after: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = self.supabase.table("responses").select("*").eq("session_id", session_id)
+        if after:
+            query = query.gt("created_at", after)
+        if until:
+            query = query.lte("created_at", until)
+        return query.order("created_at").execute().data or []
+
+    def insert_responses(self, rows: List[Dict[str, Any]]):
+        self.supabase.table("responses").insert(rows).execute()
+
+    def fetch_custom_agents(self, agent_ids: List[str] = None) -> List[Dict[str, Any]]:
+        query = self.supabase.table("custom_agents").select("*")
+        if agent_ids is not None:
+            query = query.in_("id", agent_ids)
+        return query.execute().data or []
+
+    def create_custom_agent(self, name: str, role: str, prompt: str) -> List[Dict[str, Any]]:
+        res = self.supabase.table("custom_agents").insert({
+            "name": name,
+            "role": role,
+            "prompt": prompt
+        }).execute()
+        return res.data
+
+    def delete_custom_agent(self, agent_id: str) -> List[Dict[str, Any]]:
+        return self.supabase.table("custom_agents").delete().eq("id", agent_id).execute().data
+
+    def insert_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]]):
+        if clusters:
+            self.supabase.table("clusters").insert(clusters).execute()
+        if assignments:
+            self.supabase.table("cluster_assignments").insert(assignments).execute()
+
+    def update_clusters(self, clusters: List[Dict[str, Any]]):
+        # Full rows so the upsert's insert path satisfies the not-null columns
+        self.supabase.table("clusters").upsert(clusters, on_conflict="id").execute()
+
+    # Ids per delete request; like the embedding lookups, IN filters go in the URL
+    DELETE_CHUNK = 200
+
+    def save_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]], removed_ids: List[str]):
+        if clusters:
+            self.supabase.table("clusters").upsert(clusters, on_conflict="id").execute()
+        if assignments:
+            moved = [a["response_id"] for a in assignments]
+            for i in range(0, len(moved), self.DELETE_CHUNK):
+                self.supabase.table("cluster_assignments").delete().in_("response_id", moved[i:i + self.DELETE_CHUNK]).execute()
+            self.supabase.table("cluster_assignments").insert(assignments).execute()
+        # Assignments go with their cluster (on delete cascade)
+        for i in range(0, len(removed_ids), self.DELETE_CHUNK):
+            self.supabase.table("clusters").delete().in_("id", removed_ids[i:i + self.DELETE_CHUNK]).execute()
+
+    # PostgREST puts filters in the URL, so long IN lists are split into chunks
+    EMBEDDING_FETCH_CHUNK = 200
+
+    def fetch_embeddings(self, model: str, content_hashes: List[str]) -> List[Dict[str, Any]]:
+        rows = []
+        for i in range(0, len(content_hashes), self.EMBEDDING_FETCH_CHUNK):
+            chunk = content_hashes[i:i + self.EMBEDDING_FETCH_CHUNK]
+            res = self.supabase.table("embeddings").select("content_hash,dim,scale,vector") \
+                .eq("model", model).in_("content_hash", chunk).execute()
+            for row in res.data or []:
+                # bytea comes back hex encoded as "\\x..."
+                row["vector"] = bytes.fromhex(row["vector"][2:])
+                rows.append(row)
+        return rows
+
+    def insert_embeddings(self, rows: List[Dict[str, Any]]):
+        payload = [{**row, "vector": "\\x" + row["vector"].hex()} for row in rows]
+        self.supabase.table("embeddings").upsert(
+            payload, on_conflict="model,content_hash", ignore_duplicates=True
+        ).execute()
@@ -0,0 +1,225 @@
+from typing import List, Dict, Optional, Tuple
+import os
+import time
+import hashlib
+import asyncio
+import logging
+import numpy as np
+import httpx
+from services.repository import AsyncRepository
+from services.llm_backends import genai_module
+
+logger = logging.getLogger(__name__)
+
+GEMINI_EMBEDDING_MODEL = "models/embedding-001"
+OLLAMA_DEFAULT_MODEL = "gemma3:27b"
+
+# Starting batch size per model family: small dedicated embedders take large
+# batches, general chat models used as a fallback are much slower per text.
+OLLAMA_BATCH_SIZES = {
+    "nomic-embed-text": 64,
+    "all-minilm": 128,
+}
+OLLAMA_FALLBACK_BATCH_SIZE = 8
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def quantize(vector: np.ndarray) -> Tuple[bytes, float]:
+    """Symmetric int8 quantization with one scale per vector."""
+    vector = np.asarray(vector, dtype=np.float32)
+    peak = float(np.abs(vector).max()) if vector.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    return np.round(vector / scale).astype(np.int8).tobytes(), scale
+
+
+def dequantize_rows(rows: List[bytes], scales: List[float], dim: int) -> np.ndarray:
+    """Turns a batch of quantized vectors into one float32 matrix."""
+    matrix = np.frombuffer(b"".join(rows), dtype=np.int8).reshape(len(rows), dim)
+    return matrix.astype(np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+
+
+class EmbeddingService:
+    """
+    Computes response embeddings through the persisted `embeddings` cache.
+
+    Vectors are keyed by content hash and model name, so re-clustering a
+    session only embeds the responses added since the last run. Backends are
+    tried in order (Gemini, then local Ollama) and every vector of one result
+    comes from the same model.
+    """
+
+    def __init__(self, repository: AsyncRepository):
+        self.repository = repository
+        self.gemini_enabled = bool(os.getenv("LLM_API_KEY") or os.getenv("GOOGLE_API_KEY"))
+        self.ollama = OllamaEmbedder()
+        self.fake = None
+        if os.getenv("EMBEDDING_BACKEND", "").lower() == "fake":
+            from services.fakes import FakeEmbedder
+            self.fake = FakeEmbedder()
+
+    async def embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        """
+        Returns an (n, dim) float32 matrix aligned with `texts`, or None if no
+        embedding backend is reachable.
+        """
+        if not texts:
+            return None
+
+        if self.fake is not None:
+            return await self._embed_cached(self.fake.model, texts, self.fake.embed)
+
+        if self.gemini_enabled:
+            try:
+                return await self._embed_cached(GEMINI_EMBEDDING_MODEL, texts, self._embed_gemini)
+            except Exception as e:
+                logger.error("Error generating embeddings with Gemini: %s", e)
+
+        try:
+            logger.info("Falling back to Ollama for embeddings...")
+            model = await self.ollama.resolve_model()
+            logger.info("Using local model: %s", model)
+            return await self._embed_cached(model, texts, self.ollama.embed)
+        except Exception as e:
+            logger.error("Ollama Embedding Error: %s", e)
+            return None
+
+    async def _embed_cached(self, model: str, texts: List[str], compute) -> np.ndarray:
+        hashes = [content_hash(t) for t in texts]
+        unique: Dict[str, str] = dict(zip(hashes, texts))
+
+        vectors: Dict[str, np.ndarray] = {}
+        if self.repository.available:
+            try:
+                rows = await self.repository.fetch_embeddings(model, list(unique))
+                if rows:
+                    matrix = dequantize_rows([r["vector"] for r in rows], [r["scale"] for r in rows], rows[0]["dim"])
+                    vectors = {r["content_hash"]: matrix[i] for i, r in enumerate(rows)}
+            except Exception as e:
+                logger.error("Error loading cached embeddings: %s", e)
+
+        missing = [h for h in unique if h not in vectors]
+        if missing:
+            logger.info("Embedding %d new texts with %s (%d cached)", len(missing), model, len(vectors))
+            computed = np.asarray(await compute([unique[h] for h in missing]), dtype=np.float32)
+            if len(computed) != len(missing):
+                raise ValueError(f"{model} returned {len(computed)} embeddings for {len(missing)} texts")
+
+            new_rows = []
+            for h, vector in zip(missing, computed):
+                data, scale = quantize(vector)
+                new_rows.append({"content_hash": h, "model": model, "dim": len(vector), "scale": scale, "vector": data})
+                # Use the dequantized value so cached and fresh vectors are identical
+                vectors[h] = np.frombuffer(data, dtype=np.int8).astype(np.float32) * scale
+            if self.repository.available:
+                try:
+                    await self.repository.insert_embeddings(new_rows)
+                except Exception as e:
+                    logger.error("Error caching embeddings: %s", e)
+
+        return np.stack([vectors[h] for h in hashes])
+
+    async def _embed_gemini(self, texts: List[str]) -> List[List[float]]:
+        result = await asyncio.to_thread(
+            genai_module().embed_content,
+            model=GEMINI_EMBEDDING_MODEL,
+            content=texts,
+            task_type="clustering",
+        )
+        # For a list input 'embedding' holds one vector per text
+        return result['embedding']
+
+
+class OllamaEmbedder:
+    """
+    Batched local embeddings through Ollama's /api/embed endpoint.
+
+    Identical texts are sent once, batches run with bounded concurrency on an
+    async HTTP client (nothing blocks the event loop), and the batch size adapts
+    to the model: it doubles while requests finish well under the latency
+    target and halves when they are slow or fail. A failing batch is split and
+    retried so one bad input does not sink the others.
+    """
+
+    def __init__(self, host: str = None, concurrency: int = None, target_latency: float = None):
+        self.concurrency = concurrency or int(os.getenv("OLLAMA_EMBED_CONCURRENCY", "4"))
+        self.target_latency = target_latency or float(os.getenv("OLLAMA_EMBED_TARGET_LATENCY", "2.0"))
+        self.max_batch_size = 512
+        self.host = host
+        self._client = None
+        self.model: Optional[str] = None
+        self.batch_size = OLLAMA_FALLBACK_BATCH_SIZE
+
+    @property
+    def client(self):
+        if self._client is None:
+            import ollama
+            self._client = ollama.AsyncClient(
+                host=self.host,
+                timeout=httpx.Timeout(120.0, connect=5.0),
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+            )
+        return self._client
+
+    async def resolve_model(self) -> str:
+        """Picks the best embedding model installed locally (cached after the first call)."""
+        if self.model:
+            return self.model
+        model_to_use = OLLAMA_DEFAULT_MODEL
+        try:
+            list_res = await self.client.list()
+            available_names = [m['model'] for m in list_res['models']]
+
+            # Preference order for embeddings
+            if any("nomic-embed-text" in name for name in available_names):
+                model_to_use = "nomic-embed-text"
+            elif any("all-minilm" in name for name in available_names):
+                model_to_use = "all-minilm"
+        except Exception as list_e:
+            logger.warning("Failed to list Ollama models, defaulting to %s: %s", model_to_use, list_e)
+            return model_to_use
+        self.model = model_to_use
+        self.batch_size = OLLAMA_BATCH_SIZES.get(model_to_use, OLLAMA_FALLBACK_BATCH_SIZE)
+        return model_to_use
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        model = await self.resolve_model()
+        unique = list(dict.fromkeys(texts))
+        results: Dict[str, List[float]] = {}
+        cursor = 0
+
+        async def worker():
+            nonlocal cursor
+            while cursor < len(unique):
+                # No await between reading and advancing the cursor, so workers never overlap
+                batch = unique[cursor:cursor + self.batch_size]
+                cursor += len(batch)
+                await self._embed_batch(model, batch, results)
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return [results[t] for t in texts]
+
+    async def _embed_batch(self, model: str, batch: List[str], results: Dict[str, List[float]]):
+        start = time.perf_counter()
+        try:
+            res = await self.client.embed(model=model, input=batch)
+        except Exception as e:
+            self.batch_size = max(1, self.batch_size // 2)
+            if len(batch) == 1:
+                raise
+            logger.warning("Ollama embed batch of %d failed (%s), retrying in halves", len(batch), e)
+            mid = len(batch) // 2
+            await self._embed_batch(model, batch[:mid], results)
+            await self._embed_batch(model, batch[mid:], results)
+            return
+
+        elapsed = time.perf_counter() - start
+        if elapsed > self.target_latency:
+            self.batch_size = max(1, self.batch_size // 2)
+        elif elapsed < self.target_latency / 2 and len(batch) >= self.batch_size:
+            self.batch_size = min(self.max_batch_size, self.batch_size * 2)
+
+        for text, vector in zip(batch, res['embeddings']):
+            results[text] = vector
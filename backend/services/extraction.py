@@ -0,0 +1,271 @@
+import os
+import asyncio
+import hashlib
+import logging
+import pathlib
+import tempfile
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from services.llm import LLMService
+from services.compute_pool import ComputePool
+from services.llm_backends import genai_module
+from services.metrics import STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+EXTRACTION_PROMPT = "Extract all text from this document. If it is an image or scanned PDF, perform OCR. Also describe any diagrams or visual elements found."
+
+
+# PDF text layer helpers. Module level so worker processes can run them.
+
+def pdf_page_count(path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(path).pages)
+
+
+def extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """Text layer of pages [start, stop), one string per page."""
+    from pypdf import PdfReader
+    reader = PdfReader(path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def write_pdf_pages(path: str, pages: List[int]) -> str:
+    """Copies the given pages into a new temp PDF and returns its path."""
+    from pypdf import PdfReader, PdfWriter
+    reader = PdfReader(path)
+    writer = PdfWriter()
+    for i in pages:
+        writer.add_page(reader.pages[i])
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        writer.write(tmp)
+    return tmp.name
+
+
+class ExtractionCache:
+    """
+    Text extracted from uploaded files, on local disk and keyed by the SHA-256
+    of the file's bytes, so a document attached to many sessions is only
+    processed once. Files are evicted least recently used first once the
+    cache grows past `max_bytes` (0 disables caching). Recency is the file
+    mtime, so it survives restarts.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None):
+        self.directory = pathlib.Path(directory or os.getenv("EXTRACTION_CACHE_DIR", "extraction_cache"))
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("EXTRACTION_CACHE_MAX_MB", "256")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> size, least recently used first
+        self._size = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.max_bytes > 0:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._load()
+
+    def _load(self):
+        files = sorted(self.directory.glob("*.txt"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._size += size
+        self._evict()
+
+    def _path(self, key: str) -> pathlib.Path:
+        return self.directory / f"{key}.txt"
+
+    def _read(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            text = path.read_text(encoding="utf-8")
+        except FileNotFoundError:
+            return None
+        os.utime(path)
+        return text
+
+    def _write(self, key: str, text: str) -> int:
+        # Write then rename, so a concurrent reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, self._path(key))
+        return self._path(key).stat().st_size
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                self._path(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    async def get(self, key: str) -> Optional[str]:
+        if key not in self._entries:
+            return None
+        text = await asyncio.to_thread(self._read, key)
+        if text is None:
+            # Removed behind our back (another worker evicted it)
+            self._size -= self._entries.pop(key, 0)
+            return None
+        if key in self._entries:
+            self._entries.move_to_end(key)
+        return text
+
+    async def put(self, key: str, text: str):
+        if self.max_bytes <= 0:
+            return
+        size = await asyncio.to_thread(self._write, key, text)
+        self._size += size - self._entries.pop(key, 0)
+        self._entries[key] = size
+        await asyncio.to_thread(self._evict)
+
+    async def get_or_extract(self, key: str, extract: Callable[[], Awaitable[str]]) -> str:
+        """
+        Cached text for `key`, or the result of `extract()`. Concurrent misses
+        for the same key share one extraction; failures are not cached.
+        """
+        while True:
+            text = await self.get(key)
+            if text is not None:
+                self.hits += 1
+                return text
+            pending = self._inflight.get(key)
+            if pending is None:
+                break
+            try:
+                text = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                continue  # the request doing the extraction went away: take over
+            self.hits += 1
+            return text
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            text = await extract()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved; waiters get it re-raised
+            raise
+        finally:
+            del self._inflight[key]
+        future.set_result(text)
+        await self.put(key, text)
+        return text
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class FileExtractor:
+    """
+    Turns an uploaded file into text for a session topic. The upload is
+    streamed to a temp file in chunks while it is hashed, so memory use does
+    not grow with the file; a cache hit skips the Gemini upload and OCR.
+
+    PDFs are read locally first: the text layer comes from pypdf (spread
+    over the shared compute pool for long documents) and only pages with little or
+    no text, i.e. scans and pictures, are sent to Gemini for OCR.
+    """
+
+    def __init__(self, llm_service: LLMService, cache: ExtractionCache = None, chunk_size: int = None,
+                 compute_pool: ComputePool = None):
+        self.llm_service = llm_service
+        self.cache = cache or ExtractionCache()
+        self.chunk_size = chunk_size or int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+        # Pages with fewer characters in their text layer are treated as scanned
+        self.min_page_chars = int(os.getenv("PDF_MIN_PAGE_CHARS", "100"))
+        # Documents with at least this many pages are split across worker processes
+        self.parallel_pages = int(os.getenv("PDF_PARALLEL_PAGES", "32"))
+        # Owned by the caller (shared with clustering), not closed here
+        self.compute_pool = compute_pool
+
+    async def extract(self, upload, session_id: str = None) -> str:
+        """`upload` is a FastAPI UploadFile (anything with `filename`, `content_type` and async `read(size)`)."""
+        tmp_path, digest = await self._save(upload)
+        try:
+            return await self.cache.get_or_extract(
+                digest, lambda: self._analyze(tmp_path, upload.content_type, session_id)
+            )
+        finally:
+            os.remove(tmp_path)
+
+    async def _save(self, upload) -> Tuple[str, str]:
+        suffix = pathlib.Path(upload.filename or "").suffix
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+            try:
+                while chunk := await upload.read(self.chunk_size):
+                    digest.update(chunk)
+                    await asyncio.to_thread(tmp.write, chunk)
+            except BaseException:
+                tmp.close()
+                os.remove(tmp.name)
+                raise
+        return tmp.name, digest.hexdigest()
+
+    async def _analyze(self, path: str, mime_type: str, session_id: str = None) -> str:
+        with STAGE_SECONDS.time(stage="extraction"):
+            if mime_type == "application/pdf" or path.lower().endswith(".pdf"):
+                try:
+                    pages = await self._pdf_text(path)
+                except Exception as e:
+                    logger.warning("Local PDF extraction failed (%s), sending the whole file to OCR", e)
+                else:
+                    return await self._merge_pdf_text(path, pages, session_id)
+            return await self._ocr(path, mime_type, session_id)
+
+    async def _pdf_text(self, path: str) -> List[str]:
+        count = await asyncio.to_thread(pdf_page_count, path)
+        workers = self.compute_pool.max_workers if self.compute_pool else 0
+        if count < self.parallel_pages or workers < 2:
+            return await asyncio.to_thread(extract_pdf_pages, path, 0, count)
+        step = -(-count // workers)
+        chunks = await asyncio.gather(*(
+            self.compute_pool.run(extract_pdf_pages, path, start, min(start + step, count))
+            for start in range(0, count, step)
+        ))
+        return [text for chunk in chunks for text in chunk]
+
+    async def _merge_pdf_text(self, path: str, pages: List[str], session_id: str = None) -> str:
+        scanned = [i for i, text in enumerate(pages) if len(text.strip()) < self.min_page_chars]
+        logger.debug("PDF text layer: %d of %d pages read locally", len(pages) - len(scanned), len(pages))
+        if not scanned:
+            return "\n\n".join(text.strip() for text in pages)
+        if len(scanned) == len(pages):
+            return await self._ocr(path, "application/pdf", session_id)
+
+        subset = await asyncio.to_thread(write_pdf_pages, path, scanned)
+        try:
+            ocr = await self._ocr(subset, "application/pdf", session_id)
+        finally:
+            os.remove(subset)
+        skip = set(scanned)
+        text = "\n\n".join(t.strip() for i, t in enumerate(pages) if i not in skip)
+        labels = ", ".join(str(i + 1) for i in scanned)
+        return f"{text}\n\n[Pages {labels} (scanned)]:\n{ocr}"
+
+    async def _ocr(self, path: str, mime_type: str, session_id: str = None) -> str:
+        with STAGE_SECONDS.time(stage="ocr"):
+            logger.debug("Uploading %s to Gemini...", path)
+            uploaded_file = await asyncio.to_thread(lambda: genai_module().upload_file(path, mime_type=mime_type))
+            logger.debug("Generating content description...")
+            return await self.llm_service.analyze_file(EXTRACTION_PROMPT, uploaded_file, session_id=session_id)
@@ -0,0 +1,245 @@
+"""
+Deterministic stand-ins for the external services, so the whole backend can
+run, and be benchmarked, without Gemini, Ollama or Supabase:
+
+    LLM_BACKEND=fake          FakeLLMBackend instead of Gemini/Ollama
+    EMBEDDING_BACKEND=fake    FakeEmbedder for clustering
+    STORAGE_BACKEND=memory    MemoryStorage instead of Supabase/SQLite
+
+Latency, throughput and error rate are configurable (FAKE_* variables, see
+.env.example). Output depends only on the input and FAKE_SEED.
+"""
+import os
+import time
+import uuid
+import random
+import asyncio
+import hashlib
+import logging
+import threading
+import functools
+from datetime import datetime, timezone
+from typing import AsyncGenerator, Any, Dict, List, Optional
+
+import numpy as np
+from services.llm_backends import LLMBackend
+from services.storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+VOCABULARY = (
+    "users cost risk growth privacy latency scale market pricing retention onboarding "
+    "security compliance partners data model feedback experiment roadmap budget team "
+    "mobile community trust support automation analytics launch pilot revenue churn"
+).split()
+
+
+def _seed(*parts) -> int:
+    key = "\0".join(str(p) for p in (os.getenv("FAKE_SEED", "0"),) + parts)
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big")
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Generates text locally: the first token after `latency` seconds, then
+    `tokens_per_second`, `response_tokens` words in total. A fraction
+    `error_rate` of calls fails before the first token. The words depend only
+    on the prompt, the error sequence only on the call order.
+    """
+
+    name = "fake"
+
+    def __init__(self, latency: float = None, tokens_per_second: float = None,
+                 response_tokens: int = None, error_rate: float = None):
+        super().__init__()
+        self.latency = latency if latency is not None else float(os.getenv("FAKE_LLM_LATENCY_MS", "200")) / 1000
+        self.tokens_per_second = tokens_per_second or float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "50"))
+        self.response_tokens = response_tokens or int(os.getenv("FAKE_LLM_RESPONSE_TOKENS", "120"))
+        self.error_rate = error_rate if error_rate is not None else float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+        self._errors = random.Random(_seed("errors"))
+
+    def _words(self, prompt: str, system_prompt: str = None) -> List[str]:
+        rng = random.Random(_seed(system_prompt, prompt))
+        return [rng.choice(VOCABULARY) for _ in range(self.response_tokens)]
+
+    def _maybe_fail(self):
+        if self.error_rate and self._errors.random() < self.error_rate:
+            raise RuntimeError("503 fake backend error")
+
+    async def generate(self, prompt: str, system_prompt: str = None) -> str:
+        self._maybe_fail()
+        await asyncio.sleep(self.latency + self.response_tokens / self.tokens_per_second)
+        return " ".join(self._words(prompt, system_prompt))
+
+    async def stream(self, prompt: str, system_prompt: str = None) -> AsyncGenerator[str, None]:
+        self._maybe_fail()
+        await asyncio.sleep(self.latency)
+        interval = 1 / self.tokens_per_second
+        for i, word in enumerate(self._words(prompt, system_prompt)):
+            if i:
+                await asyncio.sleep(interval)
+            yield word if i == 0 else " " + word
+
+    async def probe(self):
+        pass
+
+
+class FakeEmbedder:
+    """
+    Bag-of-words embeddings: every word maps to a fixed random direction, so
+    texts that share words land close together and clustering has real
+    structure to find. Each call waits `latency` seconds, like one batch.
+    """
+
+    model = "fake-embedding"
+
+    def __init__(self, dim: int = None, latency: float = None):
+        self.dim = dim or int(os.getenv("FAKE_EMBEDDING_DIM", "256"))
+        self.latency = latency if latency is not None else float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", "50")) / 1000
+
+    @functools.lru_cache(maxsize=65536)
+    def _direction(self, word: str) -> np.ndarray:
+        return np.random.default_rng(_seed("word", word)).standard_normal(self.dim).astype(np.float32)
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector += self._direction(word.strip(".,;:!?\"'()"))
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    async def embed(self, texts: List[str]) -> List[np.ndarray]:
+        await asyncio.sleep(self.latency)
+        return [self._vector(t) for t in texts]
+
+
+class MemoryStorage(StorageBackend):
+    """
+    Process-local storage; nothing is persisted. Every call sleeps `latency`
+    seconds first, standing in for a database round trip (calls run on
+    AsyncRepository's thread pool, like real queries).
+    """
+
+    def __init__(self, latency: float = None):
+        self.latency = latency if latency is not None else float(os.getenv("FAKE_DB_LATENCY_MS", "0")) / 1000
+        self._lock = threading.Lock()
+        self.sessions: Dict[str, str] = {}
+        self.summaries: Dict[str, Dict[str, Any]] = {}
+        self.responses: Dict[str, List[Dict[str, Any]]] = {}
+        self.custom_agents: Dict[str, Dict[str, Any]] = {}
+        self.clusters: Dict[str, Dict[str, Any]] = {}
+        self.assignments: Dict[str, str] = {}  # response_id -> cluster_id
+        self.embeddings: Dict[tuple, Dict[str, Any]] = {}
+        logger.info("Using in-memory storage (nothing is persisted)")
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def _wait(self):
+        if self.latency > 0:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat(timespec="microseconds")
+
+    def create_session(self, session_id: str, topic: str):
+        self._wait()
+        with self._lock:
+            self.sessions[session_id] = topic
+
+    def get_session_topic(self, session_id: str) -> Optional[str]:
+        self._wait()
+        return self.sessions.get(session_id)
+
+    def fetch_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        self._wait()
+        with self._lock:
+            summary = self.summaries.get(session_id)
+            return dict(summary) if summary else None
+
+    def save_session_summary(self, session_id: str, summary: str, turns: int):
+        self._wait()
+        with self._lock:
+            if session_id in self.sessions:
+                self.summaries[session_id] = {"summary": summary, "summary_turns": turns}
+
+    def fetch_responses(self, session_id: str) -> List[Dict[str, Any]]:
+        self._wait()
+        with self._lock:
+            return [dict(r) for r in self.responses.get(session_id, [])]
+
+    def fetch_responses_between(self, session_id: str, after: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        self._wait()
+        after, until = after or "", until or "9999"
+        with self._lock:
+            return [dict(r) for r in self.responses.get(session_id, []) if after < r["created_at"] <= until]
+
+    def insert_responses(self, rows: List[Dict[str, Any]]):
+        self._wait()
+        with self._lock:
+            touched = set()
+            for row in rows:
+                self.responses.setdefault(row["session_id"], []).append(dict(row))
+                touched.add(row["session_id"])
+            for session_id in touched:
+                self.responses[session_id].sort(key=lambda r: r["created_at"])
+
+    def fetch_custom_agents(self, agent_ids: List[str] = None) -> List[Dict[str, Any]]:
+        self._wait()
+        with self._lock:
+            if agent_ids is None:
+                return [dict(a) for a in self.custom_agents.values()]
+            return [dict(self.custom_agents[i]) for i in agent_ids if i in self.custom_agents]
+
+    def create_custom_agent(self, name: str, role: str, prompt: str) -> List[Dict[str, Any]]:
+        self._wait()
+        agent = {"id": str(uuid.uuid4()), "name": name, "role": role, "prompt": prompt, "created_at": self._now()}
+        with self._lock:
+            self.custom_agents[agent["id"]] = agent
+        return [dict(agent)]
+
+    def delete_custom_agent(self, agent_id: str) -> List[Dict[str, Any]]:
+        self._wait()
+        with self._lock:
+            agent = self.custom_agents.pop(agent_id, None)
+        return [agent] if agent else []
+
+    def insert_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]]):
+        self._wait()
+        with self._lock:
+            for cluster in clusters:
+                self.clusters[cluster["id"]] = {**cluster, "created_at": self._now()}
+            for assignment in assignments:
+                self.assignments.setdefault(assignment["response_id"], assignment["cluster_id"])
+
+    def update_clusters(self, clusters: List[Dict[str, Any]]):
+        self._wait()
+        with self._lock:
+            for cluster in clusters:
+                if cluster["id"] in self.clusters:
+                    self.clusters[cluster["id"]].update(name=cluster["name"], description=cluster["description"])
+
+    def save_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]], removed_ids: List[str]):
+        self._wait()
+        with self._lock:
+            for cluster in clusters:
+                self.clusters.setdefault(cluster["id"], {"created_at": self._now()}).update(cluster)
+            for assignment in assignments:
+                self.assignments[assignment["response_id"]] = assignment["cluster_id"]
+            removed = set(removed_ids)
+            for cluster_id in removed:
+                self.clusters.pop(cluster_id, None)
+            self.assignments = {r: c for r, c in self.assignments.items() if c not in removed}
+
+    def fetch_embeddings(self, model: str, content_hashes: List[str]) -> List[Dict[str, Any]]:
+        self._wait()
+        with self._lock:
+            return [dict(self.embeddings[(model, h)]) for h in content_hashes if (model, h) in self.embeddings]
+
+    def insert_embeddings(self, rows: List[Dict[str, Any]]):
+        self._wait()
+        with self._lock:
+            for row in rows:
+                self.embeddings.setdefault((row["model"], row["content_hash"]), dict(row))
@@ -0,0 +1,83 @@
+from typing import List, Dict, Any, Optional
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+def keyword_labels(
+    groups: List[List[str]],
+    vectors: Optional[List[Optional[np.ndarray]]] = None,
+    top_k: int = 5,
+) -> List[Dict[str, Any]]:
+    """
+    Labels clusters without any LLM call using class-based TF-IDF.
+
+    All texts of a cluster are treated as one document: term counts are summed
+    per cluster with a sparse indicator product, L1-normalized, and weighted by
+    log(1 + A / f_t), where A is the average word count per cluster and f_t the
+    term's total count, so words that are frequent in one cluster but rare
+    overall rank first.
+
+    Returns, per cluster, the top keywords and the index (within that cluster)
+    of its representative text: the one nearest the centroid when embeddings
+    are given, otherwise the one scoring highest on the cluster's keywords.
+    """
+    texts = [t for group in groups for t in group]
+    labels = np.repeat(np.arange(len(groups)), [len(g) for g in groups])
+    n_clusters = len(groups)
+    if not texts:
+        return []
+
+    vectorizer = CountVectorizer(stop_words="english", token_pattern=r"(?u)\b[a-zA-Z][a-zA-Z-]{2,}\b")
+    try:
+        counts = vectorizer.fit_transform(texts).astype(np.float32)
+    except ValueError:
+        # Only stop words / no usable tokens
+        return [{"keywords": [], "representative_index": 0} for _ in groups]
+    vocabulary = vectorizer.get_feature_names_out()
+
+    indicator = sparse.csr_matrix(
+        (np.ones(len(texts), dtype=np.float32), (labels, np.arange(len(texts)))),
+        shape=(n_clusters, len(texts)),
+    )
+    class_counts = (indicator @ counts).tocsr()
+
+    words_per_class = np.asarray(class_counts.sum(axis=1)).ravel()
+    term_totals = np.asarray(class_counts.sum(axis=0)).ravel()
+    idf = np.log1p(words_per_class.mean() / np.maximum(term_totals, 1))
+    tf = sparse.diags(1 / np.maximum(words_per_class, 1)) @ class_counts
+    weights = (tf @ sparse.diags(idf)).tocsr()
+
+    # Score each (length-normalized) text against its own cluster's term weights
+    doc_lengths = np.asarray(counts.sum(axis=1)).ravel()
+    doc_tf = sparse.diags(1 / np.maximum(doc_lengths, 1)) @ counts
+    doc_scores = np.asarray(doc_tf.multiply(weights[labels]).sum(axis=1)).ravel()
+
+    results = []
+    offset = 0
+    for c, group in enumerate(groups):
+        row = weights.getrow(c)
+        order = np.argsort(-row.data)[:top_k]
+        keywords = [str(vocabulary[row.indices[i]]) for i in order]
+
+        group_vectors = vectors[c] if vectors is not None else None
+        if group_vectors is not None and len(group_vectors) == len(group):
+            group_vectors = np.asarray(group_vectors, dtype=np.float32)
+            centroid = group_vectors.mean(axis=0)
+            representative = int(np.argmin(np.linalg.norm(group_vectors - centroid, axis=1)))
+        else:
+            representative = int(np.argmax(doc_scores[offset:offset + len(group)]))
+
+        results.append({"keywords": keywords, "representative_index": representative})
+        offset += len(group)
+    return results
+
+
+def keyword_labels_for_matrix(matrix: np.ndarray, groups: List[List[str]], sizes: List[int], top_k: int = 5) -> List[Dict[str, Any]]:
+    """
+    keyword_labels with every group's vectors stacked into one matrix (rows in
+    group order, `sizes` rows each), the form ComputePool shares with workers.
+    """
+    bounds = np.cumsum([0] + list(sizes))
+    vectors = [matrix[bounds[i]:bounds[i + 1]] for i in range(len(groups))]
+    return keyword_labels(groups, vectors, top_k)
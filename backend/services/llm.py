@@ -1,102 +1,274 @@
 import os
-from typing import AsyncGenerator
-import json
+import time
 import asyncio
-import google.generativeai as genai
-import ollama
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, List, Optional
+from services.rate_limit import AdaptiveRateLimiter
+from services.scheduler import LLMScheduler
+from services.llm_backends import LLMBackend, GeminiBackend, OllamaBackend, EXPECTED_OUTPUT_TOKENS
+from services.tokens import estimate_tokens
+from services.metrics import LLM_QUEUE_SECONDS, LLM_TTFT_SECONDS, LLM_STREAM_SECONDS, LLM_GENERATE_SECONDS, LLM_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+RENDER_DISABLED_MESSAGE = "Error: LLM API Key is missing and local fallback is disabled on Render. Please set LLM_API_KEY."
 
 class LLMService:
     LOCAL_MODEL = "gemma3:27b"
 
-    def __init__(self):
+    def __init__(self, backends: Optional[List[LLMBackend]] = None):
         self.api_key = os.getenv("LLM_API_KEY") or os.getenv("GOOGLE_API_KEY")
-        
-        if self.api_key:
-            genai.configure(api_key=self.api_key)
-            self.model = genai.GenerativeModel('gemini-2.5-flash')
-        else:
-            self.model = None
-            print("Warning: LLM_API_KEY or GOOGLE_API_KEY not found. Will default to local model if available or mock.")
-
-    async def _generate_ollama(self, prompt: str, system_prompt: str = None) -> str:
-        """Fallback to local Ollama model."""
-        if os.getenv("RENDER"):
-            return "Error: LLM API Key is missing and local fallback is disabled on Render. Please set LLM_API_KEY."
-            
-        try:
-            print(f"Fallback: Using local model {self.LOCAL_MODEL}")
-            messages = []
-            if system_prompt:
-                messages.append({'role': 'system', 'content': system_prompt})
-            messages.append({'role': 'user', 'content': prompt})
-            
-            response = ollama.chat(model=self.LOCAL_MODEL, messages=messages)
-            return response['message']['content']
-        except Exception as e:
-            print(f"Ollama Error: {e}")
-            return f"Error using local fallback: {e}"
 
-    async def _stream_ollama(self, prompt: str, system_prompt: str = None) -> AsyncGenerator[str, None]:
-        """Fallback to local Ollama stream."""
-        if os.getenv("RENDER"):
-            yield "Error: LLM API Key is missing and local fallback is disabled on Render. Please set LLM_API_KEY."
-            return
+        # Shared by every session so the aggregate stays under the provider quota
+        self.rate_limiter = AdaptiveRateLimiter(
+            requests_per_minute=int(os.getenv("LLM_RPM", "60")),
+            tokens_per_minute=int(os.getenv("LLM_TPM", "1000000")),
+        )
+        self.max_rate_limit_retries = int(os.getenv("LLM_RATE_LIMIT_RETRIES", "3"))
+        # Global concurrency cap with per-session fair queuing and priority classes
+        self.scheduler = LLMScheduler(
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "16")),
+            aging_seconds=float(os.getenv("LLM_SCHEDULER_AGING_SECONDS", "30")),
+        )
+
+        # Backends in preference order; pass them in to run against fakes
+        if backends is None and os.getenv("LLM_BACKEND", "").lower() == "fake":
+            from services.fakes import FakeLLMBackend
+            backends = [FakeLLMBackend()]
+        if backends is None:
+            backends = []
+            if self.api_key:
+                backends.append(GeminiBackend(self.api_key, self.rate_limiter, self.max_rate_limit_retries))
+            else:
+                logger.warning("LLM_API_KEY or GOOGLE_API_KEY not found. Will default to local model if available or mock.")
+            backends.append(OllamaBackend(self.LOCAL_MODEL))
+        self.backends = backends
+        # Start the next backend if the first hasn't produced a token by then (0 = off)
+        self.hedge_after = float(os.getenv("LLM_HEDGE_AFTER_MS", "0")) / 1000
+        self._probes = set()
+
+    def _cost(self, prompt: str, system_prompt: str = None) -> int:
+        return estimate_tokens(prompt) + estimate_tokens(system_prompt or "") + EXPECTED_OUTPUT_TOKENS
+
+    def stats(self) -> dict:
+        return {
+            "scheduler": self.scheduler.stats(),
+            "rate_limiter": {
+                "rate_factor": round(self.rate_limiter.rate_factor, 3),
+                "rate_limited_total": self.rate_limiter.rate_limited_total,
+            },
+            "backends": {
+                backend.name: {
+                    "state": backend.breaker.state,
+                    "consecutive_failures": backend.breaker.failures,
+                    "trips": backend.breaker.trips,
+                }
+                for backend in self.backends
+            },
+        }
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
 
+    def _candidates(self) -> List[LLMBackend]:
+        """
+        Configured backends whose breaker is closed, in preference order.
+        Half-open breakers get a background health probe instead of a user request.
+        """
+        ready = []
+        for backend in self.backends:
+            if not backend.available:
+                continue
+            if backend.breaker.begin_probe():
+                task = asyncio.create_task(self._probe(backend))
+                self._probes.add(task)
+                task.add_done_callback(self._probes.discard)
+            if backend.breaker.allow_request():
+                ready.append(backend)
+        return ready
+
+    async def _probe(self, backend: LLMBackend):
         try:
-            print(f"Fallback Stream: Using local model {self.LOCAL_MODEL}")
-            messages = []
-            if system_prompt:
-                messages.append({'role': 'system', 'content': system_prompt})
-            messages.append({'role': 'user', 'content': prompt})
-            
-            stream = ollama.chat(model=self.LOCAL_MODEL, messages=messages, stream=True)
-            for chunk in stream:
-                if 'message' in chunk and 'content' in chunk['message']:
-                    yield chunk['message']['content']
+            await backend.probe()
         except Exception as e:
-            print(f"Ollama Stream Error: {e}")
-            yield f"Error using local stream fallback: {e}"
+            logger.warning("%s health probe failed: %s", backend.name, e)
+            backend.breaker.record_failure()
+            return
+        logger.info("%s health probe succeeded, closing circuit", backend.name)
+        backend.breaker.record_success()
+
+    def _error_message(self, errors: List[str]) -> str:
+        if errors:
+            return f"Error: all LLM backends failed ({'; '.join(errors)})"
+        if not any(backend.available for backend in self.backends):
+            return RENDER_DISABLED_MESSAGE
+        return "Error: no healthy LLM backend (circuits open), retrying shortly"
 
-    async def generate_response(self, prompt: str, system_prompt: str = None) -> str:
+    @asynccontextmanager
+    async def _slot(self, session_id: str, priority: str, cost: int):
+        """A scheduler slot, with the time spent waiting for it recorded."""
+        start = time.perf_counter()
+        async with self.scheduler.slot(session_id, priority, cost):
+            LLM_QUEUE_SECONDS.observe(time.perf_counter() - start, priority=priority)
+            yield
+
+    async def generate_response(self, prompt: str, system_prompt: str = None, session_id: str = None, priority: str = "naming") -> str:
         """
         Generates a response from the LLM.
         """
-        if not self.model:
-            return await self._generate_ollama(prompt, system_prompt)
-        
-        full_prompt = prompt
-        if system_prompt:
-            full_prompt = f"System: {system_prompt}\n\nUser: {prompt}"
+        async with self._slot(session_id, priority, self._cost(prompt, system_prompt)):
+            return await self._generate(prompt, system_prompt)
 
+    async def generate_stream(self, prompt: str, system_prompt: str = None, session_id: str = None, priority: str = "stream", agent: str = None) -> AsyncGenerator[str, None]:
+        """
+        Generates a streaming response. `agent` only labels the metrics.
+        """
+        # The slot is held until the stream is exhausted or closed by the consumer
+        async with self._slot(session_id, priority, self._cost(prompt, system_prompt)):
+            async for chunk in self._stream(prompt, system_prompt, agent):
+                yield chunk
+
+    async def analyze_file(self, prompt: str, uploaded_file, session_id: str = None) -> str:
+        """
+        Runs a multimodal prompt over a file uploaded with genai.upload_file (OCR / description).
+        """
+        gemini = next((b for b in self.backends if isinstance(b, GeminiBackend)), None)
+        if gemini is None:
+            raise RuntimeError("File analysis requires LLM_API_KEY")
+        async with self._slot(session_id, "ocr", estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS):
+            return await gemini.analyze_file(prompt, uploaded_file)
+
+    async def _generate(self, prompt: str, system_prompt: str = None) -> str:
+        errors = []
+        for backend in self._candidates():
+            start = time.perf_counter()
+            try:
+                result = await backend.generate(prompt, system_prompt)
+            except Exception as e:
+                backend.breaker.record_failure()
+                LLM_REQUESTS.inc(backend=backend.name, call="generate", outcome="error")
+                logger.warning("%s error: %s. Trying next backend.", backend.name, e)
+                errors.append(f"{backend.name}: {e}")
+                continue
+            backend.breaker.record_success()
+            LLM_GENERATE_SECONDS.observe(time.perf_counter() - start, backend=backend.name)
+            LLM_REQUESTS.inc(backend=backend.name, call="generate", outcome="ok")
+            return result
+        return self._error_message(errors)
+
+    async def _timed_stream(self, backend: LLMBackend, prompt: str, system_prompt: str = None, agent: str = None) -> AsyncGenerator[str, None]:
+        """backend.stream, recording time to first chunk, duration and outcome."""
+        start = time.perf_counter()
+        first = True
+        outcome = "error"
         try:
-            # Gemini async generation is not fully standard in all versions, 
-            # but we can use the sync version in a thread or just await if supported.
-            # For simplicity and safety with 'google-generativeai', we use generate_content_async
-            response = await self.model.generate_content_async(full_prompt)
-            return response.text
-        except Exception as e:
-            print(f"Gemini Error: {e}. Switching to local fallback.")
-            return await self._generate_ollama(prompt, system_prompt)
+            async for chunk in backend.stream(prompt, system_prompt):
+                if first:
+                    LLM_TTFT_SECONDS.observe(time.perf_counter() - start, backend=backend.name, agent=agent)
+                    first = False
+                yield chunk
+            outcome = "ok"
+            LLM_STREAM_SECONDS.observe(time.perf_counter() - start, backend=backend.name, agent=agent)
+        except (GeneratorExit, asyncio.CancelledError):
+            # Hedging loser or a consumer that went away
+            outcome = "cancelled"
+            raise
+        finally:
+            LLM_REQUESTS.inc(backend=backend.name, call="stream", outcome=outcome)
 
-    async def generate_stream(self, prompt: str, system_prompt: str = None) -> AsyncGenerator[str, None]:
+    async def _stream(self, prompt: str, system_prompt: str = None, agent: str = None) -> AsyncGenerator[str, None]:
+        candidates = self._candidates()
+        if self.hedge_after > 0 and len(candidates) > 1:
+            async for chunk in self._hedged_stream(candidates[0], candidates[1], prompt, system_prompt, agent):
+                yield chunk
+            return
+
+        errors = []
+        for backend in candidates:
+            try:
+                async for chunk in self._timed_stream(backend, prompt, system_prompt, agent):
+                    yield chunk
+            except Exception as e:
+                backend.breaker.record_failure()
+                logger.warning("%s stream error: %s. Trying next backend.", backend.name, e)
+                errors.append(f"{backend.name}: {e}")
+                continue
+            backend.breaker.record_success()
+            return
+        yield self._error_message(errors)
+
+    async def _hedged_stream(self, primary: LLMBackend, secondary: LLMBackend, prompt: str, system_prompt: str = None, agent: str = None) -> AsyncGenerator[str, None]:
         """
-        Generates a streaming response.
+        Streams from `primary`, but if it hasn't produced a first chunk within
+        `hedge_after` seconds also starts `secondary`; whichever yields first
+        wins and the other is cancelled.
         """
-        if not self.model:
-             async for chunk in self._stream_ollama(prompt, system_prompt):
-                 yield chunk
-             return
+        streams, firsts = {}, {}
 
-        full_prompt = prompt
-        if system_prompt:
-            full_prompt = f"System: {system_prompt}\n\nUser: {prompt}"
+        def start(backend: LLMBackend) -> asyncio.Future:
+            streams[backend] = self._timed_stream(backend, prompt, system_prompt, agent)
+            task = asyncio.ensure_future(streams[backend].__anext__())
+            firsts[task] = backend
+            return task
 
+        winner, first_chunk, errors = None, None, []
+        pending = {start(primary)}
+        hedged = False
         try:
-            response = await self.model.generate_content_async(full_prompt, stream=True)
-            async for chunk in response:
-                if chunk.text:
-                    yield chunk.text
-        except Exception as e:
-            print(f"Gemini Stream Error: {e}. Switching to local fallback.")
-            async for chunk in self._stream_ollama(prompt, system_prompt):
+            while pending and winner is None:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if hedged else self.hedge_after,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    logger.info("%s slow to first token, hedging with %s", primary.name, secondary.name)
+                    pending.add(start(secondary))
+                    hedged = True
+                    continue
+                for task in done:
+                    backend = firsts[task]
+                    try:
+                        first_chunk = task.result()
+                    except StopAsyncIteration:
+                        first_chunk = ""
+                    except Exception as e:
+                        backend.breaker.record_failure()
+                        logger.warning("%s stream error: %s", backend.name, e)
+                        errors.append(f"{backend.name}: {e}")
+                        if not hedged:
+                            # Primary failed before the deadline: plain fallback
+                            pending.add(start(secondary))
+                            hedged = True
+                        continue
+                    winner = backend
+                    break
+        finally:
+            # Cancel the losers (and everything, if the consumer went away)
+            for task, backend in firsts.items():
+                if backend is winner:
+                    continue
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+                await streams[backend].aclose()
+
+        if winner is None:
+            yield self._error_message(errors)
+            return
+
+        try:
+            if first_chunk:
+                yield first_chunk
+            async for chunk in streams[winner]:
                 yield chunk
+        except Exception:
+            winner.breaker.record_failure()
+            raise
+        finally:
+            await streams[winner].aclose()
+        winner.breaker.record_success()
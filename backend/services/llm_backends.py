@@ -0,0 +1,221 @@
+import os
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import AsyncGenerator, List, Dict
+import httpx
+from services.rate_limit import AdaptiveRateLimiter, is_rate_limit_error
+from services.circuit_breaker import CircuitBreaker
+from services.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Output size assumed when reserving tokens/min before a call, settled afterwards
+EXPECTED_OUTPUT_TOKENS = 512
+
+
+_genai = None
+
+
+def genai_module():
+    """
+    google.generativeai, imported on first use: the SDK takes over a second
+    to load, which every cold start would otherwise pay before serving.
+    """
+    global _genai
+    if _genai is None:
+        import google.generativeai as genai
+        api_key = os.getenv("LLM_API_KEY") or os.getenv("GOOGLE_API_KEY")
+        if api_key:
+            genai.configure(api_key=api_key)
+        _genai = genai
+    return _genai
+
+
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "3")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+    )
+
+
+class LLMBackend(ABC):
+    """
+    One model provider. Backends raise on failure; falling back between them
+    is LLMService's job, guided by each backend's circuit breaker.
+    """
+
+    name = "backend"
+
+    def __init__(self):
+        self.breaker = _breaker()
+
+    @property
+    def available(self) -> bool:
+        """False when the backend is not configured at all (as opposed to unhealthy)."""
+        return True
+
+    @abstractmethod
+    async def generate(self, prompt: str, system_prompt: str = None) -> str:
+        pass
+
+    @abstractmethod
+    def stream(self, prompt: str, system_prompt: str = None) -> AsyncGenerator[str, None]:
+        pass
+
+    @abstractmethod
+    async def probe(self):
+        """Cheap health check used to close an open breaker; raises if unhealthy."""
+        pass
+
+    async def close(self):
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+    MODEL = "gemini-2.5-flash"
+
+    def __init__(self, api_key: str, rate_limiter: AdaptiveRateLimiter, max_rate_limit_retries: int = 3):
+        super().__init__()
+        self.api_key = api_key
+        self._model = None
+        self.rate_limiter = rate_limiter
+        self.max_rate_limit_retries = max_rate_limit_retries
+
+    @property
+    def model(self):
+        if self._model is None:
+            genai = genai_module()
+            genai.configure(api_key=self.api_key)
+            self._model = genai.GenerativeModel(self.MODEL)
+        return self._model
+
+    @staticmethod
+    def _full_prompt(prompt: str, system_prompt: str = None) -> str:
+        if system_prompt:
+            return f"System: {system_prompt}\n\nUser: {prompt}"
+        return prompt
+
+    async def generate(self, prompt: str, system_prompt: str = None) -> str:
+        full_prompt = self._full_prompt(prompt, system_prompt)
+        estimate = estimate_tokens(full_prompt) + EXPECTED_OUTPUT_TOKENS
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(estimate)
+            try:
+                response = await self.model.generate_content_async(full_prompt)
+                text = response.text
+                self.rate_limiter.on_success()
+                self.rate_limiter.settle(estimate, estimate_tokens(full_prompt) + estimate_tokens(text))
+                return text
+            except Exception as e:
+                if is_rate_limit_error(e) and attempt < self.max_rate_limit_retries:
+                    attempt += 1
+                    delay = self.rate_limiter.on_rate_limited()
+                    logger.info("Gemini rate limited, retrying in %.1fs (%s/%s)", delay, attempt, self.max_rate_limit_retries)
+                    continue
+                raise
+
+    async def stream(self, prompt: str, system_prompt: str = None) -> AsyncGenerator[str, None]:
+        full_prompt = self._full_prompt(prompt, system_prompt)
+        estimate = estimate_tokens(full_prompt) + EXPECTED_OUTPUT_TOKENS
+        attempt = 0
+        while True:
+            await self.rate_limiter.acquire(estimate)
+            output_tokens = 0
+            try:
+                response = await self.model.generate_content_async(full_prompt, stream=True)
+                async for chunk in response:
+                    if chunk.text:
+                        output_tokens += estimate_tokens(chunk.text)
+                        yield chunk.text
+                self.rate_limiter.on_success()
+                self.rate_limiter.settle(estimate, estimate_tokens(full_prompt) + output_tokens)
+                return
+            except Exception as e:
+                # Only retry while nothing has been sent to the client yet
+                if is_rate_limit_error(e) and output_tokens == 0 and attempt < self.max_rate_limit_retries:
+                    attempt += 1
+                    delay = self.rate_limiter.on_rate_limited()
+                    logger.info("Gemini stream rate limited, retrying in %.1fs (%s/%s)", delay, attempt, self.max_rate_limit_retries)
+                    continue
+                raise
+
+    async def analyze_file(self, prompt: str, uploaded_file) -> str:
+        estimate = estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+        await self.rate_limiter.acquire(estimate)
+        response = await self.model.generate_content_async([prompt, uploaded_file])
+        self.rate_limiter.on_success()
+        return response.text
+
+    async def probe(self):
+        # Metadata lookup: reaches the API with the configured key, costs no generation quota
+        await asyncio.to_thread(lambda: genai_module().get_model(f"models/{self.MODEL}"))
+
+
+class OllamaBackend(LLMBackend):
+    """
+    Local models through Ollama's async HTTP client. One keep-alive pool is
+    shared by every session, and chunks are awaited, so a generating model
+    never blocks the event loop. Closing the stream (client disconnect,
+    cancellation, hedging) closes the HTTP response, which makes Ollama stop
+    generating.
+    """
+
+    name = "ollama"
+
+    def __init__(self, model: str, host: str = None, max_connections: int = None):
+        super().__init__()
+        self.model = model
+        self.host = host
+        self.max_connections = max_connections or int(os.getenv("OLLAMA_CHAT_CONNECTIONS", "8"))
+        self._client = None
+
+    @property
+    def client(self):
+        # Created on first use, so importing the ollama package doesn't slow startup
+        if self._client is None:
+            import ollama
+            self._client = ollama.AsyncClient(
+                host=self.host,
+                # Generous read timeout: large local models can take a while per chunk
+                timeout=httpx.Timeout(300.0, connect=5.0),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    @property
+    def available(self) -> bool:
+        # No local model server on Render
+        return not os.getenv("RENDER")
+
+    @staticmethod
+    def _messages(prompt: str, system_prompt: str = None) -> List[Dict[str, str]]:
+        messages = []
+        if system_prompt:
+            messages.append({'role': 'system', 'content': system_prompt})
+        messages.append({'role': 'user', 'content': prompt})
+        return messages
+
+    async def generate(self, prompt: str, system_prompt: str = None) -> str:
+        response = await self.client.chat(model=self.model, messages=self._messages(prompt, system_prompt))
+        return response['message']['content']
+
+    async def stream(self, prompt: str, system_prompt: str = None) -> AsyncGenerator[str, None]:
+        stream = await self.client.chat(model=self.model, messages=self._messages(prompt, system_prompt), stream=True)
+        try:
+            async for chunk in stream:
+                content = chunk['message']['content']
+                if content:
+                    yield content
+        finally:
+            # Release the connection right away instead of when the generator is collected
+            await stream.aclose()
+
+    async def probe(self):
+        await self.client.show(self.model)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.close()
@@ -0,0 +1,153 @@
+"""
+In-process metrics in the Prometheus text format, served at GET /metrics.
+
+A deliberately small implementation (counters, gauges, fixed-bucket
+histograms with labels) so the hot path pays a dict lookup and a few
+additions per observation, and no client library is needed. The number of
+label sets per metric is capped so user-defined values such as custom agent
+names can't grow the output without bound; extra series fold into "other".
+"""
+import os
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List, Sequence, Tuple
+
+# Seconds; the LLM stages run from milliseconds (TTFT on a warm model) to a minute
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "500"))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.register(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        key = tuple(str(labels.get(n) or "") for n in self.labelnames)
+        if key not in self._series and len(self._series) >= MAX_SERIES:
+            return tuple("other" for _ in self.labelnames)
+        return key
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = list(self._series.items())
+        for key, value in series:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float, **labels):
+        # Per series: one count per bucket (non-cumulative until rendered), the +Inf count and the sum
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            key = self._key(labels)
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the duration of the `with` block, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = [(key, list(counts), total) for key, (counts, total) in self._series.items()]
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric):
+        self.metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Pipeline stages: history_load, prompt_build, summarize, persistence, backoff,
+# extraction, ocr, embedding, clustering, labeling, naming
+STAGE_SECONDS = Histogram("brainstorm_stage_seconds", "Duration of one pipeline stage.", ["stage"])
+DB_QUERY_SECONDS = Histogram("brainstorm_db_query_seconds", "Storage calls, including the thread pool wait.", ["operation"])
+LLM_QUEUE_SECONDS = Histogram("brainstorm_llm_queue_seconds", "Wait for an LLM scheduler slot.", ["priority"])
+LLM_TTFT_SECONDS = Histogram("brainstorm_llm_ttft_seconds", "Backend time to first streamed chunk.", ["backend", "agent"])
+LLM_STREAM_SECONDS = Histogram("brainstorm_llm_stream_seconds", "Backend stream duration, first request to last chunk.", ["backend", "agent"])
+LLM_GENERATE_SECONDS = Histogram("brainstorm_llm_generate_seconds", "Backend non-streaming call duration.", ["backend"])
+LLM_REQUESTS = Counter("brainstorm_llm_requests_total", "Backend calls by outcome (ok, error, cancelled).", ["backend", "call", "outcome"])
+TURN_SECONDS = Histogram("brainstorm_turn_seconds", "One agent turn as the session sees it, queueing included.", ["agent"])
+TURNS = Counter("brainstorm_turns_total", "Finished agent turns by outcome (ok, error).", ["agent", "outcome"])
+ACTIVE_SESSIONS = Gauge("brainstorm_active_sessions", "Sessions with a running generation loop.")
+VIEWERS = Gauge("brainstorm_viewers", "Connected SSE viewers.")
@@ -0,0 +1,239 @@
+from typing import List, Dict, Any, Optional
+import os
+import copy
+import uuid
+import numpy as np
+from sklearn.cluster import KMeans
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class OnlineClusterState:
+    """
+    Incrementally maintained clusters for one session.
+
+    Each new response is assigned to the nearest centroid, or starts a new
+    cluster when it is farther than `assign_distance`. Centroids are running
+    means over unit-normalized embeddings, so distances are comparable across
+    embedding models. After `compact_every` assignments the state asks for a
+    compaction (see `compacted`): clusters whose centroids drifted closer than
+    `merge_distance` are merged, at most `max_merges` pairs per pass, and
+    clusters whose members spread wider than `split_distance` are split in two.
+    """
+
+    def __init__(
+        self,
+        assign_distance: float = None,
+        merge_distance: float = None,
+        split_distance: float = None,
+        compact_every: int = None,
+        max_merges: int = None,
+        seed: int = 0,
+    ):
+        self.assign_distance = assign_distance or float(os.getenv("ONLINE_CLUSTER_DISTANCE", "0.6"))
+        self.merge_distance = merge_distance or float(os.getenv("ONLINE_CLUSTER_MERGE_DISTANCE", "0.4"))
+        self.split_distance = split_distance or float(os.getenv("ONLINE_CLUSTER_SPLIT_DISTANCE", "0.7"))
+        self.compact_every = compact_every or int(os.getenv("ONLINE_CLUSTER_COMPACT_EVERY", "25"))
+        self.max_merges = max_merges or int(os.getenv("ONLINE_CLUSTER_MAX_MERGES", "64"))
+        self.seed = seed
+
+        self.keys: List[str] = []
+        self.centroids: Optional[np.ndarray] = None
+        self.counts: List[int] = []
+        self.members: Dict[str, List[str]] = {}
+        # Normalized embeddings are rows of one growing matrix, so the state
+        # pickles (to and from the compute pool) as a single buffer
+        self.rows: Dict[str, int] = {}  # response_id -> row
+        self.texts: List[str] = []
+        self._vectors: Optional[np.ndarray] = None
+        self.version = 0
+        # True once the session's whole history was assigned, not just the turns since
+        self.complete = False
+        self._since_compaction = 0
+
+    @classmethod
+    def from_labels(cls, response_ids: List[str], texts: List[str], embeddings: np.ndarray, labels) -> "OnlineClusterState":
+        """A complete state holding a batch clustering result: one online cluster per label."""
+        state = cls()
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        state._vectors = (embeddings / np.where(norms > 0, norms, 1)).astype(np.float32)
+        state.rows = {rid: row for row, rid in enumerate(response_ids)}
+        state.texts = list(texts)
+        groups: Dict[int, List[int]] = {}
+        for row, label in enumerate(labels):
+            groups.setdefault(int(label), []).append(row)
+        for rows in groups.values():
+            state._add_cluster([response_ids[row] for row in rows], state._vectors[rows].mean(axis=0))
+        state.version = 1
+        state.complete = True
+        return state
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __contains__(self, response_id: str) -> bool:
+        return response_id in self.rows
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        if self._vectors is not None:
+            state["_vectors"] = self._vectors[:len(self.rows)]
+        return state
+
+    def vectors(self, response_ids: List[str]) -> np.ndarray:
+        return self._vectors[[self.rows[rid] for rid in response_ids]]
+
+    def _store(self, response_id: str, text: str, vector: np.ndarray):
+        size = len(self.rows)
+        if self._vectors is None:
+            self._vectors = np.empty((16, len(vector)), dtype=np.float32)
+        elif size == len(self._vectors):
+            self._vectors = np.concatenate([self._vectors, np.empty_like(self._vectors)])
+        self._vectors[size] = vector
+        self.rows[response_id] = size
+        self.texts.append(text)
+
+    @property
+    def needs_compaction(self) -> bool:
+        return self._since_compaction >= self.compact_every
+
+    def assign(self, response_id: str, text: str, embedding: np.ndarray) -> str:
+        """Places one response and returns the key of its cluster."""
+        if response_id in self.rows:
+            return next(k for k, ids in self.members.items() if response_id in ids)
+
+        vector = _normalize(np.asarray(embedding, dtype=np.float32))
+        self._store(response_id, text, vector)
+
+        key = None
+        if self.keys:
+            distances = np.linalg.norm(self.centroids - vector, axis=1)
+            nearest = int(np.argmin(distances))
+            if distances[nearest] <= self.assign_distance:
+                key = self.keys[nearest]
+                self.counts[nearest] += 1
+                # Running mean: c += (x - c) / n
+                self.centroids[nearest] += (vector - self.centroids[nearest]) / self.counts[nearest]
+                self.members[key].append(response_id)
+
+        if key is None:
+            key = self._add_cluster([response_id], vector)
+
+        self.version += 1
+        self._since_compaction += 1
+        return key
+
+    def _add_cluster(self, response_ids: List[str], centroid: np.ndarray) -> str:
+        key = str(uuid.uuid4())
+        self.keys.append(key)
+        self.counts.append(len(response_ids))
+        self.members[key] = list(response_ids)
+        row = centroid[None, :].astype(np.float32)
+        self.centroids = row if self.centroids is None else np.vstack([self.centroids, row])
+        return key
+
+    def _remove_clusters(self, indices: List[int]):
+        for index in sorted(indices, reverse=True):
+            del self.members[self.keys[index]]
+            del self.keys[index]
+            del self.counts[index]
+        dropped = set(indices)
+        keep = [i for i in range(len(self.centroids)) if i not in dropped]
+        self.centroids = self.centroids[keep] if keep else None
+
+    def compact(self):
+        """Merges clusters that drifted together and splits ones that grew too wide."""
+        self._since_compaction = 0
+        self._merge_close_clusters()
+        self._split_wide_clusters()
+        self.version += 1
+
+    def _merge_close_clusters(self):
+        if len(self.keys) < 2:
+            return
+        # Pairwise distances once, via |a|^2 + |b|^2 - 2ab without a k x k x dim
+        # temporary; after a merge only the merged cluster's row is recomputed
+        sq = (self.centroids ** 2).sum(axis=1)
+        distances = np.sqrt(np.maximum(sq[:, None] + sq[None, :] - 2 * self.centroids @ self.centroids.T, 0))
+        np.fill_diagonal(distances, np.inf)
+        merged = []
+        for _ in range(self.max_merges):
+            i, j = np.unravel_index(int(np.argmin(distances)), distances.shape)
+            if distances[i, j] > self.merge_distance:
+                break
+            i, j = min(i, j), max(i, j)
+            # Weighted mean of the two centroids, members concatenated
+            total = self.counts[i] + self.counts[j]
+            self.centroids[i] = (self.centroids[i] * self.counts[i] + self.centroids[j] * self.counts[j]) / total
+            self.counts[i] = total
+            self.members[self.keys[i]].extend(self.members[self.keys[j]])
+            merged.append(j)
+            row = np.linalg.norm(self.centroids - self.centroids[i], axis=1)
+            row[merged + [i]] = np.inf
+            distances[i, :] = distances[:, i] = row
+            distances[j, :] = distances[:, j] = np.inf
+        if merged:
+            self._remove_clusters(merged)
+
+    def _split_wide_clusters(self):
+        for index in range(len(self.keys) - 1, -1, -1):
+            member_ids = self.members[self.keys[index]]
+            if len(member_ids) < 4:
+                continue
+            vectors = self.vectors(member_ids)
+            spread = float(np.linalg.norm(vectors - self.centroids[index], axis=1).mean())
+            if spread <= self.split_distance:
+                continue
+            halves = KMeans(n_clusters=2, n_init=3, random_state=self.seed).fit_predict(vectors)
+            self._remove_clusters([index])
+            for half in (0, 1):
+                selected = [rid for rid, label in zip(member_ids, halves) if label == half]
+                if selected:
+                    self._add_cluster(selected, vectors[halves == half].mean(axis=0))
+
+    def succeed(self, previous: "OnlineClusterState"):
+        """
+        Takes over from `previous`, which kept taking assignments while this
+        state was computed from a copy of it: responses only `previous` has
+        are assigned here too, and the version moves past its own.
+        """
+        for response_id, row in previous.rows.items():
+            if response_id not in self.rows:
+                self.assign(response_id, previous.texts[row], previous._vectors[row])
+        self.version = max(self.version, previous.version) + 1
+        self.complete = self.complete or previous.complete
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Current clusters as {key, response_ids, texts, vectors}, largest first."""
+        clusters = [
+            {
+                "key": key,
+                "response_ids": list(self.members[key]),
+                "texts": [self.texts[self.rows[rid]] for rid in self.members[key]],
+                "vectors": self.vectors(self.members[key]),
+            }
+            for key in self.keys
+        ]
+        clusters.sort(key=lambda c: -len(c["response_ids"]))
+        return clusters
+
+
+def compacted(state: OnlineClusterState) -> OnlineClusterState:
+    """Compute-pool side of an online compaction: returns a compacted copy of `state`."""
+    # A copy in thread mode too, since the caller keeps serving the original meanwhile
+    state = copy.deepcopy(state)
+    state.compact()
+    return state
+
+
+def cluster_and_seed(embeddings: np.ndarray, response_ids: List[str], texts: List[str]):
+    """
+    Compute-pool side of batch clustering with online mode on: the labels and
+    the online state seeded from them, so neither runs on the event loop.
+    """
+    from services.cluster_engine import cluster_embeddings
+    labels = cluster_embeddings(embeddings)
+    return labels, OnlineClusterState.from_labels(response_ids, texts, embeddings, labels)
@@ -1,6 +1,9 @@
-from typing import List, AsyncGenerator
-import json
+from typing import List, AsyncGenerator, Set, Dict, Any, Optional, Callable, Awaitable
+import os
+import time
 import asyncio
+import logging
+import functools
 from agents.base import Agent
 from agents.optimist import OptimistAgent
 from agents.skeptic import SkepticAgent
@@ -8,163 +11,378 @@ from agents.analyst import AnalystAgent
 from agents.evaluator import EvaluatorAgent
 from agents.custom_agent import CustomAgent
 from services.llm import LLMService
-from services.database import DatabaseService
+from services.llm_backends import EXPECTED_OUTPUT_TOKENS
+from services.repository import AsyncRepository
+from services.clustering import ClusteringService
+from services.session import SessionRuntime
+from services.tokens import estimate_tokens
+from services.broadcast import HubRegistry, SessionHub, token_data
+from services.sse import format_event, event_id, parse_event_id, cursor_from_timestamp, timestamp_from_cursor, TokenCoalescer
+from services.metrics import STAGE_SECONDS, TURN_SECONDS, TURNS
+
+logger = logging.getLogger(__name__)
+
+ROUND_INSTRUCTIONS = [
+    "Focus on generating a wide range of creative ideas.",
+    "Critique the previous ideas. Identify potential flaws, risks, and missing perspectives.",
+    "Address the critiques. Propose concrete, technical solutions and refinements.",
+]
+DEEP_DEBATE_INSTRUCTION = "Deepen the debate. Challenge the technical feasibility of proposed solutions. Discuss edge cases, scalability, and long-term implications. Do not be superficial."
+CONCISENESS_INSTRUCTION = " Keep your response concise, on-point, and balanced. Use simple, plain English that is easy to read. Avoid jargon, complex sentence structures, and heavy academic language. Ensure the core idea is clearly explained without overcomplicating it."
 
 class Orchestrator:
-    def __init__(self, llm_service: LLMService, db_service: DatabaseService):
+    """
+    Schedules brainstorming sessions. Every session runs its own SessionRuntime,
+    so any number of sessions can be driven concurrently on one event loop.
+    Viewers of the same session share one generation loop through a SessionHub.
+    """
+
+    def __init__(self, llm_service: LLMService, repository: AsyncRepository, clustering_service: ClusteringService = None):
         self.llm_service = llm_service
-        self.db_service = db_service
-        # No defaults init here strictly; we do it per session or init with defaults
+        self.repository = repository
+        self.clustering_service = clustering_service
+        # Default agents are stateless and safe to share between sessions
         self.defaults = {
             "optimist": OptimistAgent("Optimist", "Optimist", llm_service),
             "skeptic": SkepticAgent("Skeptic", "Skeptic", llm_service),
             "analyst": AnalystAgent("Analyst", "Analyst", llm_service),
             "evaluator": EvaluatorAgent("Evaluator", "Evaluator", llm_service)
         }
-        self.agents: List[Agent] = list(self.defaults.values())
+        self.max_sessions = int(os.getenv("MAX_CONCURRENT_SESSIONS", "500"))
+        self.active_sessions: Set[SessionRuntime] = set()
+        self.hubs = HubRegistry()
+        # Token frames are batched up to this many characters or milliseconds (0 and 0 = one frame per chunk)
+        self.coalesce_bytes = int(os.getenv("SSE_COALESCE_BYTES", "256"))
+        self.coalesce_delay = int(os.getenv("SSE_COALESCE_MS", "30")) / 1000
+        # Per-session limits, 0 = unlimited. Idle means no viewer has (re)connected for that long.
+        self.max_turns = int(os.getenv("SESSION_MAX_TURNS", "0"))
+        self.max_tokens = int(os.getenv("SESSION_MAX_TOKENS", "0"))
+        self.idle_timeout = float(os.getenv("SESSION_IDLE_TIMEOUT", "0"))
+        self.disconnect_poll = float(os.getenv("SSE_DISCONNECT_POLL_SECONDS", "1.0"))
+        # Why generation stopped early, and a lower-bound estimate of the LLM tokens that saved
+        self.stopped: Dict[str, int] = {"disconnect": 0, "idle": 0, "max_turns": 0, "max_tokens": 0}
+        self.tokens_avoided = 0
+        # Rounds (e.g. "0") in which every agent answers the same context at once
+        self.parallel_rounds = {int(r) for r in os.getenv("PARALLEL_ROUNDS", "").split(",") if r.strip()}
+        self._background: Set[asyncio.Task] = set()
 
-    async def initialize_session_agents(self, agent_ids: List[str] = None):
+    async def load_session_agents(self, agent_ids: List[str] = None) -> List[Agent]:
         """
-        Re-initializes self.agents based on request.
+        Builds the agent roster for a session without touching shared state.
         """
         if agent_ids is None:
-            # Revert to all defaults if nothing specified (legacy safety)
-            self.agents = list(self.defaults.values())
-            return
+            # Fall back to all defaults if nothing specified (legacy safety)
+            return list(self.defaults.values())
 
-        new_agents = []
+        agents = []
         custom_ids = []
 
         for aid in agent_ids:
             if aid in self.defaults:
-                new_agents.append(self.defaults[aid])
+                agents.append(self.defaults[aid])
             else:
                 custom_ids.append(aid)
-        
-        self.agents = new_agents # Start with requested defaults
-        
+
         # Load requested custom agents
-        if custom_ids and self.db_service.get_client():
+        if custom_ids and self.repository.available:
             try:
-                res = self.db_service.get_client().table("custom_agents").select("*").in_("id", custom_ids).execute()
-                if res.data:
-                    # Sort them to match input order if possible, or just append
-                    # Map id -> record
-                    record_map = {r['id']: r for r in res.data}
+                records = await self.repository.fetch_custom_agents(custom_ids)
+                if records:
+                    # Map id -> record so custom agents keep the requested order
+                    record_map = {r['id']: r for r in records}
                     for cid in custom_ids:
-                         if cid in record_map:
-                             r = record_map[cid]
-                             self.agents.append(
-                                 CustomAgent(r['name'], r['role'], r['prompt'], self.llm_service)
-                             )
+                        if cid in record_map:
+                            r = record_map[cid]
+                            agents.append(
+                                CustomAgent(r['name'], r['role'], r['prompt'], self.llm_service)
+                            )
             except Exception as e:
-                print(f"Error loading custom agents: {e}")
+                logger.error("Error loading custom agents: %s", e)
+
+        return agents
+
+    def _observe_for_clustering(self, session_id: str, records: List[Dict[str, Any]], history: bool = False):
+        """
+        Hands finished turns to online clustering without delaying the stream;
+        history=True for the session's full history (even if empty) on load.
+        """
+        if not self.clustering_service or not self.clustering_service.online_enabled or not (records or history):
+            return
+        task = asyncio.create_task(self.clustering_service.observe_responses(session_id, records, history=history))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    @staticmethod
+    def round_instruction(round_num: int) -> str:
+        """Progressive depth: each round pushes the debate further."""
+        if round_num < len(ROUND_INSTRUCTIONS):
+            return ROUND_INSTRUCTIONS[round_num]
+        return DEEP_DEBATE_INSTRUCTION
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_sessions": len(self.active_sessions),
+            "viewers": sum(len(hub.subscribers) for hub in self.hubs.hubs.values()),
+            "stopped": dict(self.stopped),
+            "tokens_avoided": self.tokens_avoided,
+        }
+
+    async def run_brainstorming_session(
+        self,
+        topic: str,
+        session_id: str,
+        agent_ids: List[str] = None,
+        last_event_id: str = None,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Streams a brainstorming session as SSE events.
+
+        The first viewer starts the session's generation loop; later viewers of
+        the same session (other tabs, reconnects) join it, so their topic and
+        agent_ids are ignored. The loop stops when the last viewer disconnects.
+
+        A viewer without `last_event_id` first gets one `snapshot` event with
+        every finished turn. A reconnecting viewer passes the id of the last
+        event it received and only gets the turns it missed, loaded with a
+        keyset query, then the unseen part of the turn in progress.
+
+        `is_disconnected` (the request's) is polled so a viewer that went away
+        is dropped promptly, even while no events are flowing.
+        """
+        resume = parse_event_id(last_event_id)
+        hub = self.hubs.get(session_id)
+        if hub is None:
+            hub = self.hubs.create(session_id, lambda h: self._produce(h, topic, session_id, agent_ids))
+        subscriber = hub.subscribe(resume)
+        watcher = None
+        if is_disconnected is not None:
+            watcher = asyncio.create_task(self._watch_disconnect(is_disconnected, hub, subscriber))
+        try:
+            # Live events queue up meanwhile; stored turns up to start_cursor come first
+            await hub.ready.wait()
+            upto = subscriber.start_cursor
+            if resume is None:
+                turns = await self._load_turns(session_id, None, upto)
+                yield format_event("snapshot", {
+                    "turns": [{'name': r['agent_name'], 'content': r['content']} for r in turns],
+                }, event_id(upto, 0))
+            elif resume[0] < upto:
+                for record in await self._load_turns(session_id, resume[0], upto):
+                    yield format_event("agent_start", {'name': record['agent_name']})
+                    yield format_event("token", token_data(record['content'], record['agent_name']))
+                    yield format_event("agent_end", {'name': record['agent_name']},
+                                       event_id(cursor_from_timestamp(record['created_at']), 0))
+
+            async for frame in subscriber:
+                yield frame
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+            hub.unsubscribe(subscriber)
+
+    async def _watch_disconnect(self, is_disconnected: Callable[[], Awaitable[bool]], hub: SessionHub, subscriber):
+        try:
+            while not subscriber.closed:
+                if await is_disconnected():
+                    # Nobody will read what is queued; if this was the last viewer the loop stops
+                    subscriber.events.clear()
+                    hub.unsubscribe(subscriber)
+                    return
+                await asyncio.sleep(self.disconnect_poll)
+        except asyncio.CancelledError:
+            pass
+
+    def _limit_reached(self, runtime: SessionRuntime, hub: SessionHub) -> Optional[str]:
+        if self.max_turns and runtime.total_responses >= self.max_turns:
+            return "max_turns"
+        if self.max_tokens and runtime.output_tokens >= self.max_tokens:
+            return "max_tokens"
+        if self.idle_timeout and time.monotonic() - hub.last_joined >= self.idle_timeout:
+            return "idle"
+        return None
+
+    def _record_stop(self, reason: str, runtime: SessionRuntime, prompt_tokens: int, spent: int = 0, turns: int = 1):
+        """
+        Counts an early stop. The saving is estimated as the turns that would
+        have run next (their prompt plus the session's average response) minus
+        whatever interrupted turns had already used: a lower bound, since an
+        unattended loop would have kept going.
+        """
+        self.stopped[reason] += 1
+        average_output = runtime.output_tokens // runtime.total_responses if runtime.total_responses else EXPECTED_OUTPUT_TOKENS
+        self.tokens_avoided += max(0, turns * (prompt_tokens + average_output) - spent)
+
+    def _next_agents(self, runtime: SessionRuntime) -> List[Agent]:
+        """The whole roster at the start of a parallel round, otherwise the next agent."""
+        if (runtime.round_num in self.parallel_rounds and len(runtime.agents) > 1
+                and runtime.total_responses % len(runtime.agents) == 0):
+            agents = list(runtime.agents)
+            if self.max_turns:
+                agents = agents[:self.max_turns - runtime.total_responses]
+            return agents
+        return [runtime.next_agent()]
+
+    async def _stream_turn(self, hub: SessionHub, runtime: SessionRuntime, agent: Agent, effective_context: str) -> str:
+        """
+        Streams one agent's response to the hub, batched into fewer, larger
+        token frames tagged with the agent. Returns the text, or the error.
+        """
+        parts = []
+        coalescer = TokenCoalescer(lambda text: hub.publish("token", token_data(text, agent.name)),
+                                   self.coalesce_bytes, self.coalesce_delay)
+        start = time.perf_counter()
+        try:
+            async for chunk in agent.generate_stream(effective_context, runtime.session_id):
+                parts.append(chunk)
+                coalescer.add(chunk)
+                runtime.in_flight_tokens += estimate_tokens(chunk)
+            coalescer.flush()
+            response = "".join(parts)
+        except Exception as e:
+            coalescer.flush()
+            logger.error("Error generating response: %s", e)
+            response = f"[Error: {str(e)}]"
+            hub.publish("token", token_data(response, agent.name))
+        TURN_SECONDS.observe(time.perf_counter() - start, agent=agent.name)
+        TURNS.inc(agent=agent.name, outcome="error" if response.startswith(("Error", "[Error")) else "ok")
+        return response
+
+    async def _load_turns(self, session_id: str, after: int, until: int) -> List[Dict[str, Any]]:
+        """Stored turns with after < cursor <= until."""
+        if not until or not self.repository.available:
+            return []
+        try:
+            return await self.repository.fetch_responses_between(
+                session_id,
+                timestamp_from_cursor(after) if after else None,
+                timestamp_from_cursor(until),
+            )
+        except Exception as e:
+            logger.error("Error fetching history: %s", e)
+            return []
 
-    async def run_brainstorming_session(self, topic: str, session_id: str, agent_ids: List[str] = None) -> AsyncGenerator[str, None]:
+    async def _produce(self, hub: SessionHub, topic: str, session_id: str, agent_ids: List[str] = None):
         """
-        Runs a brainstorming session.
-        Yields SSE events.
+        The generation loop of one session, publishing events to its hub.
         """
-        
-        # 1. Fetch existing history to restore state
+        if len(self.active_sessions) >= self.max_sessions:
+            hub.publish("token", {'text': 'System Error: Too many concurrent sessions, please retry shortly.'})
+            return
+
+        # 1. Fetch existing history and the persisted context summary to restore state
         history = []
-        if self.db_service.get_client():
+        saved_summary = None
+        on_summary = None
+        if self.repository.available:
             try:
                 # Fetch all responses ordered by creation time
-                res = self.db_service.get_client().table("responses").select("*").eq("session_id", session_id).order("created_at").execute()
-                if res.data:
-                    history = res.data
-            except Exception as e:
-                print(f"Error fetching history: {e}")
-
-        # Initialize agents for this run
-        if agent_ids:
-             await self.initialize_session_agents(agent_ids)
-        elif not agent_ids and not history:
-             # Legacy/Default fallback if starting fresh with no args
-             pass 
-        
-        if not self.agents:
-             print("Warning: No agents available for session.")
-             yield f"event: token\ndata: {json.dumps({'text': 'System Error: No agents selected for this session.'})}\n\n"
-             return
-
-        # 2. Reconstruct Context & Replay History
-        context = f"Topic: {topic}"
-        
-        for record in history:
-            a_name = record['agent_name']
-            content = record['content']
-            
-            # Yield existing entity
-            yield f"event: agent_start\ndata: {json.dumps({'name': a_name})}\n\n"
-            yield f"event: token\ndata: {json.dumps({'text': content})}\n\n"
-            yield f"event: agent_end\ndata: {json.dumps({'name': a_name})}\n\n"
-            
-            context += f"\n\n{a_name}: {content}"
-
-        # 3. Continuous Loop
-        # Determine where we are in the cycle
-        total_responses = len(history)
-        
-        while True:
-            # Determine which agent is next
-            # Use modulo on currently active agents
-            if not self.agents:
-                break
-
-            agent_index = total_responses % len(self.agents)
-            agent = self.agents[agent_index]
-            
-            # Determine round number (how many full cycles completed)
-            round_num = total_responses // len(self.agents)
-            
-            # Progressive Depth Logic
-            instruction = ""
-            if round_num == 0:
-                instruction = "Focus on generating a wide range of creative ideas."
-            elif round_num == 1:
-                instruction = "Critique the previous ideas. Identify potential flaws, risks, and missing perspectives."
-            elif round_num == 2:
-                instruction = "Address the critiques. Propose concrete, technical solutions and refinements."
-            else:
-                instruction = "Deepen the debate. Challenge the technical feasibility of proposed solutions. Discuss edge cases, scalability, and long-term implications. Do not be superficial."
-
-            conciseness_instruction = " Keep your response concise, on-point, and balanced. Use simple, plain English that is easy to read. Avoid jargon, complex sentence structures, and heavy academic language. Ensure the core idea is clearly explained without overcomplicating it."
-            effective_context = f"{context}\n\n[SYSTEM DIRECTIVE]: {instruction}{conciseness_instruction}"
-            
-            # Yield Start Event
-            yield f"event: agent_start\ndata: {json.dumps({'name': agent.name})}\n\n"
-            
-            # Generate Stream
-            response_content = ""
-            try:
-                async for chunk in agent.generate_stream(effective_context):
-                    response_content += chunk
-                    yield f"event: token\ndata: {json.dumps({'text': chunk})}\n\n"
+                with STAGE_SECONDS.time(stage="history_load"):
+                    history, saved_summary = await asyncio.gather(
+                        self.repository.fetch_responses(session_id),
+                        self.repository.fetch_session_summary(session_id),
+                    )
             except Exception as e:
-                print(f"Error generating response: {e}")
-                error_msg = f"[Error: {str(e)}]"
-                response_content = error_msg
-                yield f"event: token\ndata: {json.dumps({'text': error_msg})}\n\n"
-
-            # Yield End Event
-            yield f"event: agent_end\ndata: {json.dumps({'name': agent.name})}\n\n"
-            
-            # Save to DB
-            if self.db_service.get_client():
-                try:
-                    self.db_service.get_client().table("responses").insert({
-                        "session_id": session_id,
-                        "agent_name": agent.name,
-                        "content": response_content
-                    }).execute()
-                except Exception as e:
-                    print(f"Error saving response: {e}")
-            
-            # Update Context
-            context += f"\n\n{agent.name}: {response_content}"
-            total_responses += 1
-            
-            # Delay to prevent rate limits
-            await asyncio.sleep(2)
+                logger.error("Error fetching history: %s", e)
+            on_summary = functools.partial(self.repository.save_session_summary, session_id)
+
+        runtime = SessionRuntime(session_id, topic, await self.load_session_agents(agent_ids), self.llm_service, on_summary)
+
+        if not runtime.agents:
+            logger.warning("No agents available for session %s", session_id)
+            hub.publish("token", {'text': 'System Error: No agents selected for this session.'})
+            return
+
+        self.active_sessions.add(runtime)
+        try:
+            # 2. Reconstruct Context; viewers load the history themselves
+            if saved_summary:
+                runtime.context_window.restore_summary(saved_summary['summary'], saved_summary['summary_turns'])
+            for record in history:
+                runtime.record_turn(record['agent_name'], record['content'])
+            hub.set_ready(cursor_from_timestamp(history[-1]['created_at']) if history else 0)
+
+            self._observe_for_clustering(session_id, history, history=True)
+            # Turns start right away from the newest history that fits the budget;
+            # whatever the saved summary doesn't cover yet is folded in the background
+            runtime.context_window.maybe_summarize(force=True)
+
+            # 3. Continuous Loop, paced by the LLM service's rate limiter
+            failed_turns = 0
+            paused = False
+            ran_turns = False
+            while True:
+                reason = self._limit_reached(runtime, hub)
+                if reason:
+                    logger.info("Session %s paused: %s", session_id, reason)
+                    # A session loaded already at a hard limit was counted by the producer that hit it
+                    if reason == "idle" or ran_turns:
+                        self._record_stop(reason, runtime, estimate_tokens(runtime.context))
+                    hub.publish("session_paused", {'reason': reason})
+                    paused = True
+                    if reason == "idle":
+                        # A new or returning viewer resumes the discussion
+                        await hub.wait_for_viewer()
+                        paused = False
+                        continue
+                    # Hard limit: stay attached (viewers keep their stream) until the last one leaves
+                    await asyncio.get_running_loop().create_future()
+
+                agents = self._next_agents(runtime)
+                ran_turns = True
+                with STAGE_SECONDS.time(stage="prompt_build"):
+                    instruction = self.round_instruction(runtime.round_num)
+                    effective_context = f"{runtime.context}\n\n[SYSTEM DIRECTIVE]: {instruction}{CONCISENESS_INSTRUCTION}"
+                    prompt_tokens = estimate_tokens(effective_context)
+                logger.debug("Session %s - Turn %d prompt size: %d tokens", session_id, runtime.total_responses, prompt_tokens)
+                runtime.in_flight_turns = len(agents)
+                runtime.in_flight_tokens = prompt_tokens * len(agents)
+
+                # Publish Start Events
+                for agent in agents:
+                    hub.publish("agent_start", {'name': agent.name})
+
+                if len(agents) == 1:
+                    responses = [await self._stream_turn(hub, runtime, agents[0], effective_context)]
+                else:
+                    # Parallel round: one context snapshot, tokens interleave on the stream
+                    responses = await asyncio.gather(
+                        *(self._stream_turn(hub, runtime, agent, effective_context) for agent in agents)
+                    )
+
+                # Commit in roster order, whichever agent finished first
+                for agent, response_content in zip(agents, responses):
+                    # Queue for the next bulk write to the DB
+                    record = self.repository.enqueue_response(session_id, agent.name, response_content)
+                    self._observe_for_clustering(session_id, [record])
+
+                    # Publish End Event; its id is the cursor a reconnect resumes from
+                    hub.publish("agent_end", {'name': agent.name, 'prompt_tokens': prompt_tokens},
+                                end_of_turn=cursor_from_timestamp(record['created_at']))
+                    runtime.record_turn(agent.name, response_content)
+
+                runtime.context_window.maybe_summarize()
+                runtime.in_flight_turns = runtime.in_flight_tokens = 0
+
+                # Back off only when the backends are failing outright, so a dead
+                # model doesn't turn the loop into a stream of error turns
+                if all(r.startswith(("Error", "[Error")) for r in responses):
+                    failed_turns += 1
+                    with STAGE_SECONDS.time(stage="backoff"):
+                        await asyncio.sleep(min(30, 2 ** failed_turns))
+                else:
+                    failed_turns = 0
+        except asyncio.CancelledError:
+            # Every viewer disconnected: in-flight LLM streams are cancelled with us
+            if not paused:
+                self._record_stop("disconnect", runtime, estimate_tokens(runtime.context),
+                                  runtime.in_flight_tokens, max(1, runtime.in_flight_turns))
+            raise
+        finally:
+            self.active_sessions.discard(runtime)
+            runtime.close()
+            self.llm_service.scheduler.forget_session(session_id)
+            if self.clustering_service:
+                self.clustering_service.forget_session(session_id)
+            # Client went away or the loop stopped: don't leave turns unsaved
+            await asyncio.shield(self.repository.flush())
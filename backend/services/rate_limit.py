@@ -0,0 +1,100 @@
+import time
+import random
+import asyncio
+from typing import Optional
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Recognizes 429 / quota errors from the Gemini client (or anything that looks like one)."""
+    if type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "quota" in message or "rate limit" in message
+
+
+class TokenBucket:
+    def __init__(self, capacity: float, refill_per_second: float):
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, rate_factor: float):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.refill_per_second * rate_factor)
+        self.updated = now
+
+    def wait_time(self, amount: float, rate_factor: float) -> float:
+        # Requests larger than the whole bucket only wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / (self.refill_per_second * rate_factor)
+
+
+class AdaptiveRateLimiter:
+    """
+    Process-wide limiter for LLM calls covering requests/min and tokens/min.
+
+    Callers `acquire` an estimated token count before each request and
+    `settle` the real count afterwards. A 429 triggers an exponential backoff
+    with jitter and halves the refill rate; each success then restores it by
+    a small step, so throughput recovers gradually instead of re-triggering
+    the provider's limit.
+    """
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int,
+                 base_backoff: float = 1.0, max_backoff: float = 60.0,
+                 min_rate_factor: float = 0.1, recovery_step: float = 0.05):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.min_rate_factor = min_rate_factor
+        self.recovery_step = recovery_step
+        self.rate_factor = 1.0
+        self.backoff_until = 0.0
+        self.consecutive_limits = 0
+        self.rate_limited_total = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self, estimated_tokens: int):
+        """Waits until one request of `estimated_tokens` fits in both buckets, then takes it."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        # The lock makes waiters queue in arrival order instead of racing for refills
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.backoff_until:
+                    await asyncio.sleep(self.backoff_until - now)
+                    continue
+                self.requests.refill(self.rate_factor)
+                self.tokens.refill(self.rate_factor)
+                wait = max(
+                    self.requests.wait_time(1, self.rate_factor),
+                    self.tokens.wait_time(estimated_tokens, self.rate_factor),
+                )
+                if wait <= 0:
+                    self.requests.level -= 1
+                    self.tokens.level -= min(estimated_tokens, self.tokens.capacity)
+                    return
+                await asyncio.sleep(wait)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """Corrects the token bucket once the real size of a call is known."""
+        self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated_tokens - actual_tokens)
+
+    def on_success(self):
+        self.consecutive_limits = 0
+        self.rate_factor = min(1.0, self.rate_factor + self.recovery_step)
+
+    def on_rate_limited(self) -> float:
+        """Backs off after a 429 and returns the delay applied."""
+        self.consecutive_limits += 1
+        self.rate_limited_total += 1
+        self.rate_factor = max(self.min_rate_factor, self.rate_factor / 2)
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (self.consecutive_limits - 1))
+        delay *= random.uniform(0.5, 1.5)
+        self.backoff_until = max(self.backoff_until, time.monotonic() + delay)
+        return delay
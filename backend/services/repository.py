@@ -0,0 +1,214 @@
+from typing import List, Dict, Any, Optional, Callable, Set
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import os
+import time
+import uuid
+import asyncio
+import logging
+import functools
+from services.storage import StorageBackend
+from services.metrics import DB_QUERY_SECONDS, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRepository:
+    """
+    Non-blocking access to a StorageBackend (Supabase or local SQLite).
+
+    Every query runs on a small bounded thread pool so a slow database round
+    trip never stalls the event loop. Response inserts are buffered in a
+    write-behind queue and written in bulk once `batch_size` rows are queued
+    or `flush_interval` seconds have passed, whichever comes first.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        max_workers: int = None,
+        batch_size: int = None,
+        flush_interval: float = None,
+    ):
+        self.storage = storage
+        self.batch_size = batch_size or int(os.getenv("DB_WRITE_BATCH_SIZE", "50"))
+        self.flush_interval = flush_interval or float(os.getenv("DB_FLUSH_INTERVAL", "1.0"))
+        # Flushes a row may fail before it is dropped, so rows the database
+        # rejects for good (e.g. an unknown session id) cannot stay queued forever
+        self.max_attempts = int(os.getenv("DB_WRITE_MAX_ATTEMPTS", "10"))
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or int(os.getenv("DB_POOL_SIZE", "8")),
+            thread_name_prefix="db",
+        )
+        self._pending: List[Dict[str, Any]] = []
+        self._attempts: Dict[str, int] = {}  # row id -> failed flushes so far
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._background: Set[asyncio.Task] = set()
+        self._last_created_at: Optional[datetime] = None
+
+    @property
+    def available(self) -> bool:
+        return self.storage.available
+
+    async def _run(self, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        try:
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=fn.__name__)
+
+    def _next_created_at(self) -> str:
+        """
+        Client-side timestamps keep bulk-inserted rows in generation order
+        (server-side now() is identical for every row of one insert).
+        """
+        now = datetime.now(timezone.utc)
+        if self._last_created_at and now <= self._last_created_at:
+            now = self._last_created_at + timedelta(microseconds=1)
+        self._last_created_at = now
+        # Fixed width (always with microseconds) so text comparison matches time order
+        return now.isoformat(timespec="microseconds")
+
+    # Write-behind queue for responses
+
+    def enqueue_response(self, session_id: str, agent_name: str, content: str) -> Dict[str, Any]:
+        """
+        Queues a response row for the next bulk insert and returns it. The id
+        is assigned here so callers can reference the row before it is written.
+        """
+        record = {
+            "id": str(uuid.uuid4()),
+            "session_id": session_id,
+            "agent_name": agent_name,
+            "content": content,
+            "created_at": self._next_created_at(),
+        }
+        if not self.available:
+            return record
+
+        self._pending.append(record)
+        if len(self._pending) >= self.batch_size:
+            task = asyncio.create_task(self.flush())
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        elif self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_later())
+        return record
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> bool:
+        """
+        Writes every queued response in one bulk insert. If nothing can be
+        written (the database is likely down) the rows are put back at the
+        front of the queue for the next attempt, up to `max_attempts` times
+        per row; rows that fail while others succeed are dropped.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if not self._pending:
+                return True
+            batch, self._pending = self._pending, []
+            with STAGE_SECONDS.time(stage="persistence"):
+                try:
+                    await self._run(self.storage.insert_responses, batch)
+                    self._forget_attempts(batch)
+                    return True
+                except Exception as e:
+                    logger.error("Error saving %d responses: %s", len(batch), e)
+
+                # One bad row (e.g. an unknown session id) must not block the rest
+                failed = []
+                for row in batch:
+                    try:
+                        await self._run(self.storage.insert_responses, [row])
+                    except Exception:
+                        failed.append(row)
+            if len(failed) == len(batch):
+                # Nothing went through, most likely the database is down: retry later
+                retry, dropped = [], []
+                for row in batch:
+                    attempts = self._attempts.get(row["id"], 0) + 1
+                    if attempts < self.max_attempts:
+                        self._attempts[row["id"]] = attempts
+                        retry.append(row)
+                    else:
+                        self._attempts.pop(row["id"], None)
+                        dropped.append(row)
+                if dropped:
+                    logger.error("Dropped %d responses after %d failed attempts (sessions %s)", len(dropped),
+                                 self.max_attempts, ", ".join(sorted({row["session_id"] for row in dropped})))
+                self._pending[:0] = retry
+                return False
+            # The rest went through, or failed on their own and are dropped
+            self._forget_attempts(batch)
+            if failed:
+                logger.warning("Dropped %d responses that could not be saved", len(failed))
+            return True
+
+    def _forget_attempts(self, rows: List[Dict[str, Any]]):
+        if self._attempts:
+            for row in rows:
+                self._attempts.pop(row["id"], None)
+
+    async def close(self):
+        """Flushes outstanding writes and releases the pool (call on shutdown)."""
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        if not await self.flush():
+            logger.warning("%d responses could not be saved before shutdown", len(self._pending))
+        self._executor.shutdown(wait=True)
+
+    # Queries
+
+    async def create_session(self, session_id: str, topic: str):
+        await self._run(self.storage.create_session, session_id, topic)
+
+    async def get_session_topic(self, session_id: str) -> Optional[str]:
+        return await self._run(self.storage.get_session_topic, session_id)
+
+    async def fetch_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self.storage.fetch_session_summary, session_id)
+
+    async def save_session_summary(self, session_id: str, summary: str, turns: int):
+        await self._run(self.storage.save_session_summary, session_id, summary, turns)
+
+    async def fetch_responses(self, session_id: str) -> List[Dict[str, Any]]:
+        # Make sure rows still sitting in the write-behind queue are visible
+        await self.flush()
+        return await self._run(self.storage.fetch_responses, session_id)
+
+    async def fetch_responses_between(self, session_id: str, after: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        await self.flush()
+        return await self._run(self.storage.fetch_responses_between, session_id, after, until)
+
+    async def fetch_custom_agents(self, agent_ids: List[str] = None) -> List[Dict[str, Any]]:
+        return await self._run(self.storage.fetch_custom_agents, agent_ids)
+
+    async def create_custom_agent(self, name: str, role: str, prompt: str) -> List[Dict[str, Any]]:
+        return await self._run(self.storage.create_custom_agent, name, role, prompt)
+
+    async def delete_custom_agent(self, agent_id: str) -> List[Dict[str, Any]]:
+        return await self._run(self.storage.delete_custom_agent, agent_id)
+
+    async def insert_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]]):
+        await self._run(self.storage.insert_clusters, clusters, assignments)
+
+    async def update_clusters(self, clusters: List[Dict[str, Any]]):
+        await self._run(self.storage.update_clusters, clusters)
+
+    async def save_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]], removed_ids: List[str]):
+        await self._run(self.storage.save_clusters, clusters, assignments, removed_ids)
+
+    async def fetch_embeddings(self, model: str, content_hashes: List[str]) -> List[Dict[str, Any]]:
+        return await self._run(self.storage.fetch_embeddings, model, content_hashes)
+
+    async def insert_embeddings(self, rows: List[Dict[str, Any]]):
+        await self._run(self.storage.insert_embeddings, rows)
@@ -0,0 +1,136 @@
+import time
+import itertools
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, Optional
+
+# Lower runs first. Streaming turns have a user watching tokens arrive, uploads
+# have a user waiting on the response, naming and summaries can lag.
+PRIORITY_CLASSES = {"stream": 0, "ocr": 1, "naming": 2, "summary": 2}
+
+
+class _Ticket:
+    __slots__ = ("session_id", "priority", "finish_tag", "seq", "enqueued", "future")
+
+    def __init__(self, session_id, priority, finish_tag, seq, future):
+        self.session_id = session_id
+        self.priority = priority
+        self.finish_tag = finish_tag
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.future = future
+
+
+class LLMScheduler:
+    """
+    Admission control for LLM calls: at most `max_concurrency` run at once.
+
+    When all slots are busy, waiters are ordered by priority class first and
+    then by fair queuing across sessions (every session gets an equal share):
+    each request gets a virtual finish tag of max(virtual clock, session's
+    last tag) + cost, so a session issuing many or large requests queues
+    behind sessions that issued few. Waiters age one class up every `aging_seconds` so background work
+    cannot starve under sustained streaming load.
+    """
+
+    def __init__(self, max_concurrency: int, aging_seconds: float = 30.0, stats_window: int = 1000):
+        self.max_concurrency = max(1, max_concurrency)
+        self.aging_seconds = aging_seconds
+        self.active = 0
+        self.virtual_time = 0.0
+        self._last_finish: Dict[str, float] = {}
+        self._waiting: List[_Ticket] = []
+        self._seq = itertools.count()
+        self._active_by_class: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._completed: Dict[str, int] = {name: 0 for name in PRIORITY_CLASSES}
+        self._waits: Dict[str, deque] = {name: deque(maxlen=stats_window) for name in PRIORITY_CLASSES}
+
+    def forget_session(self, session_id: str):
+        self._last_finish.pop(session_id, None)
+
+    @asynccontextmanager
+    async def slot(self, session_id: Optional[str] = None, priority: str = "stream", cost: float = 1.0):
+        """Holds one concurrency slot for the duration of the block."""
+        await self._acquire(session_id, priority, cost)
+        try:
+            yield
+        finally:
+            self._release(priority)
+
+    async def _acquire(self, session_id: Optional[str], priority: str, cost: float):
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class: {priority}")
+        # Calls not tied to a session share one flow
+        flow = session_id or "_shared"
+        start = max(self.virtual_time, self._last_finish.get(flow, 0.0))
+        finish_tag = start + cost
+        self._last_finish[flow] = finish_tag
+
+        if self.active < self.max_concurrency and not self._waiting:
+            self._start(priority, finish_tag, 0.0)
+            return
+
+        ticket = _Ticket(flow, priority, finish_tag, next(self._seq), asyncio.get_running_loop().create_future())
+        self._waiting.append(ticket)
+        try:
+            await ticket.future
+        except asyncio.CancelledError:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Slot was granted as we were cancelled: hand it on
+                self._release(priority)
+            else:
+                self._waiting.remove(ticket)
+            raise
+
+    def _start(self, priority: str, finish_tag: float, waited: float):
+        self.active += 1
+        self._active_by_class[priority] += 1
+        self.virtual_time = max(self.virtual_time, finish_tag)
+        self._waits[priority].append(waited)
+
+    def _release(self, priority: str):
+        self.active -= 1
+        self._active_by_class[priority] -= 1
+        self._completed[priority] += 1
+        self._dispatch()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        while self._waiting and self.active < self.max_concurrency:
+            # Queues stay small (bounded by live sessions), a linear scan keeps aging simple
+            ticket = min(self._waiting, key=lambda t: (
+                PRIORITY_CLASSES[t.priority] - int((now - t.enqueued) / self.aging_seconds),
+                t.finish_tag,
+                t.seq,
+            ))
+            self._waiting.remove(ticket)
+            self._start(ticket.priority, ticket.finish_tag, now - ticket.enqueued)
+            ticket.future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, in-flight calls and recent wait times per priority class."""
+        classes = {}
+        for name in PRIORITY_CLASSES:
+            waits = sorted(self._waits[name])
+            classes[name] = {
+                "queued": sum(1 for t in self._waiting if t.priority == name),
+                "active": self._active_by_class[name],
+                "completed": self._completed[name],
+                "wait_p50_ms": round(_percentile(waits, 0.5) * 1000, 1),
+                "wait_p95_ms": round(_percentile(waits, 0.95) * 1000, 1),
+                "wait_max_ms": round((waits[-1] if waits else 0.0) * 1000, 1),
+            }
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self.active,
+            "queued": len(self._waiting),
+            "sessions_waiting": len({t.session_id for t in self._waiting}),
+            "classes": classes,
+        }
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
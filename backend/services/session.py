@@ -0,0 +1,48 @@
+from typing import List, Callable, Awaitable
+from agents.base import Agent
+from services.context import ContextWindow
+from services.tokens import estimate_tokens
+from services.llm import LLMService
+
+
+class SessionRuntime:
+    """
+    Holds the state of one running brainstorming session: its agent roster,
+    the bounded context window and the turn cursor. Each stream gets its own
+    runtime so concurrent sessions never share mutable state.
+    """
+
+    def __init__(self, session_id: str, topic: str, agents: List[Agent], llm_service: LLMService,
+                 on_summary: Callable[[str, int], Awaitable[None]] = None):
+        self.session_id = session_id
+        self.topic = topic
+        self.agents = agents
+        self.context_window = ContextWindow(topic, llm_service, session_id=session_id, on_summary=on_summary)
+        self.total_responses = 0
+        self.output_tokens = 0  # estimated tokens of every response so far, history included
+        # Turns being generated and the tokens they have used so far (prompts included)
+        self.in_flight_turns = 0
+        self.in_flight_tokens = 0
+
+    @property
+    def round_num(self) -> int:
+        """Number of full agent cycles completed so far."""
+        return self.total_responses // len(self.agents)
+
+    @property
+    def context(self) -> str:
+        return self.context_window.render()
+
+    def next_agent(self) -> Agent:
+        return self.agents[self.total_responses % len(self.agents)]
+
+    def record_turn(self, agent_name: str, content: str):
+        """
+        Appends a finished turn to the context and advances the cursor.
+        """
+        self.context_window.add_turn(agent_name, content)
+        self.total_responses += 1
+        self.output_tokens += estimate_tokens(content)
+
+    def close(self):
+        self.context_window.close()
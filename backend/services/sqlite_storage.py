@@ -0,0 +1,211 @@
+from typing import List, Dict, Any, Optional
+import json
+import logging
+import sqlite3
+import threading
+import uuid
+from services.storage import StorageBackend
+
+logger = logging.getLogger(__name__)
+
+# Mirrors schema.sql. Ids are uuid strings and timestamps ISO-8601 UTC text so
+# rows look the same as the ones Supabase returns.
+SCHEMA = """
+create table if not exists sessions (
+  id text primary key,
+  topic text not null,
+  summary text,
+  summary_turns integer not null default 0,
+  created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+create table if not exists responses (
+  id text primary key,
+  session_id text not null references sessions(id) on delete cascade,
+  agent_name text not null,
+  content text not null,
+  created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create index if not exists responses_session_created_idx on responses (session_id, created_at);
+
+create table if not exists embeddings (
+  id text primary key,
+  response_id text references responses(id) on delete set null,
+  content_hash text not null,
+  model text not null,
+  dim integer not null,
+  scale real not null,
+  vector blob not null,
+  created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create unique index if not exists embeddings_model_hash_idx on embeddings (model, content_hash);
+
+create table if not exists clusters (
+  id text primary key,
+  session_id text not null references sessions(id) on delete cascade,
+  name text not null,
+  description text,
+  created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+create index if not exists clusters_session_idx on clusters (session_id, created_at);
+
+create table if not exists cluster_assignments (
+  response_id text not null references responses(id) on delete cascade,
+  cluster_id text not null references clusters(id) on delete cascade,
+  primary key (response_id, cluster_id)
+);
+create index if not exists cluster_assignments_cluster_idx on cluster_assignments (cluster_id);
+
+create table if not exists custom_agents (
+  id text primary key,
+  name text not null,
+  role text not null,
+  prompt text not null,
+  created_at text not null default (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+"""
+
+# Statements are constant strings so sqlite3's statement cache keeps them prepared
+INSERT_SESSION = "insert into sessions (id, topic) values (?, ?)"
+SELECT_SESSION_TOPIC = "select topic from sessions where id = ?"
+SELECT_SESSION_SUMMARY = "select summary, summary_turns from sessions where id = ? and summary is not null"
+UPDATE_SESSION_SUMMARY = "update sessions set summary = ?, summary_turns = ? where id = ?"
+SELECT_RESPONSES = "select * from responses where session_id = ? order by created_at"
+SELECT_RESPONSES_BETWEEN = "select * from responses where session_id = ? and created_at > ? and created_at <= ? order by created_at"
+INSERT_RESPONSE = "insert into responses (id, session_id, agent_name, content, created_at) values (:id, :session_id, :agent_name, :content, :created_at)"
+SELECT_CUSTOM_AGENTS = "select * from custom_agents order by created_at"
+SELECT_CUSTOM_AGENT = "select * from custom_agents where id = ?"
+INSERT_CUSTOM_AGENT = "insert into custom_agents (id, name, role, prompt) values (?, ?, ?, ?)"
+DELETE_CUSTOM_AGENT = "delete from custom_agents where id = ?"
+INSERT_CLUSTER = "insert into clusters (id, session_id, name, description) values (:id, :session_id, :name, :description)"
+UPDATE_CLUSTER = "update clusters set name = :name, description = :description where id = :id"
+UPSERT_CLUSTER = ("insert into clusters (id, session_id, name, description) values (:id, :session_id, :name, :description) "
+                  "on conflict (id) do update set name = excluded.name, description = excluded.description")
+DELETE_RESPONSE_ASSIGNMENTS = "delete from cluster_assignments where response_id = ?"
+DELETE_CLUSTER = "delete from clusters where id = ?"
+INSERT_CLUSTER_ASSIGNMENT = "insert or ignore into cluster_assignments (response_id, cluster_id) values (:response_id, :cluster_id)"
+# The hash list is bound as one JSON array so the lookup is a single prepared query
+SELECT_EMBEDDINGS = "select content_hash, dim, scale, vector from embeddings where model = ? and content_hash in (select value from json_each(?))"
+INSERT_EMBEDDING = "insert or ignore into embeddings (id, response_id, content_hash, model, dim, scale, vector) values (:id, :response_id, :content_hash, :model, :dim, :scale, :vector)"
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Local SQLite storage backend in WAL mode.
+
+    Each thread of the repository pool gets its own connection; WAL lets those
+    readers proceed while a writer commits, and bulk inserts run as a single
+    transaction.
+    """
+
+    def __init__(self, path: str = "brainstorm.db"):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        self._upgrade(conn)
+        logger.info("Using local SQLite storage at %s", path)
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    @staticmethod
+    def _upgrade(conn: sqlite3.Connection):
+        """Adds columns that databases created by older versions lack (SQLite's counterpart of migrations/)."""
+        columns = {row[1] for row in conn.execute("pragma table_info(sessions)")}
+        with conn:
+            if "summary" not in columns:
+                conn.execute("alter table sessions add column summary text")
+            if "summary_turns" not in columns:
+                conn.execute("alter table sessions add column summary_turns integer not null default 0")
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, cached_statements=256)
+            conn.row_factory = sqlite3.Row
+            conn.execute("pragma journal_mode=wal")
+            conn.execute("pragma synchronous=normal")
+            conn.execute("pragma foreign_keys=on")
+            self._local.conn = conn
+        return conn
+
+    def _query(self, sql: str, params=()) -> List[Dict[str, Any]]:
+        return [dict(row) for row in self._connection().execute(sql, params).fetchall()]
+
+    def create_session(self, session_id: str, topic: str):
+        with self._connection() as conn:
+            conn.execute(INSERT_SESSION, (session_id, topic))
+
+    def get_session_topic(self, session_id: str) -> Optional[str]:
+        rows = self._query(SELECT_SESSION_TOPIC, (session_id,))
+        return rows[0]['topic'] if rows else None
+
+    def fetch_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query(SELECT_SESSION_SUMMARY, (session_id,))
+        return rows[0] if rows else None
+
+    def save_session_summary(self, session_id: str, summary: str, turns: int):
+        with self._connection() as conn:
+            conn.execute(UPDATE_SESSION_SUMMARY, (summary, turns, session_id))
+
+    def fetch_responses(self, session_id: str) -> List[Dict[str, Any]]:
+        return self._query(SELECT_RESPONSES, (session_id,))
+
+    def fetch_responses_between(self, session_id: str, after: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        # Timestamps are fixed-width ISO strings, so text order is time order
+        return self._query(SELECT_RESPONSES_BETWEEN, (session_id, after or "", until or "9999"))
+
+    def insert_responses(self, rows: List[Dict[str, Any]]):
+        with self._connection() as conn:
+            conn.executemany(INSERT_RESPONSE, rows)
+
+    def fetch_custom_agents(self, agent_ids: List[str] = None) -> List[Dict[str, Any]]:
+        if agent_ids is None:
+            return self._query(SELECT_CUSTOM_AGENTS)
+        conn = self._connection()
+        rows = []
+        for agent_id in agent_ids:
+            row = conn.execute(SELECT_CUSTOM_AGENT, (agent_id,)).fetchone()
+            if row:
+                rows.append(dict(row))
+        return rows
+
+    def create_custom_agent(self, name: str, role: str, prompt: str) -> List[Dict[str, Any]]:
+        agent_id = str(uuid.uuid4())
+        with self._connection() as conn:
+            conn.execute(INSERT_CUSTOM_AGENT, (agent_id, name, role, prompt))
+        return self._query(SELECT_CUSTOM_AGENT, (agent_id,))
+
+    def delete_custom_agent(self, agent_id: str) -> List[Dict[str, Any]]:
+        deleted = self._query(SELECT_CUSTOM_AGENT, (agent_id,))
+        with self._connection() as conn:
+            conn.execute(DELETE_CUSTOM_AGENT, (agent_id,))
+        return deleted
+
+    def insert_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]]):
+        # One transaction for the whole clustering result
+        with self._connection() as conn:
+            conn.executemany(INSERT_CLUSTER, clusters)
+            conn.executemany(INSERT_CLUSTER_ASSIGNMENT, assignments)
+
+    def update_clusters(self, clusters: List[Dict[str, Any]]):
+        with self._connection() as conn:
+            conn.executemany(UPDATE_CLUSTER, clusters)
+
+    def save_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]], removed_ids: List[str]):
+        with self._connection() as conn:
+            conn.executemany(UPSERT_CLUSTER, clusters)
+            conn.executemany(DELETE_RESPONSE_ASSIGNMENTS, [(a["response_id"],) for a in assignments])
+            conn.executemany(INSERT_CLUSTER_ASSIGNMENT, assignments)
+            # Assignments go with their cluster (foreign key cascade)
+            conn.executemany(DELETE_CLUSTER, [(cluster_id,) for cluster_id in removed_ids])
+
+    def fetch_embeddings(self, model: str, content_hashes: List[str]) -> List[Dict[str, Any]]:
+        return self._query(SELECT_EMBEDDINGS, (model, json.dumps(content_hashes)))
+
+    def insert_embeddings(self, rows: List[Dict[str, Any]]):
+        rows = [{"id": str(uuid.uuid4()), "response_id": None, **row} for row in rows]
+        with self._connection() as conn:
+            conn.executemany(INSERT_EMBEDDING, rows)
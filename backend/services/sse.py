@@ -0,0 +1,95 @@
+import json
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # optional, several times faster for the per-token frames
+    orjson = None
+
+# SSE event ids are "<cursor>-<n>": <cursor> is the created_at of the last turn
+# the client has completely (microseconds since the epoch, 0 before the first
+# turn) and <n> counts the events it has seen of the turn in progress. Ids
+# increase monotonically as (cursor, n) pairs.
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def dumps(data: Dict[str, Any]) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def format_event(name: str, data: Dict[str, Any], event_id: str = None) -> bytes:
+    """One encoded SSE frame, ready to be written to any number of responses."""
+    frame = b"event: " + name.encode("ascii") + b"\ndata: " + dumps(data) + b"\n"
+    if event_id is not None:
+        frame += b"id: " + event_id.encode("ascii") + b"\n"
+    return frame + b"\n"
+
+
+class TokenCoalescer:
+    """
+    Batches streamed text into fewer, larger token frames: buffered text is
+    emitted once it reaches `max_bytes` characters or `max_delay` seconds
+    after the first buffered chunk, whichever comes first. The delay is a
+    loop timer, so no task or wakeup is spent per chunk. With both limits at
+    0 every chunk is emitted as is.
+    """
+
+    def __init__(self, emit: Callable[[str], None], max_bytes: int, max_delay: float):
+        self.emit = emit
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self._buffer = []
+        self._size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+    def add(self, chunk: str):
+        self._buffer.append(chunk)
+        self._size += len(chunk)
+        if self.max_delay <= 0 or (self.max_bytes > 0 and self._size >= self.max_bytes):
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_delay, self.flush)
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buffer:
+            text = "".join(self._buffer)
+            self._buffer, self._size = [], 0
+            self.emit(text)
+
+
+def event_id(cursor: int, n: int) -> str:
+    return f"{cursor}-{n}"
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[int, int]]:
+    """(cursor, n) from a Last-Event-ID / ?cursor= value; None if absent or malformed."""
+    if not value:
+        return None
+    cursor, _, n = value.strip().partition("-")
+    try:
+        return int(cursor), int(n or 0)
+    except ValueError:
+        return None
+
+
+def cursor_from_timestamp(created_at: str) -> int:
+    moment = datetime.fromisoformat(created_at.replace("Z", "+00:00"))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    delta = moment - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def timestamp_from_cursor(cursor: int) -> str:
+    """ISO timestamp in the same fixed-width form the repository writes created_at in."""
+    seconds, micros = divmod(cursor, 1_000_000)
+    moment = datetime.fromtimestamp(seconds, tz=timezone.utc).replace(microsecond=micros)
+    return moment.isoformat(timespec="microseconds")
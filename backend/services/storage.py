@@ -0,0 +1,120 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class StorageBackend(ABC):
+    """
+    Blocking persistence interface for the tables in schema.sql.
+
+    Implementations are called from AsyncRepository's thread pool, so they may
+    block but must be safe to use from several threads at once.
+    """
+
+    @property
+    @abstractmethod
+    def available(self) -> bool:
+        pass
+
+    @abstractmethod
+    def create_session(self, session_id: str, topic: str):
+        pass
+
+    @abstractmethod
+    def get_session_topic(self, session_id: str) -> Optional[str]:
+        pass
+
+    @abstractmethod
+    def fetch_session_summary(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session's rolling context summary as {"summary", "summary_turns"}, or None."""
+        pass
+
+    @abstractmethod
+    def save_session_summary(self, session_id: str, summary: str, turns: int):
+        """Stores the rolling summary, which covers the session's first `turns` responses."""
+        pass
+
+    @abstractmethod
+    def fetch_responses(self, session_id: str) -> List[Dict[str, Any]]:
+        """All responses of a session, oldest first."""
+        pass
+
+    @abstractmethod
+    def fetch_responses_between(self, session_id: str, after: Optional[str] = None, until: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Keyset page of a session's responses: after < created_at <= until, oldest first."""
+        pass
+
+    @abstractmethod
+    def insert_responses(self, rows: List[Dict[str, Any]]):
+        """Bulk insert; rows carry their own id and created_at."""
+        pass
+
+    @abstractmethod
+    def fetch_custom_agents(self, agent_ids: List[str] = None) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def create_custom_agent(self, name: str, role: str, prompt: str) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def delete_custom_agent(self, agent_id: str) -> List[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def insert_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]]):
+        """
+        Bulk-writes cluster rows (with client-side ids) and then all of their
+        cluster_assignments rows.
+        """
+        pass
+
+    @abstractmethod
+    def update_clusters(self, clusters: List[Dict[str, Any]]):
+        """Bulk-updates name and description of existing cluster rows (matched by id)."""
+        pass
+
+    @abstractmethod
+    def save_clusters(self, clusters: List[Dict[str, Any]], assignments: List[Dict[str, Any]], removed_ids: List[str]):
+        """
+        Incremental save of a session's clusters (online clustering, stable ids):
+        upserts the cluster rows, replaces the assignment of each response in
+        `assignments` (the new and moved ones) and deletes the clusters in
+        `removed_ids` together with their assignments.
+        """
+        pass
+
+    @abstractmethod
+    def fetch_embeddings(self, model: str, content_hashes: List[str]) -> List[Dict[str, Any]]:
+        """
+        Cached embeddings for the given hashes as rows with content_hash, dim,
+        scale and vector (raw int8 bytes). Missing hashes are simply absent.
+        """
+        pass
+
+    @abstractmethod
+    def insert_embeddings(self, rows: List[Dict[str, Any]]):
+        """Bulk insert, ignoring rows whose (model, content_hash) already exists."""
+        pass
+
+
+def create_storage() -> StorageBackend:
+    """
+    Picks the storage backend from STORAGE_BACKEND ("supabase", "sqlite" or
+    "memory", the in-process fake used for benchmarks).
+    """
+    backend = os.getenv("STORAGE_BACKEND", "supabase").lower()
+    if backend == "sqlite":
+        from services.sqlite_storage import SQLiteStorage
+        return SQLiteStorage(os.getenv("SQLITE_PATH", "brainstorm.db"))
+    if backend == "memory":
+        from services.fakes import MemoryStorage
+        return MemoryStorage()
+    if backend != "supabase":
+        logger.warning("Unknown STORAGE_BACKEND '%s', using Supabase.", backend)
+
+    from services.database import DatabaseService
+    return DatabaseService()
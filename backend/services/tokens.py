@@ -0,0 +1,10 @@
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token), good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    max_chars = max(max_tokens, 0) * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rstrip() + " …"